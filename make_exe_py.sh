@@ -32,15 +32,18 @@ pip install pyinstaller
 pip install Pillow
 pip install piexif
 pip install pillow_heif
-pip install numpy
-pip install ffmpeg-python
 
 # Build with PyInstaller
+# The modules below are imported inside functions (on first use), so they are listed explicitly.
+# --copy-metadata is needed for the version information of option -v.
 pyinstaller move_jpg.py --onefile \
     --hidden-import=PIL._imaging \
     --hidden-import=PIL.Image \
     --hidden-import=PIL.ExifTags \
     --hidden-import=piexif \
-    --hidden-import=ffmpeg \
-    --hidden-import=ffmpeg._run \
-    --hidden-import=ffmpeg._probe
+    --hidden-import=pillow_heif \
+    --hidden-import=ini_cfg_parser \
+    --copy-metadata=piexif \
+    --copy-metadata=pillow_heif \
+    --copy-metadata=ini_cfg_parser \
+    --copy-metadata=Pillow
@@ -9,12 +9,30 @@ import sys
 import re
 import datetime
 import pathlib
-import urllib.request
 import zipfile
 import subprocess
 import platform
 import time
-from typing import List, Dict, Tuple, Optional, Any, TypedDict, Union
+import struct
+import io
+import threading
+import collections
+import json
+import filecmp
+import fnmatch
+import sqlite3
+import select
+import errno
+import hashlib
+import zlib
+import queue
+import functools
+import contextlib
+import cProfile
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor, Future
+from typing import List, Dict, Tuple, Optional, Any, TypedDict, Union, BinaryIO, Iterator, Iterable, Deque, Set, Callable, cast, TYPE_CHECKING
+if TYPE_CHECKING:
+    import ini_cfg_parser as ini     # type: ignore
 OK_VAL = 0
 NG_VAL = 1
 #try:
@@ -25,85 +43,107 @@ NG_VAL = 1
 #    msg += f"Details: {e}"
 #    print(msg)
 #    raise SystemExit(NG_VAL)
-from importlib.metadata import version, PackageNotFoundError
-try:
-    from pillow_heif import register_heif_opener     # type: ignore
-    import pillow_heif   # type: ignore
-except ImportError as e:
-    msg = f"The 'pillow_heif' module is required but not installed.\n"
-    msg += f"You can install it with: pip install pillow_heif\n"
-    msg += f"Details: {e}"
-    print(msg)
-    raise SystemExit(NG_VAL)
-try:
-    import piexif   # type: ignore
-except ImportError as e:
-    msg = f"The 'piexif' module is required but not installed.\n"
-    msg += f"You can install it with: pip install piexif\n"
-    msg += f"Details: {e}"
-    print(msg)
-    raise SystemExit(NG_VAL)
-try:
-    import ini_cfg_parser as ini     # type: ignore
-except ImportError as e:
-    msg = f"The 'ini_cfg_parser' module is required but not installed.\n"
-    msg += f"You can install it with: pip install ini_cfg_parser\n"
-    msg += f"Details: {e}"
-    print(msg)
-    raise SystemExit(NG_VAL)
-try:
-    from PIL import Image   # type: ignore
-    from PIL.ExifTags import TAGS   # type: ignore
-except ImportError as e:
-    msg = f"The 'PIL' module is required but not installed.\n"
-    msg += f"You can install it with: pip install Pillow\n"
-    msg += f"Details: {e}"
-    print(msg)
-    raise SystemExit(NG_VAL)
-try:
-    import ffmpeg# type: ignore
-except ImportError as e:
-    msg = f"The 'ffmpeg' module is required but not installed.\n"
-    msg += f"You can install it with: pip install ffmpeg-python\n"
-    msg += f"Details: {e}"
-    print(msg)
-    raise SystemExit(NG_VAL)
-try:
-    import numpy as np
-except ImportError as e:
-    msg = f"The 'numpy' module is required but not installed.\n"
-    msg += f"You can install it with: pip install numpy --only-binary :all:\n"
-    msg += f"Details: {e}"
-    print(msg)
-    raise SystemExit(NG_VAL)
-
-# Register HEIC support
-register_heif_opener()
-
-class ExtDict(TypedDict):
+# The third-party modules are imported when a file that needs them is seen (import_piexif() etc.),
+# so that a run on a small folder does not pay for Pillow, pillow_heif and piexif at startup.
+class _ExtLists(TypedDict):
     picture_ext: List[str]
     raw_ext: List[str]
     heic_ext: List[str]
     mtime_ext: List[str]
     movie_ext: List[str]
 
-try:
-    piexif_version = version('piexif')
-except PackageNotFoundError:
-    piexif_version = 'unknown'
-try:
-    ffmpeg_version = version('ffmpeg-python')
-except PackageNotFoundError:
-    ffmpeg_version = 'unknown'
+class ExtDict(_ExtLists, total=False):
+    # Date sources per key of the extension lists. DEFAULT_DATE_SOURCES is used when it is missing.
+    date_sources: Dict[str, List[str]]
+    # File name date patterns of the 'filename' source. DEFAULT_FILENAME_PATTERNS is used when it is missing.
+    filename_patterns: List[str]
+    # Fraction of the files dated by the file name that are verified with the metadata.
+    filename_sample: float
 
 __version_short__ = f"0.1.10, python={platform.python_version()} {platform.architecture()[0]}"
-__version__ = f"{__version_short__}\n"
-__version__ += f"piexif={piexif_version}\n"
-__version__ += f"pillow_heif={getattr(pillow_heif, '__version__', 'unknown')}\n"
-__version__ += f"ini_cfg_parser={getattr(ini, '__version__', 'unknown')}\n"
-__version__ += f"Pillow={getattr(Image, '__version__', 'unknown')}\n"
-__version__ += f"ffmpeg-python={ffmpeg_version}\n"
-__version__ += f"numpy={np.__version__}\n"
+
+# Distributions displayed by --version. Only the metadata is read, the modules are not imported.
+VERSION_DISTRIBUTIONS = [('piexif', 'piexif'), ('pillow_heif', 'pillow_heif'), ('ini_cfg_parser', 'ini_cfg_parser'), ('Pillow', 'Pillow')]
+_VERSION_INFO: Optional[str] = None
+
+## @fn          get_version_info()
+#  @brief       Gets the version information including the dependent libraries. It is collected on first use (--version, --help, error messages).
+#  @param[in]   None            : 
+#  @retval      version         : version information [type str]
+def get_version_info() -> str:
+    global _VERSION_INFO
+    if _VERSION_INFO is None:
+        from importlib.metadata import version, PackageNotFoundError
+        info = f"{__version_short__}\n"
+        for label, dist in VERSION_DISTRIBUTIONS:
+            try:
+                dist_version = version(dist)
+            except PackageNotFoundError:
+                dist_version = 'unknown'
+            info += f"{label}={dist_version}\n"
+        _VERSION_INFO = info
+    return _VERSION_INFO
+
+def __getattr__(name: str) -> Any:
+    # move_jpg.__version__ is built on first access.
+    if name == '__version__':
+        return get_version_info()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+## @fn          die_missing_module()
+#  @brief       Displays how to install a missing module and exits.
+#  @param[in]   module          : module name [type str]
+#  @param[in]   package         : pip package name [type str]
+#  @param[in]   e               : import error [type ImportError]
+#  @retval      None            : 
+def die_missing_module(module: str, package: str, e: ImportError) -> None:
+    msg = f"The '{module}' module is required but not installed.\n"
+    msg += f"You can install it with: pip install {package}\n"
+    msg += f"Details: {e}"
+    print(msg)
+    raise SystemExit(NG_VAL)
+
+def import_piexif() -> Any:
+    try:
+        import piexif   # type: ignore
+    except ImportError as e:
+        die_missing_module('piexif', 'piexif', e)
+    return piexif
+
+def import_pil_image() -> Any:
+    try:
+        from PIL import Image   # type: ignore
+    except ImportError as e:
+        die_missing_module('PIL', 'Pillow', e)
+    return Image
+
+_HEIF_OPENER_LOCK = threading.Lock()
+_HEIF_OPENER_REGISTERED = False
+
+## @fn          import_pil_image_heif()
+#  @brief       Imports PIL.Image with the HEIC support of pillow_heif. register_heif_opener() is called only once.
+#  @param[in]   None            : 
+#  @retval      Image           : PIL.Image module [type Any]
+def import_pil_image_heif() -> Any:
+    global _HEIF_OPENER_REGISTERED
+    Image = import_pil_image()
+    with _HEIF_OPENER_LOCK:
+        if not _HEIF_OPENER_REGISTERED:
+            try:
+                from pillow_heif import register_heif_opener     # type: ignore
+            except ImportError as e:
+                die_missing_module('pillow_heif', 'pillow_heif', e)
+            register_heif_opener()
+            _HEIF_OPENER_REGISTERED = True
+    return Image
+
+def import_ini() -> Any:
+    try:
+        import ini_cfg_parser   # type: ignore
+    except ImportError as e:
+        die_missing_module('ini_cfg_parser', 'ini_cfg_parser', e)
+    return ini_cfg_parser
+
 __copyright__    = 'pukkunk'
 __author__       = 'pukkunk'
 
@@ -111,34 +151,260 @@ SCR_PATH: str
 SCR_FOLDER: str
 def main(args=None) -> None:
     init_paths()
+    parser = build_arg_parser()
+    args = parser.parse_args()
+    if args.async_:
+        main_async(args, parser)
+    if args.concurrency is not None:
+        parser.error("--concurrency requires --async")
+    if args.watch and ((args.plan_out is not None) or (args.plan_in is not None)):
+        parser.error("--watch cannot be used with --plan_out/--plan_in")
+    if args.verify and not args.copy:
+        parser.error("--verify requires --copy")
+    if args.copy and args.dest is None:
+        # Without --dest the copies would be written next to the originals, on the same card.
+        parser.error("--copy requires --dest")
+    if (args.resume or args.undo) and args.journal is None:
+        parser.error("--resume and --undo require --journal")
+    if args.undo and (args.resume or args.copy or args.watch or (args.plan_out is not None) or (args.plan_in is not None)):
+        parser.error("--undo cannot be used with --resume, --copy, --watch or --plan_out/--plan_in")
+    opt = load_options(args)
+    if args.watch and len(opt['tar_folders']) > 1:
+        parser.error("--watch accepts only one target folder")
+    profiler = start_profile(args.profile)
+
+    print(f"{os.path.basename(SCR_PATH)} version={__version_short__}")
+    if args.undo:
+        print(f"<<  undo  journal:{opt['journal']}  >>")
+        configure_journal(opt['journal'])
+        try:
+            undo_journal(opt['journal'])
+        finally:
+            MOVE_ENGINE.shutdown()
+            JOURNAL.close()
+        finish_run(profiler, args.profile)
+        sys.exit(OK_VAL)
+    # The journal of the previous run is read before it is opened for appending.
+    journal_records = Journal.read(opt['journal']) if args.resume else None
+    configure_journal(opt['journal'])
+    if args.plan_in is not None:
+        # Execute a plan file. The files are not scanned and the dates are not extracted again.
+        print(f"<<  plan  file:{args.plan_in}  >>")
+        try:
+            execute_plan(args.plan_in, opt['collision'])
+        finally:
+            JOURNAL.close()
+        finish_run(profiler, args.profile)
+        sys.exit(OK_VAL)
+
+    # All target folders share one extraction pool and move engine. The paths are absolute, so the current folder is not changed.
+    tar_folders = opt['tar_folders']
+    # Files recorded in the journal (--resume). They are not extracted again.
+    known: Set[str] = set()
+    scan = scan_folders(tar_folders, opt['list_ext'], args.recursive, args.include, args.exclude, args.max_depth, opt['date_format'])
+    if journal_records is not None:
+        scan = (file for file in scan if file not in known)
+    files = REPORTER.count_scanned(STAGE_TIMER.iter('scan', scan))
+
+    for tar_folder in tar_folders:
+        print(f"<<  target  folder:{tar_folder}  >>")
+    REPORTER.set_folders(tar_folders)
+    cache = open_cache(opt['cache'], opt['cache_max_entries'])
+    try:
+        if journal_records is not None:
+            known.update(resume_journal(journal_records, opt['collision']))
+        if args.watch:
+            watcher = FolderWatcher(tar_folders[0], opt['list_ext'], opt['watch_settle'], args.recursive, args.include, args.exclude, args.max_depth, opt['date_format'])
+            watch_folder(watcher, opt['dict_tar_ext'], opt['url_ffmpeg'], opt['date_format'], opt['watch_interval'], opt['jobs'], opt['executor'], opt['collision'], cache, opt['dest'])
+        elif args.plan_out is not None:
+            plan_file = os.path.abspath(args.plan_out)
+            write_plan(files, opt['dict_tar_ext'], opt['url_ffmpeg'], opt['date_format'], plan_file, opt['jobs'], opt['executor'], cache, opt['dest'])
+        else:
+            move_picture(files, opt['dict_tar_ext'], opt['url_ffmpeg'], opt['date_format'], opt['jobs'], opt['executor'], opt['collision'], cache, opt['dest'])
+    finally:
+        if cache is not None:
+            print(f"cache: hits={cache.hits}, misses={cache.misses}")
+            cache.close()
+        # The moves of the copy threads are finished before the journal is closed.
+        MOVE_ENGINE.shutdown()
+        JOURNAL.close()
+    FFPROBE_POOL.shutdown()
+    finish_run(profiler, args.profile)
+    sys.exit(OK_VAL)
+
+## @fn          start_profile()
+#  @brief       Starts cProfile when --profile is given.
+#  @param[in]   profile_file    : pstats output file (None: no profiling) [type Optional[str]]
+#  @retval      profiler        : running profiler. None without --profile. [type Optional[cProfile.Profile]]
+def start_profile(profile_file: Optional[str]) -> Optional[cProfile.Profile]:
+    STAGE_TIMER.reset()
+    SYSCALLS.reset()
+    if profile_file is None:
+        return None
+    profiler = cProfile.Profile()
+    profiler.enable()
+    return profiler
+
+## @fn          finish_run()
+#  @brief       Writes the pstats file (--profile), closes the reporter and displays the result, the per-stage timing and the file system call summary.
+#  @param[in]   profiler        : running profiler [type Optional[cProfile.Profile]]
+#  @param[in]   profile_file    : pstats output file [type Optional[str]]
+#  @retval      None            : 
+def finish_run(profiler: Optional[cProfile.Profile], profile_file: Optional[str]) -> None:
+    if profiler is not None and profile_file is not None:
+        profiler.disable()
+        profiler.dump_stats(profile_file)
+        print(f"profile is written. {profile_file}  (python -m pstats {profile_file})")
+    REPORTER.close()
+    print(f"<<  result  >> {REPORTER.summary()}")
+    if len(REPORTER.folder_counts) > 1:
+        for line in REPORTER.folder_summary():
+            print(f"    {line}")
+    if REPORTER.log_file is not None:
+        print(f"log is written. {REPORTER.log_file}")
+    print("<<  stage timing  >>")
+    print(STAGE_TIMER.summary())
+    print("<<  file system calls  >>")
+    print(SYSCALLS.summary(REPORTER.done))
+
+## @fn          main_async()
+#  @brief       Entry point of the asyncio pipeline (--async). Many stat/read/move operations are kept in flight, which suits high-latency network shares (SMB/NFS).
+#  @param[in]   args            : arguments parsed by main(). None: they are read from sys.argv. [type Optional[argparse.Namespace]]
+#  @param[in]   parser          : parser of args [type Optional[argparse.ArgumentParser]]
+#  @retval      None            : 
+def main_async(args: Optional[argparse.Namespace] = None, parser: Optional[argparse.ArgumentParser] = None) -> None:
+    if args is None or parser is None:
+        init_paths()
+        parser = build_arg_parser()
+        args = parser.parse_args()
+    if (args.plan_out is not None) or (args.plan_in is not None) or args.watch or args.copy or (args.journal is not None):
+        parser.error("--plan_out/--plan_in/--watch/--copy/--journal cannot be used with --async")
+    if (args.jobs is not None) or (args.executor is not None):
+        parser.error("-j/--jobs and --executor cannot be used with --async (use --concurrency)")
+    opt = load_options(args)
+    concurrency = args.concurrency if args.concurrency is not None else opt['concurrency']
+    profiler = start_profile(args.profile)
+
+    tar_folders = opt['tar_folders']
+    files = REPORTER.count_scanned(STAGE_TIMER.iter('scan', scan_folders(tar_folders, opt['list_ext'], args.recursive, args.include, args.exclude, args.max_depth, opt['date_format'])))
+
+    print(f"{os.path.basename(SCR_PATH)} version={__version_short__}")
+    for tar_folder in tar_folders:
+        print(f"<<  target  folder:{tar_folder}  >>")
+    REPORTER.set_folders(tar_folders)
+    import asyncio
+    cache = open_cache(opt['cache'], opt['cache_max_entries'])
+    try:
+        asyncio.run(async_move_picture(files, opt['dict_tar_ext'], opt['url_ffmpeg'], opt['date_format'], concurrency, opt['collision'], cache, opt['dest']))
+    finally:
+        if cache is not None:
+            print(f"cache: hits={cache.hits}, misses={cache.misses}")
+            cache.close()
+        MOVE_ENGINE.shutdown()
+    FFPROBE_POOL.shutdown()
+    finish_run(profiler, args.profile)
+    sys.exit(OK_VAL)
+
+class LazyHelpArgumentParser(argparse.ArgumentParser):
+    """ArgumentParser whose description (with the version information) is built only when the help is displayed."""
+    def __init__(self, *args: Any, description_factory: Optional[Callable[[], str]] = None, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self._description_factory = description_factory
+
+    def format_help(self) -> str:
+        if self.description is None and self._description_factory is not None:
+            self.description = self._description_factory()
+        return super().format_help()
+
+class LazyVersionAction(argparse.Action):
+    """The 'version' action. The version information is collected only when -v is given."""
+    def __init__(self, option_strings: List[str], dest: str = argparse.SUPPRESS, default: Any = argparse.SUPPRESS, help: str = "show program's version number and exit") -> None:
+        super().__init__(option_strings=option_strings, dest=dest, default=default, nargs=0, help=help)
+
+    def __call__(self, parser: argparse.ArgumentParser, namespace: argparse.Namespace, values: Any, option_string: Optional[str] = None) -> None:
+        formatter = parser._get_formatter()
+        formatter.add_text(os.path.basename(SCR_PATH) + " version=" + get_version_info())
+        parser._print_message(formatter.format_help(), sys.stdout)
+        parser.exit()
+
+## @fn          build_arg_parser()
+#  @brief       Creates the command line parser shared by main() and main_async().
+#  @param[in]   None            : 
+#  @retval      parser          : command line parser [type argparse.ArgumentParser]
+def build_arg_parser() -> argparse.ArgumentParser:
     h_word = "Refer to the date information of the image files and move the files to the date folder."
-    parser = argparse.ArgumentParser(
+    parser = LazyHelpArgumentParser(
         prog=os.path.basename(SCR_PATH),
         formatter_class=argparse.RawDescriptionHelpFormatter,
-        description=textwrap.dedent('''\
+        description_factory=lambda: textwrap.dedent('''\
         version={ver}
         {descpt}
         Copyright :{copyright}
         author :{auth}\
-        '''.format(copyright=__copyright__, auth=__author__, ver=__version__,descpt=h_word)))
-    parser.add_argument('-v','--version', action='version', version=os.path.basename(SCR_PATH) + " version=" +__version__)
+        '''.format(copyright=__copyright__, auth=__author__, ver=get_version_info(),descpt=h_word)))
+    parser.add_argument('-v','--version', action=LazyVersionAction)
     parser.add_argument('-p','--picture_ext',required=False ,type=str ,nargs='*' , default=None , help="Picture extension")
-    parser.add_argument('-t','--tar_folder',required=False ,type=str ,default=None , help="target folder")
+    parser.add_argument('-t','--tar_folder',required=False ,type=str ,nargs='+' ,default=None , help="target folders")
+    parser.add_argument('--tar_list',required=False ,type=str ,default=None , help="file listing the target folders (one per line)")
     parser.add_argument('-e','--encoding',required=False, default="utf8", choices=['utf8', 'shift_jis', 'euc_jp'], help="encoding char code(default: %(default)s)")
+    parser.add_argument('-j','--jobs',required=False ,type=int ,default=None , help="number of date extraction workers")
+    parser.add_argument('--executor',required=False ,default=None , choices=EXECUTOR_CHOICES, help="date extraction worker type")
+    parser.add_argument('-r','--recursive',required=False ,action='store_true' , help="scan the sub folders of the target folder")
+    parser.add_argument('--include',required=False ,type=str ,nargs='*' , default=None , help="glob patterns of the files to process")
+    parser.add_argument('--exclude',required=False ,type=str ,nargs='*' , default=None , help="glob patterns of the files and folders to skip")
+    parser.add_argument('--max_depth',required=False ,type=int ,default=-1 , help="maximum depth of the sub folders with --recursive (default: unlimited)")
+    parser.add_argument('--cache',required=False ,type=str ,default=None , help="metadata cache file (SQLite). An empty string disables the cache.")
+    parser.add_argument('--collision',required=False ,default=None , choices=COLLISION_CHOICES, help="action when the file already exists in the date folder")
+    parser.add_argument('-q', '--quiet',required=False ,action='store_true' , help="no per-file output. A progress line is displayed on a terminal.")
+    parser.add_argument('--log_format',required=False ,type=str ,choices=LOG_FORMAT_CHOICES ,default='text' , help="jsonl: write the per-file events to --log_file")
+    parser.add_argument('--log_file',required=False ,type=str ,default=None , help="event log file of --log_format jsonl (default: move_jpg_log.jsonl)")
+    parser.add_argument('--profile',required=False ,type=str ,default=None , help="profile the run with cProfile and write the pstats file")
+    parser.add_argument('--copy',required=False ,action='store_true' , help="copy the files into the date folders under --dest and keep the originals. One copy worker per source device; copy_jobs (ini) limits the copies queued over all devices")
+    parser.add_argument('--verify',required=False ,action='store_true' , help="verify each copy with a checksum (--copy)")
+    parser.add_argument('--dest',required=False ,type=str ,default=None , help="destination folder of the date folders (default: next to the files)")
+    parser.add_argument('--watch',required=False ,action='store_true' , help="keep watching the target folder and move new files")
+    parser.add_argument('--interval',required=False ,type=float ,default=None , help="polling interval of --watch (seconds)")
+    parser.add_argument('--settle',required=False ,type=float ,default=None , help="a file is moved after its size has been stable for this time (seconds)")
+    parser.add_argument('--journal',required=False ,type=str ,default=None , help="append every planned and finished move to this journal file (JSON Lines)")
+    parser.add_argument('--resume',required=False ,action='store_true' , help="finish the planned moves of --journal and skip the files recorded in it")
+    parser.add_argument('--undo',required=False ,action='store_true' , help="move the files of --journal back to their original place")
+    parser.add_argument('--filename_date',required=False ,action='store_true' , help="take the date from the file name (filename_patterns) before the metadata")
+    parser.add_argument('--filename_sample',required=False ,type=float ,default=None , help="fraction of the files dated by the file name that are verified with the metadata (0.0 - 1.0)")
+    parser.add_argument('--async',dest='async_',required=False ,action='store_true' , help="use the asyncio pipeline")
+    parser.add_argument('--concurrency',required=False ,type=int ,default=None , help="number of file operations kept in flight (--async)")
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument('--plan_out',required=False ,type=str ,default=None , help="write the move plan to this file without moving any file")
+    group.add_argument('--plan_in',required=False ,type=str ,default=None , help="execute the move plan written by --plan_out")
+    return parser
 
-    args = parser.parse_args()
+## @fn          load_options()
+#  @brief       Merges the command line arguments with the ini file and validates the result.
+#  @param[in]   args            : parsed command line arguments [type argparse.Namespace]
+#  @retval      opt             : options. 'tar_folders' are absolute paths ('tar_folder' is the first one), 'list_ext' and 'dict_tar_ext' are added. [type Dict[str, Any]]
+def load_options(args: argparse.Namespace) -> Dict[str, Any]:
     lst_picture_ext = args.picture_ext
-    str_tar_folder = args.tar_folder
+    # The target folders of -t and --tar_list. When there is none, tar_folder of the ini file is used.
+    lst_tar_folder = list(args.tar_folder) if args.tar_folder is not None else []
+    if args.tar_list is not None:
+        lst_tar_folder += read_folder_list(args.tar_list)
     encoding = args.encoding
 
     opt:Dict[str, Any] = {}
     opt['picture_ext'] = lst_picture_ext
-    opt['tar_folder'] = str_tar_folder
+    opt['tar_folder'] = lst_tar_folder[0] if lst_tar_folder else None
+    opt['jobs'] = args.jobs
+    opt['executor'] = args.executor
+    opt['collision'] = args.collision
+    opt['cache'] = args.cache
+    opt['watch_interval'] = args.interval
+    opt['watch_settle'] = args.settle
+    opt['filename_sample'] = args.filename_sample
 
     # Create setting file name information
     ini_file = get_inifile()
     section = os.path.splitext(os.path.basename(SCR_PATH))[0]
 
+    ini = import_ini()
     default_ini = get_ini_dict_val(section)
     # Check whether the dict variable default_ini for default values ​​is of the expected type.
     if(ini.IniParser.is_valid_ini_dict(default_ini) == False):
@@ -158,32 +424,61 @@ def main(args=None) -> None:
         if (key not in opt) or (opt[key] is None):
             opt[key] = ini_parser.get(section, key)
 
-    str_ext = ""
-    list_ext = []   #Initialization
-    # Extend to list "list_ext"
-    list_ext.extend(opt['picture_ext'])
-    list_ext.extend(opt['movie_ext'])
-    list_ext.extend(opt['raw_ext'])
-    list_ext.extend(opt['heic_ext'])
-    list_ext.extend(opt['mtime_ext'])
-    url_ffmpeg = opt['url_ffmpeg']
     date_format = opt['date_format']
     res_flag = is_valid_date_format(date_format)
     if(res_flag == False):
         msg = "Error detect. Invalid date format found in the configuration file.\nkey='date_format', val={date_format}"
         die_print(msg)
-
-    tar_folder = opt['tar_folder']
-    if not os.path.isabs(tar_folder):
-        tar_folder = os.path.abspath(os.path.join(SCR_FOLDER, tar_folder))
-    if not os.path.isdir(tar_folder):
-        msg = f"Error detect. There is not folder. folder={tar_folder}"
+    if opt['executor'] not in EXECUTOR_CHOICES:
+        msg = f"Error detect. Invalid executor found in the configuration file.\nkey='executor', val={opt['executor']}"
+        die_print(msg)
+    if opt['collision'] not in COLLISION_CHOICES:
+        msg = f"Error detect. Invalid collision policy found in the configuration file.\nkey='collision', val={opt['collision']}"
+        die_print(msg)
+    date_sources: Dict[str, List[str]] = {}
+    for kind in DEFAULT_DATE_SOURCES:
+        key = kind.replace('_ext', '_sources')
+        sources = [source.strip().lower() for source in opt[key] if source.strip()]
+        invalid = [source for source in sources if source not in DATE_SOURCES]
+        if invalid or not sources:
+            msg = f"Error detect. Invalid date source found in the configuration file.\nkey='{key}', val={','.join(opt[key])}\n"
+            msg += f"choices: {', '.join(DATE_SOURCES)}"
+            die_print(msg)
+        # --filename_date: the file name is tried first (the cost of the 'filename' source is 0).
+        if args.filename_date and 'filename' not in sources:
+            sources.insert(0, 'filename')
+        date_sources[kind] = sources
+    for pattern in opt['filename_patterns']:
+        if not all(token in pattern for token in ('%Y', '%m', '%d')):
+            msg = f"Error detect. Invalid file name pattern found in the configuration file. %Y, %m and %d are required.\nkey='filename_patterns', val={pattern}"
+            die_print(msg)
+    if not (0.0 <= opt['filename_sample'] <= 1.0):
+        msg = f"Error detect. Invalid sample rate found in the configuration file.\nkey='filename_sample', val={opt['filename_sample']}"
         die_print(msg)
-    files = []  # Initialization
-    for file in os.listdir(tar_folder):
-        base, ext = os.path.splitext(file)
-        if ext.lower() in list_ext:
-            files.append(file)
+    configure_ffprobe_pool(opt['ffprobe_jobs'], opt['ffprobe_timeout'])
+    configure_move_engine(opt['copy_jobs'], args.copy, args.verify)
+
+    tar_folders: List[str] = []
+    for tar_folder in (lst_tar_folder if lst_tar_folder else [opt['tar_folder']]):
+        if not os.path.isabs(tar_folder):
+            tar_folder = os.path.abspath(os.path.join(SCR_FOLDER, tar_folder))
+        if not os.path.isdir(tar_folder):
+            msg = f"Error detect. There is not folder. folder={tar_folder}"
+            die_print(msg)
+        tar_folder = os.path.normpath(tar_folder)
+        if tar_folder not in tar_folders:
+            tar_folders.append(tar_folder)
+    opt['tar_folders'] = tar_folders
+    opt['tar_folder'] = tar_folders[0]
+    # The destination is given on the command line, so it is relative to the current folder.
+    opt['dest'] = os.path.abspath(args.dest) if args.dest is not None else None
+    opt['journal'] = os.path.abspath(args.journal) if args.journal is not None else None
+    if args.profile is not None:
+        args.profile = os.path.abspath(args.profile)
+    log_file = args.log_file
+    if args.log_format == 'jsonl' and log_file is None:
+        log_file = f"{os.path.splitext(os.path.basename(SCR_PATH))[0]}_log.jsonl"
+    configure_reporter(args.quiet, args.log_format, os.path.abspath(log_file) if log_file is not None else None)
 
     dict_tar_ext: ExtDict = {
         'picture_ext': opt['picture_ext'],
@@ -191,100 +486,2162 @@ def main(args=None) -> None:
         'heic_ext': opt['heic_ext'],
         'mtime_ext': opt['mtime_ext'],
         'movie_ext': opt['movie_ext'],
+        'date_sources': date_sources,
+        'filename_patterns': opt['filename_patterns'],
+        'filename_sample': opt['filename_sample'],
     }
+    opt['dict_tar_ext'] = dict_tar_ext
+    # The target extensions of the scan, including the extensions of the extractor plugins.
+    opt['list_ext'] = get_extractor_registry(dict_tar_ext).extensions()
+    return opt
 
-    print(f"{os.path.basename(SCR_PATH)} version={__version_short__}")
-    print(f"<<  target  folder:{tar_folder}  >>")
-    current_path = os.getcwd()  # Preserve original current directory information
-    os.chdir(tar_folder)        # Change to the target directory
-    move_picture(files, dict_tar_ext, url_ffmpeg, date_format)
-    os.chdir(current_path)      # Change to the original current directory
-    sys.exit(OK_VAL)
+## @fn          read_folder_list()
+#  @brief       Reads the target folders from a list file (--tar_list). One folder per line. Empty lines and lines starting with '#' are ignored.
+#  @param[in]   path            : list file [type str]
+#  @retval      folders         : target folders. A relative folder is relative to the folder of the list file. [type List[str]]
+def read_folder_list(path: str) -> List[str]:
+    path = os.path.abspath(path)
+    try:
+        with open(path, 'r', encoding='utf-8-sig') as f:
+            lines = f.read().splitlines()
+    except OSError as e:
+        msg = f"Error detect. The folder list file cannot be read. file={path}\n{e}"
+        die_print(msg)
+    folders = []
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        folders.append(line if os.path.isabs(line) else os.path.join(os.path.dirname(path), line))
+    return folders
 
-def move_picture(files: List[str], dict_tar_ext: ExtDict, url_ffmpeg: str, date_format: str):
-    picture_ext = dict_tar_ext['picture_ext']
-    raw_ext = dict_tar_ext['raw_ext']
-    heic_ext = dict_tar_ext['heic_ext']
-    mtime_ext = dict_tar_ext['mtime_ext']
-    movie_ext = dict_tar_ext['movie_ext']
+class FileRecord(str):
+    """
+    Path of a target file that carries its file system information through the pipeline.
 
-    # Add the script folder to the PATH environment variable.
-    add_tardir_envpath(SCR_FOLDER)
-    required_keys = ['year', 'month', "day"]
-    for file in files:
-        print("file=%s" % file)
-        base, ext = os.path.splitext(file)
-        year = None
-        month = None
-        day = None
-        if(ext.lower() in picture_ext):
-            id,value = get_exif(file,"DateTimeOriginal")[0]
-            if not (value == None):
-                # Extracting date information
-                year, month ,day = get_dateinf(value)
+    scan_files() yields the records with the os.DirEntry of the folder
+    listing. The stat result is taken once on first use (without a system
+    call on Windows, where it comes with the listing) and is reused by the
+    cache lookup, the mtime source and the collision check. The record is
+    a str, so it is passed wherever a path is expected. The file system
+    calls made for the file are counted in syscalls (SyscallCounter).
+    """
+    def __new__(cls, path: str, entry: Optional[os.DirEntry] = None, st: Optional[os.stat_result] = None) -> "FileRecord":
+        self = super().__new__(cls, path)
+        self.entry = entry
+        self._stat = st
+        self.syscalls: Dict[str, int] = {}
+        return self
+
+    def __reduce__(self) -> Tuple[Any, ...]:
+        # os.DirEntry cannot be pickled (process backend). The stat result is passed instead.
+        return (FileRecord, (str(self), None, self._stat), {'syscalls': self.syscalls})
+
+    def stat(self) -> os.stat_result:
+        if self._stat is None:
+            if self.entry is not None:
+                # DirEntry.stat() needs a system call except on Windows.
+                if os.name != 'nt':
+                    SYSCALLS.add('stat', self)
+                self._stat = self.entry.stat()
             else:
-                id,value = get_exif(file,"DateTime")[0]
-                #print("id=%s,value=%s" % (id,value))
-                if not (value == None):
-                    year, month ,day = get_dateinf(value)
-                else:
-                    year = None
-                    month = None
-                    day = None
-        elif(ext.lower() in raw_ext):
-            tag = piexif.ExifIFD.DateTimeOriginal
-            erropt = 0
-            inf = get_date_info_fm_raw(file, tag, erropt)
-            if all(key in inf for key in required_keys):
-                year = inf['year']
-                month = inf['month']
-                day = inf['day']
-        elif(ext.lower() in heic_ext):
-            #print(f"HEIC process. file={file},ext={ext}")
-            # Get date information
-            inf = file_get_heic(file)
-            if all(key in inf for key in required_keys):
-                year = str(inf['year']) if inf['year'] is not None else None
-                month = str(inf['month']) if inf['month'] is not None else None
-                day = str(inf['day']) if inf['day'] is not None else None
-            #print(f"year={year},month={month},day={day}")
-        elif(ext.lower() in mtime_ext):
-            # Get date information.
-            inf = file_get_mtime(file)
-            if all(key in inf for key in required_keys):
-                year = inf['year']
-                month = inf['month']
-                day = inf['day']
-        elif(ext.lower() in movie_ext):
-            # Get date information.
-            inf = movie_get_date(file, url_ffmpeg)
-            if all(key in inf for key in required_keys):
-                year = inf['year']
-                month = inf['month']
-                day = inf['day']
-
-        if None not in (year, month, day):
-            # Creating and Changing Directories
-            if year is not None and month is not None and day is not None:
-                dt = datetime.datetime(int(year), int(month), int(day))
-            dir_date = dt.strftime(date_format)
-            if not os.path.exists(dir_date):
-                os.makedirs(dir_date)
-            dirname, finebasename = os.path.split(file)
-            newdir = os.path.join(dirname , dir_date)
-            newfile = os.path.join(newdir ,finebasename)
-            # If the file exists, display a warning.
-            if(os.path.exists(newfile)):
-                print (f"{newfile} already exists.")
+                SYSCALLS.add('stat', self)
+                self._stat = os.stat(self)
+        return self._stat
+
+## @fn          file_stat()
+#  @brief       Gets the stat result of the file. The stat result of a FileRecord is taken only once.
+#  @param[in]   file            : target file [type str]
+#  @retval      st              : stat result [type os.stat_result]
+def file_stat(file: str) -> os.stat_result:
+    if isinstance(file, FileRecord):
+        return file.stat()
+    SYSCALLS.add('stat', file)
+    return os.stat(file)
+
+## @fn          scan_files()
+#  @brief       Enumerates the target files with os.scandir(). The files are yielded while the scan is still running.
+#  @param[in]   tar_folder      : target folder [type str]
+#  @param[in]   list_ext        : target extensions [type List[str]]
+#  @param[in]   recursive       : scan the sub folders [type bool]
+#  @param[in]   include         : glob patterns. When given, only the matching files are yielded. [type Optional[List[str]]]
+#  @param[in]   exclude         : glob patterns of the files and folders to skip [type Optional[List[str]]]
+#  @param[in]   max_depth       : maximum depth of the sub folders (0: tar_folder only, negative: unlimited) [type int]
+#  @param[in]   date_format     : date folder format. The date folders are not scanned. [type Optional[str]]
+#  @retval      file            : path relative to tar_folder, with the DirEntry of the listing [type Iterator[FileRecord]]
+def scan_files(tar_folder: str, list_ext: List[str], recursive: bool = False, include: Optional[List[str]] = None,
+               exclude: Optional[List[str]] = None, max_depth: int = -1, date_format: Optional[str] = None) -> Iterator[FileRecord]:
+    set_ext = {ext.lower() for ext in list_ext}
+    # (folder relative to tar_folder, depth). Only the folders waiting to be scanned are kept in memory.
+    stack: List[Tuple[str, int]] = [('', 0)]
+    while stack:
+        rel_dir, depth = stack.pop()
+        subdirs: List[Tuple[str, int]] = []
+        folder = os.path.join(tar_folder, rel_dir) if rel_dir else tar_folder
+        try:
+            SYSCALLS.add('scandir')
+            it = os.scandir(folder)
+        except OSError as e:
+            REPORTER.warning(folder, 'folder_unreadable', f"Warning. The folder could not be read. {e}")
+            continue
+        with it:
+            for entry in it:
+                rel = os.path.join(rel_dir, entry.name) if rel_dir else entry.name
+                # is_dir()/is_file() use the cached DirEntry information, so no extra stat is needed on most platforms.
+                if entry.is_dir(follow_symlinks=False):
+                    if not recursive or (0 <= max_depth <= depth):
+                        continue
+                    if is_date_dir(entry.name, date_format) or match_globs(rel, exclude):
+                        continue
+                    subdirs.append((rel, depth + 1))
+                    continue
+                if not entry.is_file():
+                    continue
+                base, ext = os.path.splitext(entry.name)
+                if ext.lower() not in set_ext:
+                    continue
+                if include and not match_globs(rel, include):
+                    continue
+                if match_globs(rel, exclude):
+                    continue
+                yield FileRecord(rel, entry)
+        stack.extend(reversed(subdirs))
+
+## @fn          scan_folders()
+#  @brief       Enumerates the target files of several folders with scan_files(). The files are yielded as absolute paths, folder by folder.
+#  @param[in]   tar_folders     : absolute paths of the target folders [type List[str]]
+#  @param[in]   list_ext        : target extensions [type List[str]]
+#  @param[in]   recursive       : scan the sub folders [type bool]
+#  @param[in]   include         : glob patterns. When given, only the matching files are yielded. [type Optional[List[str]]]
+#  @param[in]   exclude         : glob patterns of the files and folders to skip [type Optional[List[str]]]
+#  @param[in]   max_depth       : maximum depth of the sub folders (0: tar_folder only, negative: unlimited) [type int]
+#  @param[in]   date_format     : date folder format. The date folders are not scanned. [type Optional[str]]
+#  @retval      file            : absolute path of a target file [type Iterator[FileRecord]]
+def scan_folders(tar_folders: List[str], list_ext: List[str], recursive: bool = False, include: Optional[List[str]] = None,
+                 exclude: Optional[List[str]] = None, max_depth: int = -1, date_format: Optional[str] = None) -> Iterator[FileRecord]:
+    for tar_folder in tar_folders:
+        for rel in scan_files(tar_folder, list_ext, recursive, include, exclude, max_depth, date_format):
+            yield FileRecord(os.path.join(tar_folder, rel), rel.entry)
+
+## @fn          match_globs()
+#  @brief       Checks whether the path or its file name matches one of the glob patterns.
+#  @param[in]   rel             : relative path [type str]
+#  @param[in]   patterns        : glob patterns [type Optional[List[str]]]
+#  @retval      bool            : result value [type bool]
+def match_globs(rel: str, patterns: Optional[List[str]]) -> bool:
+    if not patterns:
+        return False
+    rel_posix = rel.replace(os.sep, '/')
+    name = os.path.basename(rel)
+    return any(fnmatch.fnmatch(rel_posix, pat) or fnmatch.fnmatch(name, pat) for pat in patterns)
+
+## @fn          is_date_dir()
+#  @brief       Checks whether the folder name is a date folder created with date_format (the first folder level when date_format contains "/").
+#  @param[in]   name            : folder name [type str]
+#  @param[in]   date_format     : date folder format [type Optional[str]]
+#  @retval      bool            : result value [type bool]
+def is_date_dir(name: str, date_format: Optional[str]) -> bool:
+    if not date_format:
+        return False
+    first_format = date_format.replace('\\', '/').split('/')[0]
+    try:
+        datetime.datetime.strptime(name, first_format)
+        return True
+    except ValueError:
+        return False
+
+class Inotify:
+    """
+    Minimal inotify wrapper (Linux, ctypes). Only the file names that were
+    created, closed after writing or moved in are reported.
+    """
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_Q_OVERFLOW = 0x00004000
+    IN_ISDIR = 0x40000000
+    IN_NONBLOCK = 0o4000
+    IN_CLOEXEC = 0o2000000
+    WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+    EVENT_HEADER = struct.Struct('iIII')
+
+    def __init__(self, libc: Any, fd: int, date_format: Optional[str] = None) -> None:
+        self._libc = libc
+        self._fd = fd
+        self._date_format = date_format
+        # watch descriptor -> folder relative to the target folder
+        self._wds: Dict[int, str] = {}
+
+    @classmethod
+    def create(cls, date_format: Optional[str] = None) -> Optional["Inotify"]:
+        if not sys.platform.startswith('linux'):
+            return None
+        try:
+            import ctypes
+            import ctypes.util
+            libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+            fd = libc.inotify_init1(cls.IN_NONBLOCK | cls.IN_CLOEXEC)
+        except (OSError, AttributeError):
+            return None
+        if fd < 0:
+            return None
+        return cls(libc, fd, date_format)
+
+    def add_dir(self, path: str, rel_dir: str) -> bool:
+        if rel_dir in self._wds.values():
+            return True
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(path), self.WATCH_MASK)
+        if wd < 0:
+            return False
+        self._wds[wd] = rel_dir
+        return True
+
+    ## @fn          wait()
+    #  @brief       Waits for events up to timeout seconds.
+    #  @param[in]   timeout         : timeout (seconds) [type float]
+    #  @retval      names           : changed paths relative to the target folder. None if a full rescan is needed (queue overflow or a new folder). [type Optional[Set[str]]]
+    def wait(self, timeout: float) -> Optional[Set[str]]:
+        names: Set[str] = set()
+        readable, _, _ = select.select([self._fd], [], [], max(0.0, timeout))
+        if not readable:
+            return names
+        rescan = False
+        while True:
+            try:
+                buf = os.read(self._fd, 65536)
+            except BlockingIOError:
+                break
+            pos = 0
+            while pos + self.EVENT_HEADER.size <= len(buf):
+                wd, mask, cookie, length = self.EVENT_HEADER.unpack_from(buf, pos)
+                pos += self.EVENT_HEADER.size
+                name = os.fsdecode(buf[pos:pos + length].rstrip(b'\x00'))
+                pos += length
+                if mask & self.IN_Q_OVERFLOW:
+                    rescan = True
+                elif mask & self.IN_ISDIR:
+                    # A new folder is added by the next full scan. The date folders created by the move are ignored.
+                    if not is_date_dir(name, self._date_format):
+                        rescan = True
+                elif wd in self._wds and name:
+                    rel_dir = self._wds[wd]
+                    names.add(os.path.join(rel_dir, name) if rel_dir else name)
+        return None if rescan else names
+
+    def close(self) -> None:
+        os.close(self._fd)
+
+class FolderWatcher:
+    """
+    Detects new or changed files in the target folder between polling cycles.
+
+    inotify is used when it is available. Otherwise the folder is scanned
+    with os.scandir() every cycle and compared with the previous state.
+    A file is reported only after its size and mtime have been stable for
+    `settle` seconds, so files still being copied are not moved.
+    """
+    def __init__(self, tar_folder: str, list_ext: List[str], settle: float, recursive: bool = False, include: Optional[List[str]] = None,
+                 exclude: Optional[List[str]] = None, max_depth: int = -1, date_format: Optional[str] = None, use_inotify: bool = True) -> None:
+        self.tar_folder = tar_folder
+        self.list_ext = list_ext
+        self.settle = settle
+        self.recursive = recursive
+        self.include = include
+        self.exclude = exclude
+        self.max_depth = max_depth
+        self.date_format = date_format
+        self._set_ext = {ext.lower() for ext in list_ext}
+        # file -> ((size, mtime_ns), stable since). Files waiting until they are stable.
+        self._pending: Dict[str, Tuple[Tuple[int, int], float]] = {}
+        # file -> (size, mtime_ns) when it was reported. Reported files are reported again only if they change.
+        self._reported: Dict[str, Tuple[int, int]] = {}
+        self._inotify = Inotify.create(date_format) if use_inotify else None
+        self._need_scan = True
+
+    ## @fn          poll()
+    #  @brief       Waits for the next cycle and returns the files that are ready to be moved.
+    #  @param[in]   timeout         : polling interval (seconds) [type float]
+    #  @retval      files           : paths relative to the target folder, with the stat result of the settle check [type List[FileRecord]]
+    def poll(self, timeout: float) -> List[FileRecord]:
+        candidates: Set[str]
+        if self._need_scan:
+            # The first cycle (and a cycle after an inotify overflow) scans the whole folder without waiting.
+            candidates = self._scan()
+        elif self._inotify is not None:
+            wait = timeout if not self._pending else min(timeout, max(self.settle, 0.1))
+            changed = self._inotify.wait(wait)
+            if changed is None:
+                candidates = self._scan()
             else:
-                new_path = safe_move(file, newdir)
-                print(f"{file} is moved. {newdir}")
+                candidates = {rel for rel in changed if self._is_target(rel)} | set(self._pending)
         else:
-            #if(ext.lower()==".jpg") or (ext.lower()==".jpeg"):
-            if(ext.lower() in picture_ext):
-                print (f"    {file} not exist exif. exif='DateTimeOriginal'.")
+            time.sleep(timeout)
+            candidates = self._scan()
+
+        now = time.time()
+        ready: List[FileRecord] = []
+        for rel in sorted(candidates):
+            try:
+                SYSCALLS.add('stat')
+                st = os.stat(os.path.join(self.tar_folder, rel))
+            except OSError:
+                self._pending.pop(rel, None)
+                self._reported.pop(rel, None)
+                continue
+            sig = (st.st_size, st.st_mtime_ns)
+            if self._reported.get(rel) == sig:
+                continue
+            prev = self._pending.get(rel)
+            if prev is None:
+                # A file seen for the first time is treated as stable since its mtime.
+                since = min(now, st.st_mtime)
+            elif prev[0] != sig:
+                since = now
+            else:
+                since = prev[1]
+            if now - since >= self.settle:
+                self._pending.pop(rel, None)
+                self._reported[rel] = sig
+                ready.append(FileRecord(rel, st=st))
             else:
-                print (f"    {file} not exist Date information. ")
+                self._pending[rel] = (sig, since)
+        return ready
+
+    ## @fn          forget_moved()
+    #  @brief       Forgets the reported files that no longer exist (moved), so that the state stays small.
+    #  @param[in]   files           : reported files [type List[str]]
+    #  @retval      None            : 
+    def forget_moved(self, files: List[str]) -> None:
+        for rel in files:
+            if not os.path.lexists(os.path.join(self.tar_folder, rel)):
+                self._reported.pop(rel, None)
+
+    def close(self) -> None:
+        if self._inotify is not None:
+            self._inotify.close()
+            self._inotify = None
+
+    def _is_target(self, rel: str) -> bool:
+        if os.path.splitext(rel)[1].lower() not in self._set_ext:
+            return False
+        if self.include and not match_globs(rel, self.include):
+            return False
+        return not match_globs(rel, self.exclude)
+
+    def _scan(self) -> Set[str]:
+        self._need_scan = False
+        with STAGE_TIMER.measure('scan'):
+            files = set(scan_files(self.tar_folder, self.list_ext, self.recursive, self.include, self.exclude, self.max_depth, self.date_format))
+        # Forget the files that disappeared.
+        for rel in list(self._reported):
+            if rel not in files:
+                del self._reported[rel]
+        for rel in list(self._pending):
+            if rel not in files:
+                del self._pending[rel]
+        if self._inotify is not None:
+            dirs = {os.path.dirname(rel) for rel in files} | {''}
+            if self.recursive:
+                dirs |= set(iter_scan_dirs(self.tar_folder, self.exclude, self.max_depth, self.date_format))
+            for rel_dir in dirs:
+                if not self._inotify.add_dir(os.path.join(self.tar_folder, rel_dir) if rel_dir else self.tar_folder, rel_dir):
+                    # Too many watches. Fall back to scanning.
+                    self._inotify.close()
+                    self._inotify = None
+                    break
+        return files
+
+## @fn          iter_scan_dirs()
+#  @brief       Enumerates the sub folders that scan_files() scans with recursive=True.
+#  @param[in]   tar_folder      : target folder [type str]
+#  @param[in]   exclude         : glob patterns of the folders to skip [type Optional[List[str]]]
+#  @param[in]   max_depth       : maximum depth of the sub folders (negative: unlimited) [type int]
+#  @param[in]   date_format     : date folder format. The date folders are skipped. [type Optional[str]]
+#  @retval      rel_dir         : folder relative to tar_folder [type Iterator[str]]
+def iter_scan_dirs(tar_folder: str, exclude: Optional[List[str]], max_depth: int, date_format: Optional[str]) -> Iterator[str]:
+    stack: List[Tuple[str, int]] = [('', 0)]
+    while stack:
+        rel_dir, depth = stack.pop()
+        if 0 <= max_depth <= depth:
+            continue
+        try:
+            with os.scandir(os.path.join(tar_folder, rel_dir) if rel_dir else tar_folder) as it:
+                for entry in it:
+                    if not entry.is_dir(follow_symlinks=False):
+                        continue
+                    rel = os.path.join(rel_dir, entry.name) if rel_dir else entry.name
+                    if is_date_dir(entry.name, date_format) or match_globs(rel, exclude):
+                        continue
+                    yield rel
+                    stack.append((rel, depth + 1))
+        except OSError:
+            continue
+
+## @fn          watch_folder()
+#  @brief       Keeps watching the target folder and moves the files reported by the watcher. Stops with Ctrl+C.
+#  @param[in]   watcher         : folder watcher [type FolderWatcher]
+#  @param[in]   dict_tar_ext    : extension information [type ExtDict]
+#  @param[in]   url_ffmpeg      : ffmpeg download URL [type str]
+#  @param[in]   date_format     : date folder format [type str]
+#  @param[in]   interval        : polling interval (seconds) [type float]
+#  @param[in]   jobs            : number of workers [type int]
+#  @param[in]   executor        : 'thread' or 'process' [type str]
+#  @param[in]   collision       : collision policy [type str]
+#  @param[in]   cache           : metadata cache [type Optional[MetaCache]]
+#  @param[in]   dest            : destination folder of the date folders (None: next to the file) [type Optional[str]]
+#  @param[in]   max_cycles      : number of cycles (None: until Ctrl+C) [type Optional[int]]
+#  @retval      None            : 
+def watch_folder(watcher: FolderWatcher, dict_tar_ext: ExtDict, url_ffmpeg: str, date_format: str, interval: float, jobs: int = 1,
+                 executor: str = 'thread', collision: str = 'skip', cache: Optional["MetaCache"] = None, dest: Optional[str] = None, max_cycles: Optional[int] = None) -> None:
+    mode = "inotify" if watcher._inotify is not None else "scandir"
+    print(f"watching the target folder. (mode={mode}, interval={interval} sec, settle={watcher.settle} sec) Press Ctrl+C to stop.")
+    cycles = 0
+    try:
+        while (max_cycles is None) or (cycles < max_cycles):
+            ready = watcher.poll(interval)
+            REPORTER.scanned += len(ready)
+            if ready:
+                move_picture([FileRecord(os.path.join(watcher.tar_folder, rel), st=rel.stat()) for rel in ready], dict_tar_ext, url_ffmpeg, date_format, jobs, executor, collision, cache, dest)
+                watcher.forget_moved(ready)
+            cycles += 1
+    except KeyboardInterrupt:
+        print("watch stopped.")
+    finally:
+        watcher.close()
+
+class StageTimer:
+    """
+    Accumulates the time spent in each stage of a run (scan, cache lookup,
+    extract per extractor, mkdir, collision check, move, copy).
+
+    It is always on. A stage costs one perf_counter() pair, which is small
+    compared with the file system calls it measures. The stages running in
+    worker threads are summed, so the total can exceed the wall time.
+    """
+    def __init__(self) -> None:
+        # stage -> [count, seconds]
+        self._stats: Dict[str, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def add(self, stage: str, seconds: float, count: int = 1) -> None:
+        with self._lock:
+            item = self._stats.get(stage)
+            if item is None:
+                self._stats[stage] = [count, seconds]
+            else:
+                item[0] += count
+                item[1] += seconds
+
+    @contextlib.contextmanager
+    def measure(self, stage: str) -> Iterator[None]:
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - t0)
+
+    ## @fn          iter()
+    #  @brief       Passes the items of the iterable through and records the time spent producing each item.
+    #  @param[in]   stage           : stage name [type str]
+    #  @param[in]   iterable        : iterable such as the scan_files() generator [type Iterable[Any]]
+    #  @retval      item            : the items of the iterable [type Iterator[Any]]
+    def iter(self, stage: str, iterable: Iterable[Any]) -> Iterator[Any]:
+        it = iter(iterable)
+        while True:
+            t0 = time.perf_counter()
+            try:
+                item = next(it)
+            except StopIteration:
+                self.add(stage, time.perf_counter() - t0, 0)
+                return
+            self.add(stage, time.perf_counter() - t0)
+            yield item
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stats.clear()
+
+    def stats(self) -> Dict[str, Tuple[int, float]]:
+        with self._lock:
+            return {stage: (int(item[0]), item[1]) for stage, item in self._stats.items()}
+
+    def summary(self) -> str:
+        lines = [f"{'stage':<24} {'count':>9} {'total[s]':>10} {'mean[ms]':>10}"]
+        for stage, (count, seconds) in sorted(self.stats().items()):
+            mean = seconds / count * 1000.0 if count else 0.0
+            lines.append(f"{stage:<24} {count:>9} {seconds:>10.3f} {mean:>10.3f}")
+        return "\n".join(lines)
+
+STAGE_TIMER = StageTimer()
+
+class SyscallCounter:
+    """
+    Counts the file system calls of a run (folder listing, stat, open of a
+    date source, mkdir, rename, copy).
+
+    The calls made for a FileRecord are counted on the record and are added
+    to the totals when the result of the file is reported, so the calls of
+    the worker processes are counted as well. The other calls are added to
+    the totals at once. An open is the open/read/close of one date source,
+    and a copy is the whole copy of one file.
+    """
+    def __init__(self) -> None:
+        self._counts: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def add(self, call: str, file: Optional[str] = None, count: int = 1) -> None:
+        if isinstance(file, FileRecord):
+            # A file is handled by one thread at a time, so the record is not locked.
+            file.syscalls[call] = file.syscalls.get(call, 0) + count
+            return
+        with self._lock:
+            self._counts[call] = self._counts.get(call, 0) + count
+
+    ## @fn          merge()
+    #  @brief       Adds the calls counted on the record to the totals.
+    #  @param[in]   file            : reported file [type str]
+    #  @retval      calls           : calls of the file. None if the file is not a FileRecord. [type Optional[Dict[str, int]]]
+    def merge(self, file: str) -> Optional[Dict[str, int]]:
+        if not isinstance(file, FileRecord):
+            return None
+        calls, file.syscalls = file.syscalls, {}
+        with self._lock:
+            for call, count in calls.items():
+                self._counts[call] = self._counts.get(call, 0) + count
+        return calls
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counts.clear()
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._counts)
+
+    def summary(self, files: int) -> str:
+        lines = [f"{'call':<24} {'count':>9} {'per file':>10}"]
+        counts = self.counts()
+        for call, count in sorted(counts.items()):
+            lines.append(f"{call:<24} {count:>9} {count / files if files else 0.0:>10.2f}")
+        total = sum(counts.values())
+        lines.append(f"{'total':<24} {total:>9} {total / files if files else 0.0:>10.2f}")
+        return "\n".join(lines)
+
+SYSCALLS = SyscallCounter()
+
+# Reason codes of the per-file events.
+#   ok: moved/copied as is, renamed: moved/copied with a suffix (collision=rename/compare)
+#   exists: the name exists in the date folder, identical: the same contents exist (collision=compare)
+#   no_exif: a picture without an EXIF date, no_date: no date information
+#   not_found: the source file disappeared, verify_failed: the copy does not match the source (--verify)
+#   failed: the file could not be moved or copied (an OSError, or an unexpected error with --async).
+#           The error is reported as a warning with the same code.
+#   copied_source_kept: the copy is complete in the date folder, but the source could not be removed
+#           (action 'copied'). The error is reported as a warning with the same code.
+# Reason codes of the warning events.
+#   no_creation_time: ffprobe found no creation time, ffprobe_missing: ffprobe could not be set up
+#   ffprobe_timeout / ffprobe_failed: ffprobe timed out / could not be executed
+#   filename_mismatch: the date of the file name differs from the metadata (the metadata is used)
+#   folder_unreadable: a folder could not be scanned, permission_retry: a move is retried after PermissionError
+REASON_CODES = ['ok', 'renamed', 'exists', 'identical', 'no_exif', 'no_date', 'not_found', 'verify_failed', 'failed', 'copied_source_kept']
+WARNING_CODES = ['no_creation_time', 'ffprobe_missing', 'ffprobe_timeout', 'ffprobe_failed', 'filename_mismatch', 'folder_unreadable', 'permission_retry', 'failed', 'copied_source_kept']
+LOG_FORMAT_CHOICES = ['text', 'jsonl']
+
+class Reporter:
+    """
+    Reports the result of each file.
+
+    The text output is the per-file print. With quiet=True it is replaced by
+    one progress line (rate and ETA) on stderr that is redrawn at most every
+    PROGRESS_INTERVAL seconds. With a log file, every result is also written
+    as a JSON Lines event (file, extractor, date, action, reason code,
+    destination, duration). The events are buffered and written in blocks.
+    The warnings of the extraction and the move are reported in the same way
+    (printed unless quiet, 'warning' events in the log file).
+    """
+    PROGRESS_INTERVAL = 0.5
+    BUFFER_EVENTS = 1000
+
+    def __init__(self, quiet: bool = False, log_file: Optional[str] = None, progress: Optional[bool] = None) -> None:
+        self.quiet = quiet
+        self.progress = progress if progress is not None else (quiet and sys.stderr.isatty())
+        self.log_file = log_file
+        self._log = open(log_file, 'a', encoding='utf-8') if log_file else None
+        self._buffer: List[str] = []
+        self._lock = threading.Lock()
+        self._start = time.perf_counter()
+        self._last_progress = 0.0
+        # file -> start time of the commit / extraction time. Removed when the event is reported.
+        self._begin: Dict[str, float] = {}
+        self._extract_seconds: Dict[str, float] = {}
+        self.scanned = 0
+        self.done = 0
+        self.warnings = 0
+        self.counts: Dict[str, int] = {}
+        # Warnings of a worker process, returned with the result of the file (take_warnings()). None: report at once.
+        self._collected: Optional[List[Tuple[str, str, str]]] = None
+        # Target folders for the per-folder summary (set_folders()). folder -> {action: count}
+        self._folders: List[str] = []
+        self._folder_of_dir: Dict[str, Optional[str]] = {}
+        self.folder_counts: Dict[str, Dict[str, int]] = {}
+
+    ## @fn          set_folders()
+    #  @brief       Sets the target folders. The results are also counted per target folder.
+    #  @param[in]   folders         : absolute paths of the target folders [type List[str]]
+    #  @retval      None            : 
+    def set_folders(self, folders: List[str]) -> None:
+        with self._lock:
+            # The deepest folder is matched first when the folders are nested.
+            self._folders = sorted(folders, key=len, reverse=True)
+            self._folder_of_dir = {}
+            self.folder_counts = {folder: {} for folder in folders}
+
+    def _folder_of(self, file: str) -> Optional[str]:
+        dirname = os.path.dirname(file if os.path.isabs(file) else os.path.abspath(file))
+        if dirname not in self._folder_of_dir:
+            found = None
+            for folder in self._folders:
+                if dirname == folder or dirname.startswith(folder.rstrip(os.sep) + os.sep):
+                    found = folder
+                    break
+            self._folder_of_dir[dirname] = found
+        return self._folder_of_dir[dirname]
+
+    ## @fn          count_scanned()
+    #  @brief       Passes the files through and counts them for the progress display.
+    #  @param[in]   files           : target files [type Iterable[str]]
+    #  @retval      file            : the target files [type Iterator[str]]
+    def count_scanned(self, files: Iterable[str]) -> Iterator[str]:
+        for file in files:
+            self.scanned += 1
+            yield file
+
+    def note_extract(self, file: str, seconds: float) -> None:
+        with self._lock:
+            self._extract_seconds[file] = seconds
+
+    def begin(self, file: str) -> None:
+        with self._lock:
+            self._begin[file] = time.perf_counter()
+        if not self.quiet:
+            print("file=%s" % file)
+
+    ## @fn          event()
+    #  @brief       Reports the result of the file.
+    #  @param[in]   file            : source file [type str]
+    #  @param[in]   action          : 'moved', 'copied', 'skipped', 'no_date', 'planned' or 'error' [type str]
+    #  @param[in]   reason          : reason code (REASON_CODES) [type str]
+    #  @param[in]   res             : date information of the file [type Optional[FileDate]]
+    #  @param[in]   dest            : destination file, or the date folder for 'planned' [type Optional[str]]
+    #  @retval      None            : 
+    def event(self, file: str, action: str, reason: str, res: Optional["FileDate"] = None, dest: Optional[str] = None) -> None:
+        now = time.perf_counter()
+        with self._lock:
+            begin = self._begin.pop(file, None)
+            duration = self._extract_seconds.pop(file, 0.0) + (now - begin if begin is not None else 0.0)
+            calls = SYSCALLS.merge(file)
+            self.done += 1
+            self.counts[action] = self.counts.get(action, 0) + 1
+            if self._folders:
+                folder = self._folder_of(file)
+                if folder is not None:
+                    counts = self.folder_counts[folder]
+                    counts[action] = counts.get(action, 0) + 1
+            if not self.quiet:
+                text = self.format_text(file, action, reason, dest)
+                if text is not None:
+                    print(text)
+            if self._log is not None:
+                date = None
+                if res is not None and res['year'] is not None and res['month'] is not None and res['day'] is not None:
+                    date = f"{int(res['year']):04}-{int(res['month']):02}-{int(res['day']):02}"
+                self._buffer.append(json.dumps({
+                    'file': file,
+                    'extractor': res['extractor'] if res is not None else None,
+                    'date': date,
+                    'action': action,
+                    'reason': reason,
+                    'dest': dest,
+                    'duration_ms': round(duration * 1000.0, 3),
+                    'syscalls': calls,
+                }, ensure_ascii=False))
+                if len(self._buffer) >= self.BUFFER_EVENTS:
+                    self._flush()
+            if self.progress and now - self._last_progress >= self.PROGRESS_INTERVAL:
+                self._last_progress = now
+                self._draw_progress(now)
+
+    ## @fn          warning()
+    #  @brief       Reports a warning of the file. It is printed unless quiet, and written to the log file as a 'warning' event.
+    #  @param[in]   file            : target file [type str]
+    #  @param[in]   reason          : warning code (WARNING_CODES) [type str]
+    #  @param[in]   message         : text of the warning [type str]
+    #  @retval      None            : 
+    def warning(self, file: str, reason: str, message: str) -> None:
+        collected = self._collected
+        if collected is not None:
+            collected.append((file, reason, message))
+            return
+        with self._lock:
+            self.warnings += 1
+            if not self.quiet:
+                print(message)
+            if self._log is not None:
+                self._buffer.append(json.dumps({'file': file, 'action': 'warning', 'reason': reason, 'message': message}, ensure_ascii=False))
+                if len(self._buffer) >= self.BUFFER_EVENTS:
+                    self._flush()
+
+    ## @fn          collect_warnings()
+    #  @brief       Keeps the warnings instead of reporting them. Used in the worker processes, whose warnings are reported by the main process.
+    #  @param[in]   None            : 
+    #  @retval      None            : 
+    def collect_warnings(self) -> None:
+        self._collected = []
+
+    def take_warnings(self) -> List[Tuple[str, str, str]]:
+        if not self._collected:
+            return []
+        warnings, self._collected = self._collected, []
+        return warnings
+
+    @staticmethod
+    def format_text(file: str, action: str, reason: str, dest: Optional[str]) -> Optional[str]:
+        if action == 'restored':
+            return f"{file} is restored. {dest}"
+        if action in ('moved', 'copied'):
+            newdir = os.path.dirname(cast(str, dest))
+            if reason == 'renamed':
+                return f"{file} is {action}. {newdir} (renamed to {os.path.basename(cast(str, dest))})"
+            if reason == 'copied_source_kept':
+                return f"{file} is {action}. {newdir} (the source is kept)"
+            return f"{file} is {action}. {newdir}"
+        if reason == 'identical':
+            return f"{dest} already exists. (same contents)"
+        if reason == 'exists':
+            return f"{dest} already exists."
+        if reason == 'no_exif':
+            return f"    {file} not exist exif. exif='DateTimeOriginal'."
+        if reason == 'no_date':
+            return f"    {file} not exist Date information. "
+        if reason == 'not_found':
+            return f"    {file} not found. skipped."
+        if reason == 'verify_failed':
+            return f"Warning. The copy does not match the source (checksum). {file}"
+        return None
+
+    def summary(self) -> str:
+        elapsed = time.perf_counter() - self._start
+        counts = ", ".join(f"{action}={count}" for action, count in sorted(self.counts.items()))
+        if self.warnings:
+            counts += f" (warnings={self.warnings})"
+        return f"{self.done} files in {elapsed:.1f} sec. {counts}"
+
+    ## @fn          folder_summary()
+    #  @brief       Gets the result of each target folder.
+    #  @param[in]   None            : 
+    #  @retval      lines           : one line per target folder [type List[str]]
+    def folder_summary(self) -> List[str]:
+        lines = []
+        for folder, folder_counts in self.folder_counts.items():
+            counts = ", ".join(f"{action}={count}" for action, count in sorted(folder_counts.items()))
+            lines.append(f"{folder}: {sum(folder_counts.values())} files. {counts}")
+        return lines
+
+    def close(self) -> None:
+        with self._lock:
+            if self.progress and self.done:
+                self._draw_progress(time.perf_counter())
+                sys.stderr.write("\n")
+            if self._log is not None:
+                self._flush()
+                self._log.close()
+                self._log = None
+
+    def _flush(self) -> None:
+        if self._log is not None and self._buffer:
+            self._log.write("\n".join(self._buffer) + "\n")
+            self._buffer.clear()
+
+    def _draw_progress(self, now: float) -> None:
+        elapsed = max(now - self._start, 1e-9)
+        rate = self.done / elapsed
+        remaining = max(self.scanned - self.done, 0)
+        if rate > 0:
+            eta = str(datetime.timedelta(seconds=int(remaining / rate)))
+        else:
+            eta = "--:--:--"
+        sys.stderr.write(f"\r{self.done}/{self.scanned} files  {rate:.1f} files/s  ETA {eta}  ")
+        sys.stderr.flush()
+
+REPORTER = Reporter()
+
+## @fn          configure_reporter()
+#  @brief       Replaces the reporter of the per-file results.
+#  @param[in]   quiet           : no per-file text output (--quiet) [type bool]
+#  @param[in]   log_format      : 'text' or 'jsonl' [type str]
+#  @param[in]   log_file        : JSON Lines event file (log_format='jsonl') [type Optional[str]]
+#  @retval      None            : 
+def configure_reporter(quiet: bool, log_format: str = 'text', log_file: Optional[str] = None) -> None:
+    global REPORTER
+    REPORTER.close()
+    REPORTER = Reporter(quiet, log_file if log_format == 'jsonl' else None)
+
+class Journal:
+    """
+    Append-only journal of the moves (JSON Lines).
+
+    A 'plan' record is written when the date folder of a file is decided,
+    and a 'done' record when the file was moved (or skipped). Files without
+    date information get a 'nodate' record, and 'undone' records are written
+    by --undo. Every record is written to the OS with one write() call, so a
+    killed process loses nothing; os.fsync() is called in batches
+    (SYNC_ENTRIES records or SYNC_SECONDS), so a power failure loses at most
+    the last batch.
+    """
+    SYNC_ENTRIES = 256
+    SYNC_SECONDS = 1.0
+
+    def __init__(self, path: Optional[str] = None) -> None:
+        self.path = path
+        self._fd: Optional[int] = None
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        self._lock = threading.Lock()
+        if path is not None:
+            self._fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_APPEND | getattr(os, 'O_BINARY', 0), 0o644)
+            # The last line of a killed run may be incomplete. The new records start on a new line.
+            size = os.fstat(self._fd).st_size
+            if size > 0:
+                os.lseek(self._fd, size - 1, os.SEEK_SET)
+                if os.read(self._fd, 1) != b'\n':
+                    os.write(self._fd, b'\n')
+
+    @property
+    def enabled(self) -> bool:
+        return self._fd is not None
+
+    def plan(self, file: str, newdir: str, res: Optional["FileDate"] = None) -> None:
+        record: Dict[str, Any] = {'op': 'plan', 'src': os.path.abspath(file), 'dest_dir': os.path.abspath(newdir)}
+        if res is not None:
+            record['extractor'] = res['extractor']
+        self._append(record)
+
+    def no_date(self, res: "FileDate") -> None:
+        self._append({'op': 'nodate', 'src': os.path.abspath(res['file']), 'extractor': res['extractor']})
+
+    def done(self, file: str, action: str, reason: str, dst: Optional[str]) -> None:
+        self._append({'op': 'done', 'src': os.path.abspath(file), 'dst': os.path.abspath(dst) if dst is not None else None, 'action': action, 'reason': reason})
+
+    def undone(self, file: str, dst: str) -> None:
+        self._append({'op': 'undone', 'src': file, 'dst': dst})
+
+    def _append(self, record: Dict[str, Any]) -> None:
+        if self._fd is None:
+            return
+        data = (json.dumps(record, ensure_ascii=False) + "\n").encode('utf-8')
+        with self._lock:
+            os.write(self._fd, data)
+            self._unsynced += 1
+            now = time.monotonic()
+            if self._unsynced >= self.SYNC_ENTRIES or now - self._last_sync >= self.SYNC_SECONDS:
+                self._sync(now)
+
+    def _sync(self, now: float) -> None:
+        if self._fd is not None and self._unsynced:
+            os.fsync(self._fd)
+        self._unsynced = 0
+        self._last_sync = now
+
+    def close(self) -> None:
+        with self._lock:
+            if self._fd is not None:
+                self._sync(time.monotonic())
+                os.close(self._fd)
+                self._fd = None
+
+    ## @fn          read()
+    #  @brief       Reads a journal. A broken line (e.g. the last line of a killed run) is skipped.
+    #  @param[in]   path            : journal file [type str]
+    #  @retval      records         : records in the written order [type List[Dict[str, Any]]]
+    @staticmethod
+    def read(path: str) -> List[Dict[str, Any]]:
+        records: List[Dict[str, Any]] = []
+        broken = 0
+        try:
+            with open(path, 'r', encoding='utf-8', errors='replace') as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        broken += 1
+                        continue
+                    if isinstance(record, dict) and 'op' in record and 'src' in record:
+                        records.append(record)
+                    else:
+                        broken += 1
+        except OSError as e:
+            die_print(f"Error detect. The journal file could not be read.\njournal={path}\n{type(e)}\n{e}")
+        if broken:
+            print(f"Warning. {broken} broken journal lines are skipped. journal={path}")
+        return records
+
+    ## @fn          last_records()
+    #  @brief       Gets the last record of each source file.
+    #  @param[in]   records         : journal records [type List[Dict[str, Any]]]
+    #  @retval      last            : {source file: last record} in the order of the first record of each file [type Dict[str, Dict[str, Any]]]
+    @staticmethod
+    def last_records(records: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+        last: Dict[str, Dict[str, Any]] = {}
+        for record in records:
+            last[record['src']] = record
+        return last
+
+JOURNAL = Journal()
+
+## @fn          configure_journal()
+#  @brief       Replaces the move journal.
+#  @param[in]   path            : journal file (None: no journal) [type Optional[str]]
+#  @retval      None            : 
+def configure_journal(path: Optional[str]) -> None:
+    global JOURNAL
+    JOURNAL.close()
+    try:
+        JOURNAL = Journal(path)
+    except OSError as e:
+        die_print(f"Error detect. The journal file could not be opened.\njournal={path}\n{type(e)}\n{e}")
+
+## @fn          resume_journal()
+#  @brief       Finishes the moves that were planned but not done in the journal. The dates are not extracted again.
+#  @param[in]   records         : journal records [type List[Dict[str, Any]]]
+#  @param[in]   collision       : collision policy ('skip', 'rename' or 'compare') [type str]
+#  @retval      known           : source files recorded in the journal. They are not processed again. [type Set[str]]
+def resume_journal(records: List[Dict[str, Any]], collision: str = 'skip') -> Set[str]:
+    last = Journal.last_records(records)
+    index = DestIndex()
+    resumed = 0
+    for src, record in last.items():
+        if record['op'] != 'plan':
+            continue
+        REPORTER.scanned += 1
+        REPORTER.begin(src)
+        resumed += 1
+        # A file moved by the killed run after the last record, or removed, is reported as not_found.
+        move_to_date_dir(src, record['dest_dir'], index, collision)
+    MOVE_ENGINE.wait()
+    print(f"resume: {len(last)} files in the journal, {resumed} planned moves are finished.")
+    # A file restored by --undo is processed again.
+    return {src for src, record in last.items() if record['op'] != 'undone'}
+
+## @fn          undo_journal()
+#  @brief       Moves the files back in the reverse order of the journal. The date folders left empty are removed.
+#  @param[in]   path            : journal file [type str]
+#  @retval      count           : number of restored files [type int]
+def undo_journal(path: str) -> int:
+    records = Journal.read(path)
+    last = Journal.last_records(records)
+    restored = 0
+    dirs: Set[str] = set()
+    for record in reversed(records):
+        src = record['src']
+        # Only the last state of each file is undone ('done' -> 'undone' once).
+        if last.get(src) is not record or record['op'] != 'done' or record.get('action') != 'moved' or not record.get('dst'):
+            continue
+        dst = record['dst']
+        REPORTER.scanned += 1
+        REPORTER.begin(dst)
+        try:
+            os.makedirs(os.path.dirname(src), exist_ok=True)
+            with STAGE_TIMER.measure('move'):
+                MOVE_ENGINE.move_file(dst, src)
+        except FileNotFoundError:
+            REPORTER.event(dst, 'skipped', 'not_found')
+            continue
+        except FileExistsError:
+            REPORTER.event(dst, 'skipped', 'exists', None, src)
+            continue
+        JOURNAL.undone(src, dst)
+        REPORTER.event(dst, 'restored', 'ok', None, src)
+        dirs.add(os.path.dirname(dst))
+        restored += 1
+    for newdir in sorted(dirs, reverse=True):
+        try:
+            os.rmdir(newdir)
+        except OSError:
+            pass
+    print(f"undo: {restored} files are restored. journal={path}")
+    return restored
+
+class FileDate(TypedDict):
+    file: str
+    year: Optional[str]
+    month: Optional[str]
+    day: Optional[str]
+    extractor: str
+
+# Executor backends of the date extraction stage.
+EXECUTOR_CHOICES = ['thread', 'process']
+# Number of files submitted ahead of the committer per worker.
+PIPELINE_DEPTH = 4
+
+def move_picture(files: Iterable[str], dict_tar_ext: ExtDict, url_ffmpeg: str, date_format: str, jobs: int = 1, executor: str = 'thread', collision: str = 'skip', cache: Optional["MetaCache"] = None, dest: Optional[str] = None):
+    # Add the script folder to the PATH environment variable.
+    add_tardir_envpath(SCR_FOLDER)
+    index = DestIndex()
+    # The dates are extracted by the workers, and the files are moved here in the input order.
+    for res in iter_file_dates(files, dict_tar_ext, url_ffmpeg, jobs, executor, cache):
+        commit_move(res, date_format, index, collision, dest)
+    MOVE_ENGINE.wait()
+
+## @fn          iter_file_dates()
+#  @brief       Extracts the date information of the files. When jobs > 1, the extraction runs in parallel workers.
+#               When jobs = 1, only the files whose date sources use ffprobe run in ffprobe_jobs threads, so that their probes overlap.
+#  @param[in]   files           : target files [type Iterable[str]]
+#  @param[in]   dict_tar_ext    : extension information [type ExtDict]
+#  @param[in]   url_ffmpeg      : ffmpeg download URL [type str]
+#  @param[in]   jobs            : number of workers [type int]
+#  @param[in]   executor        : 'thread' or 'process' [type str]
+#  @param[in]   cache           : metadata cache [type Optional[MetaCache]]
+#  @retval      res             : date information in the order of files [type Iterator[FileDate]]
+def iter_file_dates(files: Iterable[str], dict_tar_ext: ExtDict, url_ffmpeg: str, jobs: int = 1, executor: str = 'thread', cache: Optional["MetaCache"] = None) -> Iterator[FileDate]:
+    # Sequential extraction, except for the files that wait for ffprobe.
+    probe_only = (jobs <= 1) and (FFPROBE_POOL.max_workers > 1) and uses_ffprobe(dict_tar_ext)
+    if probe_only:
+        jobs = FFPROBE_POOL.max_workers
+        executor = 'thread'
+    if jobs <= 1:
+        for file in files:
+            key, res = lookup_cache(cache, file, dict_tar_ext)
+            if res is None:
+                res, seconds, definitive = timed_extract_date(file, dict_tar_ext, url_ffmpeg)
+                record_extract_time(res, seconds)
+                if cache is not None and key is not None and definitive:
+                    cache.put(key, res, get_extractor_signature(file, dict_tar_ext))
+            yield res
+        return
+
+    pool: Executor
+    if executor == 'process':
+        # A worker process cannot ask the user, so ffprobe is set up here before the workers start.
+        if uses_ffprobe(dict_tar_ext):
+            setup_ffprobe(url_ffmpeg)
+        pool = ProcessPoolExecutor(max_workers=jobs, initializer=init_worker, initargs=(SCR_PATH, FFPROBE_POOL.max_workers, FFPROBE_POOL.timeout))
+    else:
+        pool = ThreadPoolExecutor(max_workers=jobs, thread_name_prefix="extract")
+    # Only a bounded number of files is submitted ahead, so that files can be an unbounded iterator.
+    # (cache key to store the result, future). The key is None for the cached results.
+    pending: Deque[Tuple[Optional["CacheKey"], "Future[Tuple[FileDate, float, bool, List[Tuple[str, str, str]]]]"]] = collections.deque()
+
+    def pop_result() -> FileDate:
+        key, future = pending.popleft()
+        res, seconds, definitive, warnings = future.result()
+        for warning in warnings:
+            REPORTER.warning(*warning)
+        record_extract_time(res, seconds)
+        if cache is not None and key is not None and definitive:
+            cache.put(key, res, get_extractor_signature(res['file'], dict_tar_ext))
+        return res
+
+    try:
+        for file in files:
+            key, res = lookup_cache(cache, file, dict_tar_ext)
+            if res is None and probe_only and not file_uses_ffprobe(file, dict_tar_ext):
+                # Read here. Its result waits in order behind the probes in flight.
+                extracted: "Future[Tuple[FileDate, float, bool, List[Tuple[str, str, str]]]]" = Future()
+                extracted.set_result(timed_extract_date(file, dict_tar_ext, url_ffmpeg) + ([],))
+                pending.append((key, extracted))
+            elif res is None:
+                pending.append((key, pool.submit(extract_task, file, dict_tar_ext, url_ffmpeg)))
+            else:
+                done: "Future[Tuple[FileDate, float, bool, List[Tuple[str, str, str]]]]" = Future()
+                done.set_result((res, 0.0, True, []))
+                pending.append((None, done))
+            if len(pending) >= jobs * PIPELINE_DEPTH:
+                yield pop_result()
+        while pending:
+            yield pop_result()
+    finally:
+        for key, future in pending:
+            future.cancel()
+        pool.shutdown(wait=True)
+
+## @fn          lookup_cache()
+#  @brief       Looks up the date information of the file in the metadata cache.
+#  @param[in]   cache           : metadata cache. None if the cache is disabled. [type Optional[MetaCache]]
+#  @param[in]   file            : target file [type str]
+#  @param[in]   dict_tar_ext    : extension information [type ExtDict]
+#  @retval      key,res         : cache key (None: the file cannot be cached) and the cached result (None: not cached) [type Tuple[Optional[CacheKey], Optional[FileDate]]]
+def lookup_cache(cache: Optional["MetaCache"], file: str, dict_tar_ext: ExtDict) -> Tuple[Optional["CacheKey"], Optional[FileDate]]:
+    if cache is None:
+        return None, None
+    with STAGE_TIMER.measure('cache'):
+        key = MetaCache.key_of(file)
+        if key is None:
+            return None, None
+        return key, cache.get(key, file, get_extractor_kind(file, dict_tar_ext), get_extractor_signature(file, dict_tar_ext))
+
+## @fn          init_worker()
+#  @brief       Initializes a worker process of the process backend. With spawn (Windows/macOS) the settings of the parent are not inherited.
+#  @param[in]   scr_path        : script path of the parent process [type str]
+#  @param[in]   ffprobe_jobs    : ffprobe_jobs of the parent process [type int]
+#  @param[in]   ffprobe_timeout : ffprobe_timeout of the parent process [type float]
+#  @retval      None            : 
+def init_worker(scr_path: str, ffprobe_jobs: int, ffprobe_timeout: float) -> None:
+    global SCR_PATH, SCR_FOLDER, _FFPROBE_SETUP_FAILED
+    SCR_PATH = scr_path
+    SCR_FOLDER = os.path.dirname(scr_path)
+    configure_ffprobe_pool(ffprobe_jobs, ffprobe_timeout)
+    # ffprobe was set up by the parent process (iter_file_dates()). When it is still missing,
+    # each movie that needs it is reported with a 'ffprobe_missing' warning, and the user is not asked again.
+    _FFPROBE_SETUP_FAILED = True
+    # The warnings are returned with the results (extract_task()) and reported by the main process.
+    REPORTER.collect_warnings()
+
+## @fn          extract_task()
+#  @brief       Extraction task of the parallel workers. The warnings of a worker process are returned with the result.
+#  @param[in]   file            : target file [type str]
+#  @param[in]   dict_tar_ext    : extension information [type ExtDict]
+#  @param[in]   url_ffmpeg      : ffmpeg download URL [type str]
+#  @retval      res,seconds,definitive,warnings : the result of timed_extract_date() and the warnings (file, code, message) [type Tuple[FileDate, float, bool, List[Tuple[str, str, str]]]]
+def extract_task(file: str, dict_tar_ext: ExtDict, url_ffmpeg: str) -> Tuple[FileDate, float, bool, List[Tuple[str, str, str]]]:
+    res, seconds, definitive = timed_extract_date(file, dict_tar_ext, url_ffmpeg)
+    return res, seconds, definitive, REPORTER.take_warnings()
+
+# Uniform result of the date extractors. Each value is None when the date was not found.
+class DateInfo(TypedDict):
+    year: Optional[int]
+    month: Optional[int]
+    day: Optional[int]
+    hour: Optional[int]
+    min: Optional[int]
+    sec: Optional[int]
+
+DATE_INFO_KEYS = ('year', 'month', 'day', 'hour', 'min', 'sec')
+
+## @fn          to_date_info()
+#  @brief       Converts the date information of the extraction functions (str or int values) to DateInfo.
+#  @param[in]   inf             : date information [type Dict[str, Any]]
+#  @retval      date_info       : date information. All values are None if year/month/day are missing or invalid. [type DateInfo]
+def to_date_info(inf: Dict[str, Any]) -> DateInfo:
+    values: Dict[str, Optional[int]] = {key: None for key in DATE_INFO_KEYS}
+    try:
+        for key in DATE_INFO_KEYS:
+            if inf.get(key) is not None:
+                values[key] = int(inf[key])
+    except (TypeError, ValueError):
+        values = {key: None for key in DATE_INFO_KEYS}
+    if values['year'] is None or values['month'] is None or values['day'] is None:
+        values = {key: None for key in DATE_INFO_KEYS}
+    else:
+        try:
+            # Reject dates that only look valid (e.g. 2024:02:30).
+            datetime.date(cast(int, values['year']), cast(int, values['month']), cast(int, values['day']))
+        except ValueError:
+            values = {key: None for key in DATE_INFO_KEYS}
+    return cast(DateInfo, values)
+
+class DateExtractor:
+    """
+    Base class of the date extractors.
+    name is recorded as the extractor of the file (cache, log, stage timing), and extensions are the lower case
+    extensions handled by the extractor. extract() returns DateInfo.
+    Third-party extractors are registered with the entry point group 'move_jpg.extractors'. The entry point
+    refers to a DateExtractor subclass (or a callable returning an instance) that sets name and extensions.
+    """
+    name: str = ''
+    extensions: List[str] = []
+
+    def __init__(self, name: Optional[str] = None, extensions: Optional[List[str]] = None) -> None:
+        if name is not None:
+            self.name = name
+        self.extensions = [ext.lower() for ext in (extensions if extensions is not None else self.extensions)]
+
+    ## @fn          signature()
+    #  @brief       Gets the signature of the extraction settings. A cached result is used only with the same signature.
+    #  @param[in]   None            : 
+    #  @retval      signature       : signature [type str]
+    def signature(self) -> str:
+        return self.name
+
+    ## @fn          extract()
+    #  @brief       Gets the date information of the file.
+    #  @param[in]   file            : target file [type str]
+    #  @param[in]   url_ffmpeg      : ffmpeg download URL [type str]
+    #  @retval      date_info       : date information [type DateInfo]
+    def extract(self, file: str, url_ffmpeg: str = "") -> DateInfo:
+        raise NotImplementedError
+
+class DateSource:
+    """
+    Base class of the date sources of a fallback chain.
+    cost is the declared cost of the source. The sources of a chain are tried in the order of the cost.
+    A fallback source is used only when no cheaper source of the chain could read the file.
+    read() returns None when the source cannot read the file, and DateInfo (all None: no date) when it can.
+    """
+    name: str = ''
+    cost: int = 0
+    fallback: bool = False
+    # False: the source does not open the file (counted by SyscallCounter).
+    opens: bool = True
+
+    def read(self, file: str, url_ffmpeg: str) -> Optional[DateInfo]:
+        raise NotImplementedError
+
+# File name date patterns. %Y %m %d %H %M %S are the date fields, * is any characters, and the other
+# characters are literal (case insensitive). A pattern is matched at the start of the file name.
+DEFAULT_FILENAME_PATTERNS = ['IMG_%Y%m%d_%H%M%S', 'PXL_%Y%m%d_%H%M%S', 'VID_%Y%m%d_%H%M%S', '%Y%m%d_%H%M%S']
+FILENAME_PATTERN_FIELDS = {
+    '%Y': r'(?P<year>\d{4})',
+    '%m': r'(?P<month>\d{2})',
+    '%d': r'(?P<day>\d{2})',
+    '%H': r'(?P<hour>\d{2})',
+    '%M': r'(?P<min>\d{2})',
+    '%S': r'(?P<sec>\d{2})',
+}
+FILENAME_PATTERN_TOKENS = re.compile(r'%[YmdHMS]|\*')
+
+## @fn          compile_filename_pattern()
+#  @brief       Compiles a file name date pattern (e.g. "IMG_%Y%m%d_%H%M%S") to a regular expression.
+#  @param[in]   pattern         : file name date pattern [type str]
+#  @retval      regex           : compiled pattern [type re.Pattern]
+@functools.lru_cache(maxsize=None)
+def compile_filename_pattern(pattern: str) -> "re.Pattern[str]":
+    regex = ''
+    pos = 0
+    for m in FILENAME_PATTERN_TOKENS.finditer(pattern):
+        regex += re.escape(pattern[pos:m.start()])
+        regex += '.*?' if m.group() == '*' else FILENAME_PATTERN_FIELDS[m.group()]
+        pos = m.end()
+    regex += re.escape(pattern[pos:])
+    return re.compile(regex, re.IGNORECASE)
+
+class FilenameSource(DateSource):
+    """Date in the file name (e.g. IMG_20240707_120000.jpg). The file is not opened."""
+    name = 'filename'
+    cost = 0
+    opens = False
+
+    def __init__(self, patterns: Optional[List[str]] = None) -> None:
+        self.patterns = [compile_filename_pattern(pattern) for pattern in (patterns if patterns is not None else DEFAULT_FILENAME_PATTERNS)]
+
+    def read(self, file: str, url_ffmpeg: str) -> Optional[DateInfo]:
+        filename = os.path.basename(file)
+        for regex in self.patterns:
+            m = regex.match(filename)
+            if m is None:
+                continue
+            fields = m.groupdict()
+            inf = to_date_info(fields)
+            try:
+                # Reject names that only look like a date (e.g. 20241399_...).
+                datetime.datetime(cast(int, inf['year']), cast(int, inf['month']), cast(int, inf['day']),
+                                  inf['hour'] or 0, inf['min'] or 0, inf['sec'] or 0)
+            except (TypeError, ValueError):
+                continue
+            return inf
+        return None
+
+## @fn          is_sampled()
+#  @brief       Decides whether the file is in the sample. The decision depends only on the file name, so it is the same in every run and worker process.
+#  @param[in]   file            : target file [type str]
+#  @param[in]   rate            : sample rate (0.0 - 1.0) [type float]
+#  @retval      sampled         : True if the file is in the sample [type bool]
+def is_sampled(file: str, rate: float) -> bool:
+    if rate <= 0.0:
+        return False
+    if rate >= 1.0:
+        return True
+    return zlib.crc32(os.path.basename(file).encode('utf-8', errors='surrogateescape')) < rate * 0x100000000
+
+class ExifSource(DateSource):
+    """JPEG/TIFF EXIF, parsed natively. DateTimeOriginal is preferred, DateTime is used when it is missing."""
+    name = 'exif'
+    cost = 1
+
+    def read(self, file: str, url_ffmpeg: str) -> Optional[DateInfo]:
+        tags = read_exif_date_tags(file)
+        if tags is None:
+            return None
+        value = tags.get(EXIF_TAG_DATETIME_ORIGINAL) or tags.get(EXIF_TAG_DATETIME) or None
+        if value is None:
+            return to_date_info({})
+        year, month, day = get_dateinf(value)
+        return to_date_info({'year': year, 'month': month, 'day': day})
+
+class HeicSource(DateSource):
+    """DateTimeOriginal of the Exif item of a HEIC file, parsed natively."""
+    name = 'heic'
+    cost = 1
+
+    def read(self, file: str, url_ffmpeg: str) -> Optional[DateInfo]:
+        tags = read_heic_exif_tags(file)
+        if tags is None:
+            return None
+        return to_date_info(parse_exif_datetime(tags.get(EXIF_TAG_DATETIME_ORIGINAL)))
+
+class IsobmffSource(DateSource):
+    """Creation time of moov/mvhd (CR3: CMT1/CMT2) of an ISO BMFF file, parsed natively."""
+    name = 'isobmff'
+    cost = 1
+
+    def read(self, file: str, url_ffmpeg: str) -> Optional[DateInfo]:
+        dt = read_isobmff_creation_time(file)
+        if dt is None:
+            return None
+        return to_date_info({'year': dt.year, 'month': dt.month, 'day': dt.day, 'hour': dt.hour, 'min': dt.minute, 'sec': dt.second})
+
+class RawSource(DateSource):
+    """DateTimeOriginal of a TIFF based RAW file (get_date_info_fm_raw()). piexif is used when the IFDs cannot be parsed natively."""
+    name = 'raw'
+    cost = 2
+
+    def read(self, file: str, url_ffmpeg: str) -> Optional[DateInfo]:
+        try:
+            return to_date_info(get_date_info_fm_raw(file, EXIF_TAG_DATETIME_ORIGINAL, 0))
+        except Exception:
+            return None
+
+# The head of the file searched for an embedded XMP packet.
+XMP_SCAN_BYTES = 256 * 1024
+# XMP date properties in the order of preference. The value is "YYYY-MM-DD[THH:MM[:SS]]".
+XMP_DATE_PROPERTIES = [b'exif:DateTimeOriginal', b'xmp:CreateDate', b'photoshop:DateCreated']
+XMP_DATE_PATTERN = re.compile(rb'(?P<prop>exif:DateTimeOriginal|xmp:CreateDate|photoshop:DateCreated)\s*(?:=\s*["\']|>)\s*'
+                              rb'(?P<year>\d{4})-(?P<month>\d{2})-(?P<day>\d{2})(?:T(?P<hour>\d{2}):(?P<min>\d{2})(?::(?P<sec>\d{2}))?)?')
+
+## @fn          parse_xmp_date()
+#  @brief       Gets the date of an XMP packet.
+#  @param[in]   data            : data including the XMP packet [type bytes]
+#  @retval      date_info       : date information. None if data has no XMP packet. [type Optional[DateInfo]]
+def parse_xmp_date(data: bytes) -> Optional[DateInfo]:
+    if b'<x:xmpmeta' not in data and b'<rdf:RDF' not in data:
+        return None
+    found: Dict[bytes, Any] = {}
+    for m in XMP_DATE_PATTERN.finditer(data):
+        found.setdefault(m.group('prop'), m)
+    for prop in XMP_DATE_PROPERTIES:
+        m = found.get(prop)
+        if m is not None:
+            return to_date_info({key: m.group(key) for key in DATE_INFO_KEYS})
+    return to_date_info({})
+
+class XmpSource(DateSource):
+    """XMP packet embedded in the head of the file, or an XMP sidecar file (name.xmp, name.ext.xmp)."""
+    name = 'xmp'
+    cost = 3
+
+    def read(self, file: str, url_ffmpeg: str) -> Optional[DateInfo]:
+        res: Optional[DateInfo] = None
+        candidates = [file, os.path.splitext(file)[0] + '.xmp', file + '.xmp']
+        for path in candidates:
+            try:
+                with open(path, 'rb', buffering=HEADER_READ_BUFFER) as f:
+                    inf = parse_xmp_date(f.read(XMP_SCAN_BYTES))
+            except OSError:
+                continue
+            if inf is not None:
+                if inf['year'] is not None:
+                    return inf
+                res = inf
+        return res
+
+class PillowSource(DateSource):
+    """EXIF read by Pillow (and pillow_heif). A fallback of the native parsers."""
+    name = 'pillow'
+    cost = 20
+    fallback = True
+
+    def read(self, file: str, url_ffmpeg: str) -> Optional[DateInfo]:
+        Image = import_pil_image_heif()
+        try:
+            # To support 2-byte character codes, the file is opened here and passed to Image.open.
+            with open(file, 'rb') as f:
+                exif = Image.open(f).getexif()
+                value = exif.get_ifd(EXIF_TAG_EXIF_IFD).get(EXIF_TAG_DATETIME_ORIGINAL) or exif.get(EXIF_TAG_DATETIME)
+        except Exception:
+            return None
+        if isinstance(value, bytes):
+            value = decode_exif_ascii(value)
+        if not value:
+            return to_date_info({})
+        year, month, day = get_dateinf(str(value))
+        return to_date_info({'year': year, 'month': month, 'day': day})
+
+class FfprobeSource(DateSource):
+    """creation_time of ffprobe. A subprocess per file."""
+    name = 'ffprobe'
+    cost = 50
+
+    def read(self, file: str, url_ffmpeg: str) -> Optional[DateInfo]:
+        if(is_ffprobe() == False):
+            if not setup_ffprobe(url_ffmpeg):
+                REPORTER.warning(file, 'ffprobe_missing', "ffprobe setup failed.")
+                return None
+        inf_time = FFPROBE_POOL.probe_creation_time(file)
+        # 2022-10-29T07:28:08.000000Z
+        m = MOVIE_CREATION_TIME_PATTERN.match(inf_time) if inf_time else None
+        if m is None:
+            REPORTER.warning(file, 'no_creation_time', f"Warning. Date information could not be retrieved. \n    file={file}")
+            # '': ffprobe read the file and found no creation time. None: ffprobe timed out or failed.
+            return to_date_info({}) if inf_time is not None else None
+        return to_date_info({key: m.group(key) for key in DATE_INFO_KEYS})
+
+class MtimeSource(DateSource):
+    """Modification time of the file. It is not a shooting date, so it is the last resort."""
+    name = 'mtime'
+    cost = 100
+    opens = False
+
+    def read(self, file: str, url_ffmpeg: str) -> Optional[DateInfo]:
+        inf = to_date_info(file_get_mtime(file))
+        return inf if inf['year'] is not None else None
+
+# Date sources by name.
+DATE_SOURCES: Dict[str, DateSource] = {source.name: source for source in (
+    FilenameSource(), ExifSource(), HeicSource(), IsobmffSource(), RawSource(), XmpSource(), PillowSource(), FfprobeSource(), MtimeSource())}
+
+# Keys of the extension lists and the default date sources of each.
+DEFAULT_DATE_SOURCES: Dict[str, List[str]] = {
+    'picture_ext': ['exif', 'pillow'],
+    'raw_ext': ['raw'],
+    'heic_ext': ['heic', 'pillow'],
+    'mtime_ext': ['mtime'],
+    'movie_ext': ['isobmff', 'ffprobe'],
+}
+
+class SourceChainExtractor(DateExtractor):
+    """
+    Built-in extractor. The date sources are tried in the order of their cost (the ini order for the same cost),
+    and the first date found is used.
+    A sample (filename_sample) of the files dated by the file name is verified with the metadata sources of the chain.
+    """
+    def __init__(self, name: str, extensions: List[str], sources: List[str], filename_patterns: Optional[List[str]] = None, filename_sample: float = 0.0) -> None:
+        super().__init__(name, extensions)
+        chain = [FilenameSource(filename_patterns) if source == 'filename' else DATE_SOURCES[source] for source in sources]
+        self.sources = sorted(chain, key=lambda source: source.cost)
+        self.filename_sample = filename_sample
+
+    def signature(self) -> str:
+        # e.g. picture_ext:filename,exif,pillow;IMG_%Y%m%d_%H%M%S|...;sample=0.1
+        signature = f"{self.name}:{','.join(source.name for source in self.sources)}"
+        for source in self.sources:
+            if isinstance(source, FilenameSource):
+                signature += f";{'|'.join(regex.pattern for regex in source.patterns)};sample={self.filename_sample}"
+        return signature
+
+    def extract(self, file: str, url_ffmpeg: str = "") -> DateInfo:
+        return self._extract(file, url_ffmpeg, self.sources, True)
+
+    def _extract(self, file: str, url_ffmpeg: str, sources: List[DateSource], verify: bool) -> DateInfo:
+        readable = False
+        for i, source in enumerate(sources):
+            if source.fallback and readable:
+                continue
+            if source.opens:
+                SYSCALLS.add('open', file)
+            inf = source.read(file, url_ffmpeg)
+            if inf is None:
+                continue
+            if isinstance(source, FilenameSource):
+                if verify and is_sampled(file, self.filename_sample):
+                    return self._verify_filename_date(file, url_ffmpeg, inf, sources[i + 1:])
+                return inf
+            readable = True
+            if inf['year'] is not None:
+                return inf
+        if not readable:
+            # Maybe a transient failure. The next run tries the file again.
+            _EXTRACT_STATE.definitive = False
+        return to_date_info({})
+
+    ## @fn          _verify_filename_date()
+    #  @brief       Compares the date of the file name with the date of the metadata. The metadata date is used when they differ.
+    #  @param[in]   file            : target file [type str]
+    #  @param[in]   url_ffmpeg      : ffmpeg download URL [type str]
+    #  @param[in]   inf             : date of the file name [type DateInfo]
+    #  @param[in]   sources         : the rest of the chain [type List[DateSource]]
+    #  @retval      inf             : date information [type DateInfo]
+    def _verify_filename_date(self, file: str, url_ffmpeg: str, inf: DateInfo, sources: List[DateSource]) -> DateInfo:
+        # The modification time is not a shooting date, so it is not used for the verification.
+        meta = self._extract(file, url_ffmpeg, [source for source in sources if not isinstance(source, MtimeSource)], False)
+        if meta['year'] is None:
+            return inf
+        if (meta['year'], meta['month'], meta['day']) != (inf['year'], inf['month'], inf['day']):
+            REPORTER.warning(file, 'filename_mismatch', f"Warning. The date of the file name differs from the metadata. The metadata is used.\n"
+                  f"    file={file}\n    filename={inf['year']:04}-{inf['month']:02}-{inf['day']:02}, metadata={meta['year']:04}-{meta['month']:02}-{meta['day']:02}")
+            return meta
+        return inf
+
+EXTRACTOR_ENTRY_POINT_GROUP = 'move_jpg.extractors'
+
+## @fn          iter_extractor_entry_points()
+#  @brief       Gets the entry points of the group 'move_jpg.extractors'. Supports the dict API of Python 3.8/3.9 importlib.metadata.
+#  @param[in]   None            : 
+#  @retval      entry_points    : entry points [type List[Any]]
+def iter_extractor_entry_points() -> List[Any]:
+    from importlib.metadata import entry_points
+    eps = entry_points()
+    if hasattr(eps, 'select'):
+        return list(eps.select(group=EXTRACTOR_ENTRY_POINT_GROUP))
+    return list(eps.get(EXTRACTOR_ENTRY_POINT_GROUP, []))   # type: ignore
+
+## @fn          load_extractor_plugins()
+#  @brief       Loads the third-party extractors. A plugin that fails to load is skipped with a warning.
+#  @param[in]   None            : 
+#  @retval      extractors      : extractors of the plugins [type List[DateExtractor]]
+def load_extractor_plugins() -> List[DateExtractor]:
+    extractors: List[DateExtractor] = []
+    for ep in iter_extractor_entry_points():
+        try:
+            extractor = ep.load()()
+            if not (extractor.name and extractor.extensions and callable(getattr(extractor, 'extract', None))):
+                raise TypeError("name, extensions and extract() are required.")
+        except Exception as e:
+            print(f"Warning. The extractor plugin could not be loaded. \n    plugin={ep.name}\n    {type(e).__name__}: {e}")
+            continue
+        extractors.append(extractor)
+    return extractors
+
+class ExtractorRegistry:
+    """
+    Maps a lower case extension to its extractor. It is built once from the extension lists of the ini file.
+    The extractors of the plugins take precedence over the built-in extractors for their extensions.
+    """
+    def __init__(self, dict_tar_ext: ExtDict, plugins: Optional[List[DateExtractor]] = None) -> None:
+        self._by_ext: Dict[str, DateExtractor] = {}
+        date_sources = dict_tar_ext.get('date_sources') or {}
+        for kind, default_sources in DEFAULT_DATE_SOURCES.items():
+            extractor = SourceChainExtractor(kind, dict_tar_ext[kind], date_sources.get(kind) or default_sources,  # type: ignore
+                                             dict_tar_ext.get('filename_patterns'), dict_tar_ext.get('filename_sample', 0.0))
+            for ext in extractor.extensions:
+                self._by_ext.setdefault(ext, extractor)
+        for extractor in (plugins if plugins is not None else load_extractor_plugins()):
+            for ext in extractor.extensions:
+                self._by_ext[ext.lower()] = extractor
+
+    ## @fn          lookup()
+    #  @brief       Gets the extractor of the file.
+    #  @param[in]   file            : target file [type str]
+    #  @retval      extractor       : extractor. None if the extension is not a target. [type Optional[DateExtractor]]
+    def lookup(self, file: str) -> Optional[DateExtractor]:
+        return self._by_ext.get(os.path.splitext(file)[1].lower())
+
+    ## @fn          extensions()
+    #  @brief       Gets the target extensions (lower case).
+    #  @param[in]   None            : 
+    #  @retval      extensions      : extensions [type List[str]]
+    def extensions(self) -> List[str]:
+        return list(self._by_ext)
+
+_EXTRACTOR_REGISTRIES: Dict[Tuple[Any, ...], ExtractorRegistry] = {}
+_EXTRACTOR_REGISTRIES_LOCK = threading.Lock()
+
+## @fn          get_extractor_registry()
+#  @brief       Gets the extractor registry of the extension information. The registry is built once per process and extension information.
+#  @param[in]   dict_tar_ext    : extension information [type ExtDict]
+#  @retval      registry        : extractor registry [type ExtractorRegistry]
+def get_extractor_registry(dict_tar_ext: ExtDict) -> ExtractorRegistry:
+    date_sources = dict_tar_ext.get('date_sources') or {}
+    key = tuple((tuple(dict_tar_ext[kind]), tuple(date_sources.get(kind) or ())) for kind in DEFAULT_DATE_SOURCES)  # type: ignore
+    key += (tuple(dict_tar_ext.get('filename_patterns') or ()), dict_tar_ext.get('filename_sample', 0.0))
+    registry = _EXTRACTOR_REGISTRIES.get(key)
+    if registry is None:
+        with _EXTRACTOR_REGISTRIES_LOCK:
+            registry = _EXTRACTOR_REGISTRIES.get(key)
+            if registry is None:
+                registry = ExtractorRegistry(dict_tar_ext)
+                _EXTRACTOR_REGISTRIES[key] = registry
+    return registry
+
+## @fn          uses_ffprobe()
+#  @brief       Checks whether the date sources of a target extension use ffprobe.
+#  @param[in]   dict_tar_ext    : extension information [type ExtDict]
+#  @retval      True            : ffprobe may be used [type bool]
+def uses_ffprobe(dict_tar_ext: ExtDict) -> bool:
+    date_sources = dict_tar_ext.get('date_sources') or {}
+    return any(dict_tar_ext[kind] and ('ffprobe' in (date_sources.get(kind) or DEFAULT_DATE_SOURCES[kind])) for kind in DEFAULT_DATE_SOURCES)  # type: ignore
+
+## @fn          file_uses_ffprobe()
+#  @brief       Checks whether the date sources of the file use ffprobe.
+#  @param[in]   file            : target file [type str]
+#  @param[in]   dict_tar_ext    : extension information [type ExtDict]
+#  @retval      True            : ffprobe may be used [type bool]
+def file_uses_ffprobe(file: str, dict_tar_ext: ExtDict) -> bool:
+    extractor = get_extractor_registry(dict_tar_ext).lookup(file)
+    return isinstance(extractor, SourceChainExtractor) and any(isinstance(source, FfprobeSource) for source in extractor.sources)
+
+## @fn          get_extractor_kind()
+#  @brief       Gets the name of the extractor used for the file ('picture_ext', 'raw_ext', 'heic_ext', 'mtime_ext', 'movie_ext' or a plugin name).
+#  @param[in]   file            : target file [type str]
+#  @param[in]   dict_tar_ext    : extension information [type ExtDict]
+#  @retval      kind            : extractor name. '' if the extension is not a target. [type str]
+def get_extractor_kind(file: str, dict_tar_ext: ExtDict) -> str:
+    extractor = get_extractor_registry(dict_tar_ext).lookup(file)
+    return extractor.name if extractor is not None else ''
+
+## @fn          get_extractor_signature()
+#  @brief       Gets the signature of the extractor settings of the file (extractor name, date sources and file name patterns).
+#  @param[in]   file            : target file [type str]
+#  @param[in]   dict_tar_ext    : extension information [type ExtDict]
+#  @retval      signature       : signature. '' if the extension is not a target. [type str]
+def get_extractor_signature(file: str, dict_tar_ext: ExtDict) -> str:
+    extractor = get_extractor_registry(dict_tar_ext).lookup(file)
+    return extractor.signature() if extractor is not None else ''
+
+## @fn          extract_date()
+#  @brief       Gets the date information of one file with the extractor of its extension.
+#  @param[in]   file            : target file [type str]
+#  @param[in]   dict_tar_ext    : extension information [type ExtDict]
+#  @param[in]   url_ffmpeg      : ffmpeg download URL [type str]
+#  @retval      res             : date information [type FileDate]
+def extract_date(file: str, dict_tar_ext: ExtDict, url_ffmpeg: str) -> FileDate:
+    extractor = get_extractor_registry(dict_tar_ext).lookup(file)
+    if extractor is None:
+        return {'file': file, 'year': None, 'month': None, 'day': None, 'extractor': ''}
+    # The result of a plugin is validated in the same way as the built-in extractors.
+    inf = to_date_info(cast(Dict[str, Any], extractor.extract(file, url_ffmpeg)))
+    if inf['year'] is None or inf['month'] is None or inf['day'] is None:
+        return {'file': file, 'year': None, 'month': None, 'day': None, 'extractor': extractor.name}
+    return {'file': file, 'year': str(inf['year']), 'month': str(inf['month']), 'day': str(inf['day']), 'extractor': extractor.name}
+
+# State of the extraction on this thread. definitive is cleared by the source chain when no source could
+# read the file (a read error, an ffprobe timeout or failure, or ffprobe missing).
+_EXTRACT_STATE = threading.local()
+
+## @fn          timed_extract_date()
+#  @brief       Runs extract_date() and measures it. The time is returned so that the caller records it, also for worker processes.
+#  @param[in]   file            : target file [type str]
+#  @param[in]   dict_tar_ext    : extension information [type ExtDict]
+#  @param[in]   url_ffmpeg      : ffmpeg download URL [type str]
+#  @retval      res,seconds,definitive : date information, the time of the extraction, and whether the result may be cached (a date, or no date tag in a readable file) [type Tuple[FileDate, float, bool]]
+def timed_extract_date(file: str, dict_tar_ext: ExtDict, url_ffmpeg: str) -> Tuple[FileDate, float, bool]:
+    _EXTRACT_STATE.definitive = True
+    t0 = time.perf_counter()
+    res = extract_date(file, dict_tar_ext, url_ffmpeg)
+    seconds = time.perf_counter() - t0
+    return res, seconds, res['year'] is not None or _EXTRACT_STATE.definitive
+
+## @fn          record_extract_time()
+#  @brief       Records the extraction time of the file in the stage timer.
+#  @param[in]   res             : date information [type FileDate]
+#  @param[in]   seconds         : time of the extraction [type float]
+#  @retval      None            : 
+def record_extract_time(res: FileDate, seconds: float) -> None:
+    STAGE_TIMER.add(f"extract:{res['extractor'] or 'other'}", seconds)
+    REPORTER.note_extract(res['file'], seconds)
+
+## @fn          get_date_dir()
+#  @brief       Gets the date folder of the file. The date folder is created next to the file, or under dest when it is given.
+#  @param[in]   res             : date information of the file [type FileDate]
+#  @param[in]   date_format     : date folder format [type str]
+#  @param[in]   dest            : destination folder of the date folders (None: next to the file) [type Optional[str]]
+#  @retval      newdir          : date folder. None if the file has no date information. [type Optional[str]]
+def get_date_dir(res: FileDate, date_format: str, dest: Optional[str] = None) -> Optional[str]:
+    year = res['year']
+    month = res['month']
+    day = res['day']
+    if year is None or month is None or day is None:
+        return None
+    try:
+        dt = datetime.datetime(int(year), int(month), int(day))
+    except ValueError:
+        # An invalid date in the metadata cache of an older version.
+        return None
+    base = os.path.dirname(res['file']) if dest is None else dest
+    return os.path.join(base, dt.strftime(date_format))
+
+## @fn          report_no_date()
+#  @brief       Reports that the date information of the file was not found.
+#  @param[in]   res             : date information of the file [type FileDate]
+#  @retval      None            : 
+def report_no_date(res: FileDate) -> None:
+    reason = 'no_exif' if res['extractor'] == 'picture_ext' else 'no_date'
+    REPORTER.event(res['file'], 'no_date', reason, res)
+
+## @fn          commit_move()
+#  @brief       Creates the date folder and moves the file into it.
+#  @param[in]   res             : date information of the file [type FileDate]
+#  @param[in]   date_format     : date folder format [type str]
+#  @param[in]   index           : destination index. A new index is used when None. [type Optional[DestIndex]]
+#  @param[in]   collision       : collision policy ('skip', 'rename' or 'compare') [type str]
+#  @param[in]   dest            : destination folder of the date folders (None: next to the file) [type Optional[str]]
+#  @retval      None            : 
+def commit_move(res: FileDate, date_format: str, index: Optional["DestIndex"] = None, collision: str = 'skip', dest: Optional[str] = None) -> None:
+    file = res['file']
+    REPORTER.begin(file)
+    newdir = get_date_dir(res, date_format, dest)
+    if newdir is not None:
+        if index is None:
+            index = DestIndex()
+        JOURNAL.plan(file, newdir, res)
+        move_to_date_dir(file, newdir, index, collision, res)
+    else:
+        JOURNAL.no_date(res)
+        report_no_date(res)
+
+## @fn          move_to_date_dir()
+#  @brief       Moves the file into the date folder. The folder and the collisions are checked with the destination index.
+#  @param[in]   file            : source file [type str]
+#  @param[in]   newdir          : date folder [type str]
+#  @param[in]   index           : destination index [type DestIndex]
+#  @param[in]   collision       : collision policy ('skip', 'rename' or 'compare') [type str]
+#  @param[in]   res             : date information of the file, for the report [type Optional[FileDate]]
+#  @retval      moved           : True if the file was moved [type bool]
+def move_to_date_dir(file: str, newdir: str, index: "DestIndex", collision: str = 'skip', res: Optional[FileDate] = None) -> bool:
+    # Creating and Changing Directories
+    with STAGE_TIMER.measure('mkdir'):
+        index.ensure_dir(newdir)
+    finebasename = os.path.basename(file)
+    with STAGE_TIMER.measure('collision'):
+        name, reason = index.resolve(file, newdir, finebasename, collision)
+    if name is None:
+        # If the file exists, report it.
+        reason = 'identical' if reason == 'identical' else 'exists'
+        REPORTER.event(file, 'skipped', reason, res, os.path.join(newdir, finebasename))
+        JOURNAL.done(file, 'skipped', reason, os.path.join(newdir, finebasename))
+        return False
+    action = MOVE_ENGINE.action
+    dst = os.path.join(newdir, name)
+
+    def done(result: str) -> None:
+        if result == 'ok':
+            reason = 'ok' if name == finebasename else 'renamed'
+            REPORTER.event(file, action, reason, res, dst)
+            JOURNAL.done(file, action, reason, dst)
+            return
+        if result == 'copied_source_kept':
+            # The copy is complete in the date folder. Only the source could not be removed.
+            REPORTER.event(file, 'copied', result, res, dst)
+            JOURNAL.done(file, 'copied', result, dst)
+            return
+        if result == 'exists':
+            # The name is used in the date folder, so it stays in the index.
+            REPORTER.event(file, 'skipped', 'exists', res, dst)
+            JOURNAL.done(file, 'skipped', 'exists', dst)
+            return
+        # Nothing was written to the date folder. The reserved name is released.
+        index.discard(newdir, name)
+        if result == 'not_found':
+            REPORTER.event(file, 'skipped', 'not_found', res)
+            JOURNAL.done(file, 'skipped', 'not_found', None)
+        else:
+            REPORTER.event(file, 'error', result, res, dst)
+            JOURNAL.done(file, 'error', result, dst)
+
+    # The name is reserved at once. A cross-device move finishes in the copy threads.
+    index.add(newdir, name)
+    try:
+        with STAGE_TIMER.measure('move'):
+            MOVE_ENGINE.move(file, dst, done)
+    except FileExistsError:
+        # Created by another process after the folder was listed.
+        done('exists')
+        return False
+    except FileNotFoundError:
+        # The file disappeared after the scan (removed, or moved by another run).
+        done('not_found')
+        return False
+    except OSError as e:
+        # One file that cannot be moved does not stop the other files.
+        REPORTER.warning(file, 'failed', f"Error. The file could not be moved. {type(e).__name__}: {e}\n    file={file}")
+        done('failed')
+        return False
+    return True
+
+# Collision policies when the file already exists in the date folder.
+COLLISION_CHOICES = ['skip', 'rename', 'compare']
+
+class DestIndex:
+    """
+    In-memory index of the date folders.
+
+    Each date folder is listed once with os.scandir() on first use and is
+    updated as files are moved, so "does the folder exist?" and "is the
+    name already used?" are answered without further stat calls.
+    """
+    def __init__(self) -> None:
+        # date folder -> {normalized name: DirEntry or file size (None: unknown)}. None: the folder does not exist.
+        self._dirs: Dict[str, Optional[Dict[str, Any]]] = {}
+
+    @staticmethod
+    def _dir_key(newdir: str) -> str:
+        return os.path.normcase(os.path.normpath(newdir))
+
+    @staticmethod
+    def _name_key(name: str) -> str:
+        return os.path.normcase(name)
+
+    def _entries(self, newdir: str) -> Optional[Dict[str, Any]]:
+        key = self._dir_key(newdir)
+        if key not in self._dirs:
+            try:
+                SYSCALLS.add('scandir')
+                with os.scandir(newdir) as it:
+                    self._dirs[key] = {self._name_key(e.name): e for e in it}
+            except (FileNotFoundError, NotADirectoryError):
+                self._dirs[key] = None
+        return self._dirs[key]
+
+    def dir_exists(self, newdir: str) -> bool:
+        return self._entries(newdir) is not None
+
+    def ensure_dir(self, newdir: str) -> None:
+        if not self.dir_exists(newdir):
+            SYSCALLS.add('mkdir')
+            os.makedirs(newdir, exist_ok=True)
+            self._dirs[self._dir_key(newdir)] = {}
+
+    def exists(self, newdir: str, name: str) -> bool:
+        entries = self._entries(newdir)
+        return (entries is not None) and (self._name_key(name) in entries)
+
+    def add(self, newdir: str, name: str, size: Optional[int] = None) -> None:
+        entries = self._entries(newdir)
+        if entries is None:
+            entries = {}
+            self._dirs[self._dir_key(newdir)] = entries
+        entries[self._name_key(name)] = size
+
+    def discard(self, newdir: str, name: str) -> None:
+        entries = self._entries(newdir)
+        if entries is not None:
+            entries.pop(self._name_key(name), None)
+
+    def size(self, newdir: str, name: str) -> Optional[int]:
+        entries = self._entries(newdir)
+        if entries is None:
+            return None
+        value = entries.get(self._name_key(name))
+        if isinstance(value, os.DirEntry):
+            try:
+                SYSCALLS.add('stat')
+                return value.stat().st_size
+            except OSError:
+                return None
+        return value
+
+    ## @fn          resolve()
+    #  @brief       Decides the destination name of the file according to the collision policy.
+    #  @param[in]   src             : source file [type str]
+    #  @param[in]   newdir          : date folder [type str]
+    #  @param[in]   name            : file name [type str]
+    #  @param[in]   collision       : collision policy ('skip', 'rename' or 'compare') [type str]
+    #  @retval      name,reason     : destination name (None: do not move) and the reason ('new', 'exists', 'identical', 'renamed') [type Tuple[Optional[str], str]]
+    def resolve(self, src: str, newdir: str, name: str, collision: str = 'skip') -> Tuple[Optional[str], str]:
+        if not self.exists(newdir, name):
+            return name, 'new'
+        if collision == 'skip':
+            return None, 'exists'
+        if collision == 'compare':
+            dst = os.path.join(newdir, name)
+            dst_size = self.size(newdir, name)
+            try:
+                if dst_size is None or dst_size == file_stat(src).st_size:
+                    SYSCALLS.add('open', src, 2)
+                    if filecmp.cmp(src, dst, shallow=False):
+                        return None, 'identical'
+            except OSError:
+                pass
+        base, ext = os.path.splitext(name)
+        num = 1
+        while self.exists(newdir, f"{base}_{num}{ext}"):
+            num += 1
+        return f"{base}_{num}{ext}", 'renamed'
+
+# Identity of a file for the metadata cache. (st_dev, st_ino, st_size, st_mtime_ns)
+CacheKey = Tuple[int, int, int, int]
+
+class MetaCache:
+    """
+    Persistent SQLite cache of the extracted dates.
+
+    The entries are keyed by the file identity (device, inode, size,
+    mtime_ns), so an unchanged file is never opened again, even after it
+    was moved. Files without date information are cached as well, unless
+    no date source could read them (a read error, an ffprobe timeout or
+    ffprobe missing), so that they are tried again on the next run. When
+    the number of entries exceeds max_entries, the least recently used
+    entries are evicted.
+    """
+    # Number of updates between commits.
+    COMMIT_INTERVAL = 500
+
+    def __init__(self, path: str, max_entries: int = 200000) -> None:
+        self.path = path
+        self.max_entries = max(1, max_entries)
+        self.hits = 0
+        self.misses = 0
+        self._updates = 0
+        self._conn = sqlite3.connect(path)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS meta ("
+            " dev INTEGER, ino INTEGER, size INTEGER, mtime_ns INTEGER,"
+            " year TEXT, month TEXT, day TEXT, extractor TEXT, used REAL,"
+            " PRIMARY KEY (dev, ino, size, mtime_ns))")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS meta_used ON meta (used)")
+        self._conn.commit()
+
+    @staticmethod
+    def key_of(file: str) -> Optional[CacheKey]:
+        try:
+            st = file_stat(file)
+            if st.st_ino == 0:
+                # DirEntry.stat() on Windows has no st_dev/st_ino.
+                SYSCALLS.add('stat', file)
+                st = os.stat(file)
+        except OSError:
+            return None
+        return (st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns)
+
+    def get(self, key: CacheKey, file: str, extractor: str, signature: Optional[str] = None) -> Optional[FileDate]:
+        row = self._conn.execute(
+            "SELECT year, month, day, extractor FROM meta WHERE dev=? AND ino=? AND size=? AND mtime_ns=?", key).fetchone()
+        # An entry made by another extractor or other date sources (the ini settings or --filename_date were changed) is not used.
+        if row is None or row[3] != (signature if signature is not None else extractor):
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._conn.execute("UPDATE meta SET used=? WHERE dev=? AND ino=? AND size=? AND mtime_ns=?", (time.time(),) + key)
+        self._touch()
+        return {'file': file, 'year': row[0], 'month': row[1], 'day': row[2], 'extractor': extractor}
+
+    def put(self, key: CacheKey, res: FileDate, signature: Optional[str] = None) -> None:
+        # The extractor column holds the signature of the extractor settings.
+        self._conn.execute(
+            "INSERT OR REPLACE INTO meta (dev, ino, size, mtime_ns, year, month, day, extractor, used) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            key + (res['year'], res['month'], res['day'], signature if signature is not None else res['extractor'], time.time()))
+        self._touch()
+
+    def evict(self) -> int:
+        count = self._conn.execute("SELECT COUNT(*) FROM meta").fetchone()[0]
+        excess = count - self.max_entries
+        if excess > 0:
+            self._conn.execute(
+                "DELETE FROM meta WHERE rowid IN (SELECT rowid FROM meta ORDER BY used LIMIT ?)", (excess,))
+            self._conn.commit()
+            return excess
+        return 0
+
+    def close(self) -> None:
+        self.evict()
+        self._conn.commit()
+        self._conn.close()
+
+    def _touch(self) -> None:
+        self._updates += 1
+        if self._updates >= self.COMMIT_INTERVAL:
+            self._updates = 0
+            self._conn.commit()
+
+## @fn          open_cache()
+#  @brief       Opens the metadata cache. A relative path is resolved from the script folder.
+#  @param[in]   path            : cache file. An empty string disables the cache. [type str]
+#  @param[in]   max_entries     : maximum number of entries [type int]
+#  @retval      cache           : metadata cache. None if disabled. [type Optional[MetaCache]]
+def open_cache(path: str, max_entries: int) -> Optional[MetaCache]:
+    if not path:
+        return None
+    if not os.path.isabs(path):
+        path = os.path.abspath(os.path.join(SCR_FOLDER, path))
+    try:
+        return MetaCache(path, max_entries)
+    except sqlite3.Error as e:
+        die_print(f"Error detect. The cache file could not be opened.\ncache={path}\n{type(e)}\n{e}")
+    return None
+
+class PlanEntry(TypedDict):
+    src: str
+    dest_dir: str
+    extractor: str
+    date: str
+
+## @fn          write_plan()
+#  @brief       Extracts the dates and writes the move plan (JSON Lines) without moving any file.
+#  @param[in]   files           : target files [type Iterable[str]]
+#  @param[in]   dict_tar_ext    : extension information [type ExtDict]
+#  @param[in]   url_ffmpeg      : ffmpeg download URL [type str]
+#  @param[in]   date_format     : date folder format [type str]
+#  @param[in]   plan_file       : output plan file [type str]
+#  @param[in]   jobs            : number of workers [type int]
+#  @param[in]   executor        : 'thread' or 'process' [type str]
+#  @param[in]   cache           : metadata cache [type Optional[MetaCache]]
+#  @param[in]   dest            : destination folder of the date folders (None: next to the file) [type Optional[str]]
+#  @retval      count           : number of planned moves [type int]
+def write_plan(files: Iterable[str], dict_tar_ext: ExtDict, url_ffmpeg: str, date_format: str, plan_file: str, jobs: int = 1, executor: str = 'thread', cache: Optional["MetaCache"] = None, dest: Optional[str] = None) -> int:
+    count = 0
+    with open(plan_file, 'w', encoding='utf-8') as f:
+        for res in iter_file_dates(files, dict_tar_ext, url_ffmpeg, jobs, executor, cache):
+            newdir = get_date_dir(res, date_format, dest)
+            if newdir is None:
+                REPORTER.begin(res['file'])
+                report_no_date(res)
+                continue
+            entry: PlanEntry = {
+                'src': os.path.abspath(res['file']),
+                'dest_dir': os.path.abspath(newdir),
+                'extractor': res['extractor'],
+                'date': f"{int(cast(str, res['year'])):04}-{int(cast(str, res['month'])):02}-{int(cast(str, res['day'])):02}",
+            }
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            REPORTER.event(res['file'], 'planned', 'ok', res, newdir)
+            count += 1
+    print(f"{count} moves are planned. plan={plan_file}")
+    return count
+
+## @fn          read_plan()
+#  @brief       Reads a plan file written by write_plan().
+#  @param[in]   plan_file       : plan file [type str]
+#  @retval      entries         : planned moves [type List[PlanEntry]]
+def read_plan(plan_file: str) -> List[PlanEntry]:
+    entries: List[PlanEntry] = []
+    try:
+        with open(plan_file, 'r', encoding='utf-8') as f:
+            for line_no, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                if not all(key in entry for key in PlanEntry.__annotations__):
+                    raise ValueError(f"line {line_no}: missing key")
+                entries.append(entry)
+    except (OSError, ValueError) as e:
+        die_print(f"Error detect. The plan file could not be read.\nplan={plan_file}\n{type(e)}\n{e}")
+    return entries
+
+## @fn          execute_plan()
+#  @brief       Executes a plan file in bulk. Each date folder is created once, and the moves are grouped by date folder.
+#  @param[in]   plan_file       : plan file [type str]
+#  @param[in]   collision       : collision policy ('skip', 'rename' or 'compare') [type str]
+#  @retval      None            : 
+def execute_plan(plan_file: str, collision: str = 'skip') -> None:
+    groups: Dict[str, List[PlanEntry]] = collections.OrderedDict()
+    for entry in read_plan(plan_file):
+        groups.setdefault(entry['dest_dir'], []).append(entry)
+        REPORTER.scanned += 1
+
+    # The names in each date folder are listed once, and collisions are checked in memory.
+    index = DestIndex()
+    for newdir, entries in groups.items():
+        index.ensure_dir(newdir)
+        for entry in entries:
+            file = entry['src']
+            REPORTER.begin(file)
+            JOURNAL.plan(file, newdir)
+            move_to_date_dir(file, newdir, index, collision)
+    MOVE_ENGINE.wait()
+
+## @fn          async_move_picture()
+#  @brief       asyncio version of move_picture(). Up to `concurrency` files are extracted, checked and moved at the same time.
+#  @param[in]   files           : target files [type Iterable[str]]
+#  @param[in]   dict_tar_ext    : extension information [type ExtDict]
+#  @param[in]   url_ffmpeg      : ffmpeg download URL [type str]
+#  @param[in]   date_format     : date folder format [type str]
+#  @param[in]   concurrency     : number of files in flight [type int]
+#  @param[in]   collision       : collision policy ('skip', 'rename' or 'compare') [type str]
+#  @param[in]   cache           : metadata cache [type Optional[MetaCache]]
+#  @param[in]   dest            : destination folder of the date folders (None: next to the file) [type Optional[str]]
+#  @retval      None            : 
+async def async_move_picture(files: Iterable[str], dict_tar_ext: ExtDict, url_ffmpeg: str, date_format: str, concurrency: int = 16,
+                             collision: str = 'skip', cache: Optional["MetaCache"] = None, dest: Optional[str] = None) -> None:
+    # Add the script folder to the PATH environment variable.
+    add_tardir_envpath(SCR_FOLDER)
+    import asyncio
+    concurrency = max(1, concurrency)
+    loop = asyncio.get_running_loop()
+    # The blocking file system calls and the extractors run in this bounded executor.
+    pool = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="aio")
+    window = asyncio.Semaphore(concurrency)
+    index = DestIndex()
+    # Each date folder is listed and created only once, even when many files need it at the same time.
+    dir_futures: Dict[str, "asyncio.Future[None]"] = {}
+    # The collision check and the name reservation of a date folder are done by one file at a time.
+    dir_locks: Dict[str, "asyncio.Lock"] = {}
+
+    async def ensure_dir(newdir: str) -> None:
+        future = dir_futures.get(newdir)
+        if future is None:
+            future = loop.run_in_executor(pool, index.ensure_dir, newdir)
+            dir_futures[newdir] = future
+        await future
+
+    async def extract(file: str) -> FileDate:
+        key: Optional[CacheKey] = None
+        if cache is not None:
+            # The stat runs in the executor. The SQLite connection is used only from the event loop thread.
+            key = await loop.run_in_executor(pool, MetaCache.key_of, file)
+            if key is not None:
+                with STAGE_TIMER.measure('cache'):
+                    cached = cache.get(key, file, get_extractor_kind(file, dict_tar_ext), get_extractor_signature(file, dict_tar_ext))
+                if cached is not None:
+                    return cached
+        res, seconds, definitive = await loop.run_in_executor(pool, timed_extract_date, file, dict_tar_ext, url_ffmpeg)
+        record_extract_time(res, seconds)
+        if cache is not None and key is not None and definitive:
+            cache.put(key, res, get_extractor_signature(file, dict_tar_ext))
+        return res
+
+    async def process(file: str) -> None:
+        res: Optional[FileDate] = None
+        try:
+            res = await extract(file)
+            newdir = get_date_dir(res, date_format, dest)
+            if newdir is None:
+                REPORTER.begin(file)
+                report_no_date(res)
+                return
+            await ensure_dir(newdir)
+            basename = os.path.basename(file)
+            lock = dir_locks.setdefault(newdir, asyncio.Lock())
+            async with lock:
+                name, reason = await loop.run_in_executor(pool, index.resolve, file, newdir, basename, collision)
+                if name is not None:
+                    index.add(newdir, name)
+            REPORTER.begin(file)
+            if name is None:
+                reason = 'identical' if reason == 'identical' else 'exists'
+                REPORTER.event(file, 'skipped', reason, res, os.path.join(newdir, basename))
+                return
+            newfile = os.path.join(newdir, name)
+            try:
+                # The existence check and the move are one operation.
+                t0 = time.perf_counter()
+                result = await loop.run_in_executor(pool, MOVE_ENGINE.move_file, file, newfile)
+                STAGE_TIMER.add('move', time.perf_counter() - t0)
+            except FileExistsError:
+                REPORTER.event(file, 'skipped', 'exists', res, newfile)
+                return
+            except FileNotFoundError:
+                index.discard(newdir, name)
+                REPORTER.event(file, 'skipped', 'not_found', res)
+                return
+            except OSError:
+                # Nothing was written to the date folder. The error is reported below.
+                index.discard(newdir, name)
+                raise
+            if result == 'copied_source_kept':
+                REPORTER.event(file, 'copied', result, res, newfile)
+                return
+            REPORTER.event(file, 'moved', 'ok' if name == basename else 'renamed', res, newfile)
+        except Exception as e:
+            # One broken file does not stop the other files.
+            REPORTER.warning(file, 'failed', f"Error. The file could not be processed. {type(e).__name__}: {e}\n    file={file}")
+            REPORTER.event(file, 'error', 'failed', res)
+        finally:
+            window.release()
+
+    def on_done(task: "asyncio.Task[None]") -> None:
+        tasks.discard(task)
+
+    tasks: Set["asyncio.Task[None]"] = set()
+    try:
+        for file in files:
+            await window.acquire()
+            task = loop.create_task(process(file))
+            tasks.add(task)
+            task.add_done_callback(on_done)
+        if tasks:
+            await asyncio.wait(list(tasks))
+    finally:
+        pool.shutdown(wait=True)
 
 ## @fn          is_valid_date_format()
 #  @brief       Checks whether the string indicating the specified format information is valid as strftime of datetime.datetime.
@@ -323,40 +2680,235 @@ def file_get_ctime(filename: str) -> Dict[str, Optional[str]]:
         inf['sec']   = None
     return inf
 
+# Upper limit of the EXIF item size read from a HEIC file.
+HEIC_MAX_EXIF_SIZE = 1024 * 1024
+# Buffer size of the native header parsers. The default buffer size follows st_blksize, which can be
+# 1 MiB on NFS/SMB/FUSE, and each seek() + read() would then read a whole buffer.
+HEADER_READ_BUFFER = 4096
+
+## @fn          get_stream_size()
+#  @brief       Gets the size of a binary stream. The current position is not preserved.
+#  @param[in]   fp              : binary file object [type BinaryIO]
+#  @retval      size            : stream size [type int]
+def get_stream_size(fp: BinaryIO) -> int:
+    return fp.seek(0, os.SEEK_END)
+
+## @fn          iter_isobmff_boxes()
+#  @brief       Enumerates the ISOBMFF (MP4/MOV/HEIC/CR3) boxes in the range [start, end) of fp.
+#  @param[in]   fp              : binary file object [type BinaryIO]
+#  @param[in]   start           : start offset [type int]
+#  @param[in]   end             : end offset [type int]
+#  @retval      box             : (box type, payload offset, box end offset) [type Iterator[Tuple[str, int, int]]]
+def iter_isobmff_boxes(fp: BinaryIO, start: int, end: int) -> Iterator[Tuple[str, int, int]]:
+    pos = start
+    while pos + 8 <= end:
+        fp.seek(pos)
+        header = fp.read(8)
+        if len(header) < 8:
+            return
+        size, raw_type = struct.unpack('>I4s', header)
+        header_size = 8
+        if size == 1:
+            # 64-bit "largesize" follows the box type.
+            large = fp.read(8)
+            if len(large) < 8:
+                raise ValueError("Broken ISOBMFF box header.")
+            size = struct.unpack('>Q', large)[0]
+            header_size = 16
+        elif size == 0:
+            # The box extends to the end of the enclosing range.
+            size = end - pos
+        if (size < header_size) or (pos + size > end):
+            raise ValueError(f"Broken ISOBMFF box size. type={raw_type!r}, size={size}")
+        yield raw_type.decode('latin-1'), pos + header_size, pos + size
+        pos += size
+
+## @fn          find_isobmff_box()
+#  @brief       Finds the first box of the specified type in the range [start, end) of fp.
+#  @param[in]   fp              : binary file object [type BinaryIO]
+#  @param[in]   box_type        : box type (e.g. "moov") [type str]
+#  @param[in]   start           : start offset [type int]
+#  @param[in]   end             : end offset [type int]
+#  @retval      box             : (payload offset, box end offset). None if not found. [type Optional[Tuple[int, int]]]
+def find_isobmff_box(fp: BinaryIO, box_type: str, start: int, end: int) -> Optional[Tuple[int, int]]:
+    for typ, payload, box_end in iter_isobmff_boxes(fp, start, end):
+        if typ == box_type:
+            return payload, box_end
+    return None
+
+## @fn          read_uint_be()
+#  @brief       Reads an unsigned big-endian integer of the specified size (0, 2, 4 or 8 bytes) from data.
+#  @param[in]   data            : source data [type bytes]
+#  @param[in]   pos             : read position [type int]
+#  @param[in]   size            : integer size in bytes [type int]
+#  @retval      value,pos       : value and the next read position [type Tuple[int, int]]
+def read_uint_be(data: bytes, pos: int, size: int) -> Tuple[int, int]:
+    if size == 0:
+        return 0, pos
+    if pos + size > len(data):
+        raise ValueError("Unexpected end of box data.")
+    return int.from_bytes(data[pos:pos + size], 'big'), pos + size
+
+## @fn          parse_heic_exif_item_id()
+#  @brief       Parses the payload of the "iinf" box and returns the item ID whose item_type is "Exif".
+#  @param[in]   data            : payload of the "iinf" box [type bytes]
+#  @retval      item_id         : item ID. None if there is no Exif item. [type Optional[int]]
+def parse_heic_exif_item_id(data: bytes) -> Optional[int]:
+    version = data[0]
+    pos = 4 + (2 if version == 0 else 4)
+    stream = io.BytesIO(data)
+    for typ, payload, box_end in iter_isobmff_boxes(stream, pos, len(data)):
+        if typ != 'infe':
+            continue
+        infe_version = data[payload]
+        # item_type exists only in version 2 or later.
+        if infe_version < 2:
+            continue
+        item_id, p = read_uint_be(data, payload + 4, 2 if infe_version == 2 else 4)
+        p += 2  # item_protection_index
+        if data[p:p + 4] == b'Exif':
+            return item_id
+    return None
+
+## @fn          parse_heic_item_location()
+#  @brief       Parses the payload of the "iloc" box and returns the location of the specified item.
+#  @param[in]   data            : payload of the "iloc" box [type bytes]
+#  @param[in]   target_id       : item ID [type int]
+#  @retval      location        : (construction_method, [(offset, length), ...]). None if not found. [type Optional[Tuple[int, List[Tuple[int, int]]]]]
+def parse_heic_item_location(data: bytes, target_id: int) -> Optional[Tuple[int, List[Tuple[int, int]]]]:
+    version = data[0]
+    offset_size = data[4] >> 4
+    length_size = data[4] & 0x0F
+    base_offset_size = data[5] >> 4
+    index_size = (data[5] & 0x0F) if version in (1, 2) else 0
+    item_count, pos = read_uint_be(data, 6, 2 if version < 2 else 4)
+    for _ in range(item_count):
+        item_id, pos = read_uint_be(data, pos, 2 if version < 2 else 4)
+        construction_method = 0
+        if version in (1, 2):
+            value, pos = read_uint_be(data, pos, 2)
+            construction_method = value & 0x0F
+        pos += 2  # data_reference_index
+        base_offset, pos = read_uint_be(data, pos, base_offset_size)
+        extent_count, pos = read_uint_be(data, pos, 2)
+        extents: List[Tuple[int, int]] = []
+        for _ in range(extent_count):
+            _index, pos = read_uint_be(data, pos, index_size)
+            extent_offset, pos = read_uint_be(data, pos, offset_size)
+            extent_length, pos = read_uint_be(data, pos, length_size)
+            extents.append((base_offset + extent_offset, extent_length))
+        if item_id == target_id:
+            return construction_method, extents
+    return None
+
+## @fn          read_heic_exif_tags()
+#  @brief       Reads the EXIF date tags of a HEIC file by walking meta/iinf/iloc. The image is not decoded.
+#  @param[in]   filename        : input file [type str]
+#  @retval      tags            : {tag id: value}. None if the file could not be parsed natively. [type Optional[Dict[int, str]]]
+def read_heic_exif_tags(filename: str) -> Optional[Dict[int, str]]:
+    try:
+        with open(filename, 'rb', buffering=HEADER_READ_BUFFER) as fp:
+            file_size = get_stream_size(fp)
+            meta = find_isobmff_box(fp, 'meta', 0, file_size)
+            if meta is None:
+                return None
+            # "meta" is a full box. Skip version and flags.
+            children: Dict[str, Tuple[int, int]] = {}
+            for typ, payload, box_end in iter_isobmff_boxes(fp, meta[0] + 4, meta[1]):
+                if typ in ('iinf', 'iloc', 'idat') and typ not in children:
+                    children[typ] = (payload, box_end)
+            if ('iinf' not in children) or ('iloc' not in children):
+                return None
+
+            fp.seek(children['iinf'][0])
+            item_id = parse_heic_exif_item_id(fp.read(children['iinf'][1] - children['iinf'][0]))
+            if item_id is None:
+                return {}
+            fp.seek(children['iloc'][0])
+            location = parse_heic_item_location(fp.read(children['iloc'][1] - children['iloc'][0]), item_id)
+            if location is None:
+                return None
+            construction_method, extents = location
+            if construction_method == 0:
+                base = 0
+            elif (construction_method == 1) and ('idat' in children):
+                base = children['idat'][0]
+            else:
+                return None
+
+            exif = b''
+            for extent_offset, extent_length in extents:
+                if len(exif) + extent_length > HEIC_MAX_EXIF_SIZE:
+                    return None
+                fp.seek(base + extent_offset)
+                exif += fp.read(extent_length)
+    except (OSError, ValueError, IndexError, struct.error):
+        return None
+
+    # The Exif item starts with the offset to the TIFF header (usually pointing past "Exif\0\0").
+    if len(exif) < 4:
+        return None
+    tiff = exif[4 + struct.unpack('>I', exif[:4])[0]:]
+    if tiff.startswith(b'Exif\x00\x00'):
+        tiff = tiff[6:]
+    try:
+        return read_tiff_date_tags(io.BytesIO(tiff), 0)
+    except (ValueError, struct.error):
+        return None
+
+## @fn          parse_exif_datetime()
+#  @brief       Converts an EXIF date string ("YYYY:MM:DD HH:MM:SS") to date information.
+#  @param[in]   date_str        : date string [type Optional[str]]
+#  @retval      inf             : date info. Each value is None if date_str is invalid. [type Dict[str, Optional[int]]]
+def parse_exif_datetime(date_str: Optional[str]) -> Dict[str, Optional[int]]:
+    inf: Dict[str, Optional[int]] = {k: None for k in ['year', 'month', 'day', 'hour', 'min', 'sec']}
+    if not date_str:
+        return inf
+    try:
+        dt = datetime.datetime.strptime(date_str, "%Y:%m:%d %H:%M:%S")
+    except ValueError:
+        return inf
+    inf['year']  = dt.year
+    inf['month'] = dt.month
+    inf['day']   = dt.day
+    inf['hour']  = dt.hour
+    inf['min']   = dt.minute
+    inf['sec']   = dt.second
+    return inf
+
+## @fn          file_get_heic()
+#  @brief       Get the date information (DateTimeOriginal) of a HEIC file. Only the EXIF item is read, and pillow_heif is used as a fallback.
+#  @param[in]   filename        : input file [type str]
+#  @retval      inf             : date info [type Dict[str, Optional[int]]]
 def file_get_heic(filename: str) -> Dict[str, Optional[int]]:
-    inf: Dict[str, Optional[int]] = {}
+    tags = read_heic_exif_tags(filename)
+    if tags is None:
+        return file_get_heic_pillow(filename)
+    return parse_exif_datetime(tags.get(EXIF_TAG_DATETIME_ORIGINAL))
 
+## @fn          file_get_heic_pillow()
+#  @brief       Get the date information (DateTimeOriginal) of a HEIC file using pillow_heif.
+#  @param[in]   filename        : input file [type str]
+#  @retval      inf             : date info [type Dict[str, Optional[int]]]
+def file_get_heic_pillow(filename: str) -> Dict[str, Optional[int]]:
     try:
         # To support 2-byte character codes, read the image in binary format and pass it to Image.open.
+        # The EXIF is available after Image.open(), so the image is not decoded by img.load().
+        Image = import_pil_image_heif()
         with open(filename, 'rb') as f:
             img = Image.open(f)
-            img.load()
-
-        # get EXIF
-        exif_bytes = img.info.get("exif")
+            # get EXIF
+            exif_bytes = img.info.get("exif")
         if not exif_bytes:
-            return {k: None for k in ['year', 'month', 'day', 'hour', 'min', 'sec']}
-
-        exif_dict = piexif.load(exif_bytes)
-        date_str = exif_dict['Exif'].get(piexif.ExifIFD.DateTimeOriginal)
+            return parse_exif_datetime(None)
 
+        exif_dict = import_piexif().load(exif_bytes)
+        date_str = exif_dict['Exif'].get(EXIF_TAG_DATETIME_ORIGINAL)
         if date_str:
-            try:
-                dt = datetime.datetime.strptime(date_str.decode('utf-8'), "%Y:%m:%d %H:%M:%S")
-                inf['year']  = dt.year
-                inf['month'] = dt.month
-                inf['day']   = dt.day
-                inf['hour']  = dt.hour
-                inf['min']   = dt.minute
-                inf['sec']   = dt.second
-            except Exception:
-                return {k: None for k in ['year', 'month', 'day', 'hour', 'min', 'sec']}
-        else:
-            return {k: None for k in ['year', 'month', 'day', 'hour', 'min', 'sec']}
+            return parse_exif_datetime(date_str.decode('utf-8', errors='replace'))
+        return parse_exif_datetime(None)
     except Exception:
-        return {k: None for k in ['year', 'month', 'day', 'hour', 'min', 'sec']}
-
-    return inf
+        return parse_exif_datetime(None)
 
 ## @fn          file_get_mtime()
 #  @brief       Get the "mtime" of the target file. "mtime" = Get the date and time when the file contents were last changed.
@@ -366,7 +2918,7 @@ def file_get_mtime(filename: str) -> Dict[str, Optional[str]]:
     inf: Dict[str, Optional[str]] = {}
 
     try:
-        mtime = os.path.getmtime(filename)
+        mtime = file_stat(filename).st_mtime
         fts = datetime.datetime.fromtimestamp(mtime)
         inf['year']  = fts.strftime('%Y')
         inf['month'] = fts.strftime('%m')
@@ -408,30 +2960,127 @@ def is_ffmpeg() -> bool:
 #  @retval      bool            : result value [type bool]
 def is_ffprobe() -> bool:
     # Check that ffprobe is on your path.
-    tool_path = shutil.which("ffprobe")
+    tool_path = get_ffprobe_path()
     if not tool_path:
         return False
     else:
         return True
 
+# ffprobe path resolved once per run. (resolved flag, path)
+_FFPROBE_PATH: Tuple[bool, Optional[str]] = (False, None)
+# Set when setup_ffprobe() failed, so that the user is asked only once per run.
+_FFPROBE_SETUP_FAILED = False
+_FFPROBE_SETUP_LOCK = threading.Lock()
+
+## @fn          get_ffprobe_path()
+#  @brief       Gets the path of ffprobe. shutil.which() is called only on the first call (or when refresh=True).
+#  @param[in]   refresh         : resolve the path again [type bool]
+#  @retval      tool_path       : ffprobe path. None if ffprobe is not on your path. [type Optional[str]]
+def get_ffprobe_path(refresh: bool = False) -> Optional[str]:
+    global _FFPROBE_PATH
+    resolved, tool_path = _FFPROBE_PATH
+    if refresh or not resolved:
+        tool_path = shutil.which("ffprobe")
+        _FFPROBE_PATH = (True, tool_path)
+    return tool_path
+
 def setup_ffprobe(url: str):
+    # Several extraction workers may need ffprobe at the same time. Ask the user only once.
+    with _FFPROBE_SETUP_LOCK:
+        return _setup_ffprobe(url)
+
+def _setup_ffprobe(url: str):
+    global _FFPROBE_SETUP_FAILED
     system = platform.system()
     if is_ffprobe():
         return True
+    if _FFPROBE_SETUP_FAILED:
+        return False
 
     if system == "Windows":
         # If a proxy is set in the environment variables, the proxy information will be used for downloading.
         # (1) Download the compressed file. (2) Unzip the file. (3) Extract ffprobe to the same folder as the script.
-        return download_and_extract_ffprobe(url, extract_path=SCR_FOLDER)
+        res_flag = download_and_extract_ffprobe(url, extract_path=SCR_FOLDER)
 
     elif system in ["Linux"]:
         # Raspberry PiやUbuntuなど
         print("ffprobe not found. Installing via apt...")
-        return install_ffmpeg_linux()
+        res_flag = install_ffmpeg_linux()
 
     else:
         print(f"Unsupported OS: {system}")
-        return False
+        res_flag = False
+
+    # Resolve the path again because ffprobe may have been installed.
+    if res_flag and (get_ffprobe_path(refresh=True) is not None):
+        return True
+    _FFPROBE_SETUP_FAILED = True
+    return False
+
+class FfprobePool:
+    """
+    Runs ffprobe in a bounded pool of worker threads.
+
+    Only format_tags=creation_time is requested, and each probe is killed
+    after `timeout` seconds so that one hung ffprobe cannot stall the caller.
+    probe_creation_time() waits for the result, so the probes overlap when
+    the callers run in several threads: iter_file_dates() extracts the files
+    that use ffprobe in max_workers threads, also without -j. At most
+    max_workers ffprobe processes run at the same time.
+    """
+    def __init__(self, max_workers: int = 2, timeout: float = 30.0):
+        self.max_workers = max(1, max_workers)
+        self.timeout = timeout
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def submit(self, filename: str) -> "Future[Optional[str]]":
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="ffprobe")
+            return self._executor.submit(self._probe, filename)
+
+    def probe_creation_time(self, filename: str) -> Optional[str]:
+        return self.submit(filename).result()
+
+    def shutdown(self) -> None:
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+                self._executor = None
+
+    def _probe(self, filename: str) -> Optional[str]:
+        tool_path = get_ffprobe_path()
+        if tool_path is None:
+            return None
+        cmd = [tool_path, "-v", "error",
+               "-show_entries", "format_tags=creation_time",
+               "-of", "default=noprint_wrappers=1:nokey=1",
+               filename]
+        try:
+            res = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=self.timeout, check=False)
+        except subprocess.TimeoutExpired:
+            REPORTER.warning(filename, 'ffprobe_timeout', f"Warning. ffprobe timed out. timeout={self.timeout}\n    file={filename}")
+            return None
+        except OSError as e:
+            REPORTER.warning(filename, 'ffprobe_failed', f"Warning. ffprobe could not be executed. {e}\n    file={filename}")
+            return None
+        if res.returncode != 0:
+            return None
+        # '': the file has no creation time.
+        return res.stdout.decode('utf-8', errors='replace').strip()
+
+FFPROBE_POOL = FfprobePool()
+
+## @fn          configure_ffprobe_pool()
+#  @brief       Replaces the ffprobe pool used by movie_get_date().
+#  @param[in]   max_workers     : number of concurrent ffprobe processes [type int]
+#  @param[in]   timeout         : timeout of one probe (seconds) [type float]
+#  @retval      None            : 
+def configure_ffprobe_pool(max_workers: int, timeout: float) -> None:
+    global FFPROBE_POOL
+    FFPROBE_POOL.shutdown()
+    FFPROBE_POOL = FfprobePool(max_workers, timeout)
 
 def install_ffmpeg_linux():
     enb_ffprobe = not is_ffprobe()
@@ -491,6 +3140,7 @@ def download_and_extract_ffprobe(zip_url: str, extract_path: str) -> bool:
 
     zip_path = os.path.join(extract_path, f"ffmpeg{suffix}")
 
+    import urllib.request
     proxy_dict = {}
     if os.environ.get("HTTP_PROXY"):
         proxy_dict["http"] = os.environ["HTTP_PROXY"]
@@ -554,8 +3204,81 @@ def download_and_extract_ffprobe(zip_url: str, extract_path: str) -> bool:
 
     return True
 
+# creation_time of ffprobe. e.g. 2022-10-29T07:28:08.000000Z
+MOVIE_CREATION_TIME_PATTERN = re.compile(r"(?P<year>[0-9]{4})-(?P<month>[0-9]{1,2})-(?P<day>[0-9]{1,2})T(?P<hour>[0-9]{1,2}):(?P<min>[0-9]{1,2}):(?P<sec>[0-9]+)[\.][0-9]+Z")
+# Time origin of the ISOBMFF "mvhd" box (seconds since 1904-01-01 00:00:00 UTC).
+ISOBMFF_EPOCH = datetime.datetime(1904, 1, 1)
+# UUID of the Canon CR3 metadata box (contains CMT1=IFD0, CMT2=ExifIFD).
+CANON_CR3_UUID = bytes.fromhex('85c0b687820f11e08111f4ce462b6a48')
+
+## @fn          read_cr3_cmt_datetime()
+#  @brief       Reads the shooting date from the CMT1/CMT2 boxes of a Canon CR3 file.
+#  @param[in]   fp              : binary file object [type BinaryIO]
+#  @param[in]   start           : start offset of the children of the Canon uuid box [type int]
+#  @param[in]   end             : end offset of the Canon uuid box [type int]
+#  @retval      dt              : shooting date. None if not found. [type Optional[datetime.datetime]]
+def read_cr3_cmt_datetime(fp: BinaryIO, start: int, end: int) -> Optional[datetime.datetime]:
+    cmt: Dict[str, Dict[int, str]] = {}
+    for typ, payload, box_end in iter_isobmff_boxes(fp, start, end):
+        if typ in ('CMT1', 'CMT2'):
+            tags = read_tiff_date_tags(fp, payload)
+            if tags:
+                cmt[typ] = tags
+    # CMT2 (ExifIFD) DateTimeOriginal is preferred, CMT1 (IFD0) DateTime is used when it is missing.
+    date_str = cmt.get('CMT2', {}).get(EXIF_TAG_DATETIME_ORIGINAL) or cmt.get('CMT1', {}).get(EXIF_TAG_DATETIME)
+    if not date_str:
+        return None
+    try:
+        return datetime.datetime.strptime(date_str, "%Y:%m:%d %H:%M:%S")
+    except ValueError:
+        return None
+
+## @fn          read_isobmff_creation_time()
+#  @brief       Reads the creation time of a MP4/MOV/CR3 file from moov/mvhd (CR3: CMT1/CMT2) without ffprobe.
+#  @param[in]   filename        : input file [type str]
+#  @retval      dt              : creation time. None if it could not be read. [type Optional[datetime.datetime]]
+def read_isobmff_creation_time(filename: str) -> Optional[datetime.datetime]:
+    try:
+        with open(filename, 'rb', buffering=HEADER_READ_BUFFER) as fp:
+            file_size = get_stream_size(fp)
+            moov = find_isobmff_box(fp, 'moov', 0, file_size)
+            if moov is None:
+                return None
+            mvhd: Optional[Tuple[int, int]] = None
+            for typ, payload, box_end in iter_isobmff_boxes(fp, moov[0], moov[1]):
+                if typ == 'uuid':
+                    fp.seek(payload)
+                    if fp.read(16) == CANON_CR3_UUID:
+                        dt = read_cr3_cmt_datetime(fp, payload + 16, box_end)
+                        if dt is not None:
+                            return dt
+                elif (typ == 'mvhd') and (mvhd is None):
+                    mvhd = (payload, box_end)
+            if mvhd is None:
+                return None
+            fp.seek(mvhd[0])
+            data = fp.read(min(12, mvhd[1] - mvhd[0]))
+    except (OSError, ValueError, struct.error):
+        return None
+
+    # mvhd is a full box. version 1 uses 64-bit times, version 0 uses 32-bit times.
+    try:
+        if data[0] == 1:
+            seconds = struct.unpack('>Q', data[4:12])[0]
+        else:
+            seconds = struct.unpack('>I', data[4:8])[0]
+    except (IndexError, struct.error):
+        return None
+    # 0 means "not set".
+    if seconds == 0:
+        return None
+    try:
+        return ISOBMFF_EPOCH + datetime.timedelta(seconds=seconds)
+    except OverflowError:
+        return None
+
 ## @fn          movie_get_date()
-## @brief       Get date information from a video file
+## @brief       Get date information from a video file. The container is parsed natively, and ffprobe is used only when it fails.
 ## @param[in]   filename        : input file [type str]
 ## @param[in]   url             : URL info [type str]
 ## @retval      exif_data       : exif info (key,value) [type List[Tuple[str, Any]]]
@@ -563,50 +3286,217 @@ def movie_get_date(filename: str, url: str) -> Dict[str, Optional[str]] :
     flag = False    # Initializing variables
     inf: Dict[str, Optional[str]] = {'year':None, 'month':None, 'day':None , 'hour':None, 'min':None, 'sec':None} # Initializing variables
 
+    dt = read_isobmff_creation_time(filename)
+    if dt is not None:
+        inf['year']  = dt.strftime('%Y')
+        inf['month'] = dt.strftime('%m')
+        inf['day']   = dt.strftime('%d')
+        inf['hour']  = dt.strftime('%H')
+        inf['min']   = dt.strftime('%M')
+        inf['sec']   = dt.strftime('%S')
+        return inf
+
     if(is_ffprobe() == False):
         if not setup_ffprobe(url):
-            print("ffprobe setup failed.")
+            REPORTER.warning(filename, 'ffprobe_missing', "ffprobe setup failed.")
             return inf
 
-    video_info = ffmpeg.probe(filename)
-    move_format = video_info.get('format')
-    tags = move_format.get('tags')
-    # tags is not None & Checks if the 'creation_time' key exists.
-    inf_time = tags.get('creation_time') if tags and 'creation_time' in tags else None
+    inf_time = FFPROBE_POOL.probe_creation_time(filename)
     if (inf_time != None):
-        pattern = re.compile(r"(?P<year>[0-9]{4})-(?P<month>[0-9]{1,2})-(?P<day>[0-9]{1,2})T(?P<hour>[0-9]{1,2}):(?P<min>[0-9]{1,2}):(?P<sec>[0-9]+)[\.][0-9]+Z")
         # 2022-10-29T07:28:08.000000Z
-        if(pattern.match(inf_time)):
-            m = pattern.match(inf_time)
-            if m is not None:
-                flag = True    #set flag
-                inf['year']  = m.group('year')
-                inf['month'] = m.group('month')
-                inf['day']   = m.group('day')
-                inf['hour']  = m.group('hour')
-                inf['min']   = m.group('min')
-                inf['sec']   = m.group('sec')
-            else:
-                inf['year']  = None
-                inf['month'] = None
-                inf['day']   = None
-                inf['hour']  = None
-                inf['min']   = None
-                inf['sec']   = None
+        m = MOVIE_CREATION_TIME_PATTERN.match(inf_time)
+        if m is not None:
+            flag = True    #set flag
+            inf['year']  = m.group('year')
+            inf['month'] = m.group('month')
+            inf['day']   = m.group('day')
+            inf['hour']  = m.group('hour')
+            inf['min']   = m.group('min')
+            inf['sec']   = m.group('sec')
     if(flag == False):
-        print(f"Warning. Date information could not be retrieved. \n    file={filename}")
+        REPORTER.warning(filename, 'no_creation_time', f"Warning. Date information could not be retrieved. \n    file={filename}")
     return inf
 
+# EXIF tag IDs used for date extraction.
+EXIF_TAG_DATETIME = 0x0132
+EXIF_TAG_EXIF_IFD = 0x8769
+EXIF_TAG_DATETIME_ORIGINAL = 0x9003
+EXIF_TAG_DATETIME_DIGITIZED = 0x9004
+EXIF_DATE_TAGS: Dict[str, int] = {
+    'DateTime': EXIF_TAG_DATETIME,
+    'DateTimeOriginal': EXIF_TAG_DATETIME_ORIGINAL,
+    'DateTimeDigitized': EXIF_TAG_DATETIME_DIGITIZED,
+}
+# EXIF date string "YYYY:MM:DD HH:MM:SS"
+EXIF_DATETIME_PATTERN = re.compile(r'(?P<year>\d{4}):(?P<month>\d{2}):(?P<day>\d{2}) (?P<hour>\d{2}):(?P<min>\d{2}):(?P<sec>\d{2})')
+# TIFF header magic numbers accepted by read_tiff_date_tags().
+# 42: TIFF (NEF, ARW, CR2, DNG, PEF), 0x4F52/0x5352: Olympus ORF ("IIRO"/"IIRS"), 0x55: Panasonic RW2.
+TIFF_MAGICS = (42, 0x4F52, 0x5352, 0x55)
+# Upper limit of entries in one IFD. Larger values are treated as a broken file.
+TIFF_MAX_IFD_ENTRIES = 1024
+# Upper limit of a date tag value ("YYYY:MM:DD HH:MM:SS" is 20 bytes). Larger values are skipped as broken.
+TIFF_MAX_DATE_BYTES = 64
+TIFF_TYPE_ASCII = 2
+
+## @fn          read_tiff_date_tags()
+#  @brief       Reads the date tags from a TIFF structure (IFD0 and ExifIFD) using small seeks and reads.
+#  @param[in]   fp              : binary file object [type BinaryIO]
+#  @param[in]   base            : offset of the TIFF header in fp [type int]
+#  @retval      tags            : {tag id: value} of the date tags found. None if fp is not a TIFF structure. [type Optional[Dict[int, str]]]
+def read_tiff_date_tags(fp: BinaryIO, base: int = 0) -> Optional[Dict[int, str]]:
+    fp.seek(base)
+    header = fp.read(8)
+    if len(header) < 8:
+        return None
+    if header[:2] == b'II':
+        endian = '<'
+    elif header[:2] == b'MM':
+        endian = '>'
+    else:
+        return None
+    magic, ifd_offset = struct.unpack(endian + 'HI', header[2:8])
+    if magic not in TIFF_MAGICS:
+        return None
+
+    date_tags = set(EXIF_DATE_TAGS.values())
+    tags: Dict[int, str] = {}
+    # Only IFD0 and the ExifIFD it points to are visited. IFD1 (thumbnail) is skipped.
+    ifd_offsets = [ifd_offset]
+    visited = set()
+    while ifd_offsets:
+        offset = ifd_offsets.pop(0)
+        if offset == 0 or offset in visited:
+            continue
+        visited.add(offset)
+        fp.seek(base + offset)
+        raw = fp.read(2)
+        if len(raw) < 2:
+            break
+        count = struct.unpack(endian + 'H', raw)[0]
+        if count > TIFF_MAX_IFD_ENTRIES:
+            raise ValueError(f"Too many IFD entries. count={count}")
+        entries = fp.read(count * 12)
+        pending: List[Tuple[int, int, int]] = []
+        for pos in range(0, len(entries) - 11, 12):
+            tag, typ, cnt = struct.unpack_from(endian + 'HHI', entries, pos)
+            value_field = entries[pos + 8:pos + 12]
+            if tag == EXIF_TAG_EXIF_IFD:
+                ifd_offsets.append(struct.unpack(endian + 'I', value_field)[0])
+            elif (tag in date_tags) and (typ == TIFF_TYPE_ASCII) and (tag not in tags):
+                if cnt <= 4:
+                    tags[tag] = decode_exif_ascii(value_field[:cnt])
+                elif cnt <= TIFF_MAX_DATE_BYTES:
+                    pending.append((tag, struct.unpack(endian + 'I', value_field)[0], cnt))
+        # Values longer than 4 bytes are stored outside the IFD. Read them after the entry scan.
+        for tag, value_offset, cnt in pending:
+            fp.seek(base + value_offset)
+            tags[tag] = decode_exif_ascii(fp.read(cnt))
+    return tags
+
+## @fn          decode_exif_ascii()
+#  @brief       Converts an EXIF ASCII value to str. Trailing NUL characters are removed.
+#  @param[in]   raw             : value bytes [type bytes]
+#  @retval      value           : value string [type str]
+def decode_exif_ascii(raw: bytes) -> str:
+    return raw.split(b'\x00', 1)[0].decode('ascii', errors='replace').strip()
+
+## @fn          find_jpeg_exif_offset()
+#  @brief       Walks the JPEG markers up to APP1(Exif) and returns the offset of the TIFF header.
+#  @param[in]   fp              : binary file object [type BinaryIO]
+#  @retval      offset          : TIFF header offset. None if the JPEG has no EXIF segment. [type Optional[int]]
+def find_jpeg_exif_offset(fp: BinaryIO) -> Optional[int]:
+    fp.seek(0)
+    if fp.read(2) != b'\xff\xd8':
+        raise ValueError("Not a JPEG file.")
+    while True:
+        marker = fp.read(2)
+        if len(marker) < 2 or marker[0] != 0xFF:
+            raise ValueError("Broken JPEG marker.")
+        code = marker[1]
+        # Skip fill bytes (0xFF 0xFF ...)
+        while code == 0xFF:
+            fill = fp.read(1)
+            if not fill:
+                raise ValueError("Broken JPEG marker.")
+            code = fill[0]
+        # SOS / EOI: the metadata segments are finished.
+        if code in (0xDA, 0xD9):
+            return None
+        # Markers without a length field.
+        if (0xD0 <= code <= 0xD7) or (code == 0x01):
+            continue
+        raw = fp.read(2)
+        if len(raw) < 2:
+            raise ValueError("Broken JPEG segment length.")
+        length = struct.unpack('>H', raw)[0]
+        if length < 2:
+            raise ValueError("Broken JPEG segment length.")
+        if code == 0xE1 and length >= 8:
+            if fp.read(6) == b'Exif\x00\x00':
+                return fp.tell()
+            fp.seek(length - 8, os.SEEK_CUR)
+        else:
+            fp.seek(length - 2, os.SEEK_CUR)
+
+## @fn          read_exif_date_tags()
+#  @brief       Reads the EXIF date tags of a JPEG or TIFF file without decoding the image.
+#  @param[in]   file            : input file [type str]
+#  @retval      tags            : {tag id: value}. None if the file could not be parsed natively. [type Optional[Dict[int, str]]]
+def read_exif_date_tags(file: str) -> Optional[Dict[int, str]]:
+    try:
+        with open(file, 'rb', buffering=HEADER_READ_BUFFER) as fp:
+            head = fp.read(2)
+            if head == b'\xff\xd8':
+                offset = find_jpeg_exif_offset(fp)
+                if offset is None:
+                    return {}
+                return read_tiff_date_tags(fp, offset)
+            elif head in (b'II', b'MM'):
+                return read_tiff_date_tags(fp, 0)
+            return None
+    except (OSError, ValueError, struct.error):
+        return None
+
+## @fn          get_exif_date()
+#  @brief       Gets the shooting date string of a JPEG/TIFF file. "DateTimeOriginal" is preferred, "DateTime" is used when it is missing.
+#  @param[in]   file            : input file [type str]
+#  @retval      value           : date string (e.g. "2024:07:07 12:00:00"). None if not found. [type Optional[str]]
+def get_exif_date(file: str) -> Optional[str]:
+    tags = read_exif_date_tags(file)
+    if tags is not None:
+        return tags.get(EXIF_TAG_DATETIME_ORIGINAL) or tags.get(EXIF_TAG_DATETIME) or None
+    # Fallback: the file could not be parsed natively, so use Pillow.
+    for field in ("DateTimeOriginal", "DateTime"):
+        id, value = get_exif_pillow(file, field)[0]
+        if value is not None:
+            return value
+    return None
+
 ##
-# @brief        Gets the Exif information of JPEG. Uses the PIL library to get the Exif information.
+# @brief        Gets the Exif information of JPEG. The header is parsed natively, and Pillow is used as a fallback.
 # @param[in]    file            : input file [type str]
 # @param[in]    field           : exif tag info [type str]
 # @retval       exif_data       : exif info (key,value) [type List[Tuple[str, Any]]]
 def get_exif(file: str,field: str) -> List[Tuple[str, Any]] :
+    tag_id = EXIF_DATE_TAGS.get(field)
+    if tag_id is not None:
+        tags = read_exif_date_tags(file)
+        if tags is not None:
+            return [(field, tags.get(tag_id))]
+    return get_exif_pillow(file, field)
+
+##
+# @brief        Gets the Exif information of JPEG. Uses the PIL library to get the Exif information.
+# @param[in]    file            : input file [type str]
+# @param[in]    field           : exif tag info [type str]
+# @retval       exif_data       : exif info (key,value) [type List[Tuple[str, Any]]]
+def get_exif_pillow(file: str,field: str) -> List[Tuple[str, Any]] :
+    Image = import_pil_image()
+    from PIL.ExifTags import TAGS   # type: ignore
     try:
         img = Image.open(file)
     except Exception as e:
-        s = os.path.basename(__file__) + " version=" + __version__ + "\n"
+        s = os.path.basename(__file__) + " version=" + get_version_info() + "\n"
         s = s + "----detect error. image file open error.\n"
         s = s + "file=%s\n" % (file)
         s = s +"%s\n%s" % (type(e),e)
@@ -614,7 +3504,7 @@ def get_exif(file: str,field: str) -> List[Tuple[str, Any]] :
     try:
         exif = img.getexif()
     except Exception as e:
-        s = os.path.basename(__file__) + " version=" + __version__ + "\n"
+        s = os.path.basename(__file__) + " version=" + get_version_info() + "\n"
         s = s + "----detect error. exif error.\n"
         s = s + "file=%s\n" % (file)
         s = s +"%s\n%s" % (type(e),e)
@@ -635,6 +3525,9 @@ def get_exif(file: str,field: str) -> List[Tuple[str, Any]] :
     return exif_data
 
 
+# Date of a date string. "2021:08:26 19:47:16" or "2021/08/26 19:47:16"
+DATEINF_PATTERN = re.compile(r'(?P<year>[12]\d{3})[:/](?P<month>0?[1-9]|1[0-2])[:/](?P<day>0?[1-9]|[12][0-9]|3[01]) ')
+
 ##
 # @brief        Get date information from string information.
 # @param[in]    str             : string [type str]
@@ -643,8 +3536,7 @@ def get_dateinf(str_s) -> Tuple[Optional[str], Optional[str], Optional[str]]:
     # Reference URL: https://qiita.com/shoku-pan/items/7045ca15f79bcc97f2d3
     # 2021:08:26 19:47:16
     # 2021/08/26 19:47:16
-    pattern = re.compile(r'(?P<year>[12]\d{3})[:/](?P<month>0?[1-9]|1[0-2])[:/](?P<day>0?[1-9]|[12][0-9]|3[01]) ')
-    res = pattern.search(str_s)
+    res = DATEINF_PATTERN.search(str_s)
     if res is None:
         year = None
         month = None
@@ -662,60 +3554,78 @@ def get_dateinf(str_s) -> Tuple[Optional[str], Optional[str], Optional[str]]:
 # @param[in]    erropt          : error option [type int]
 # @retval       inf             : date info [type Dict]
 def get_date_info_fm_raw(filename: str, tag: int, erropt=0)->Dict:
-    exif_dict = piexif.load(filename)
+    found, date = read_raw_date_value(filename, tag)
     inf: Dict[str,  Optional[str]] = {}
-    if(tag in exif_dict['Exif']):
-        date = exif_dict['Exif'][tag]
-    else:
+    for key in ("date", "time", "year", "month", "day", "hour", "min", "sec"):
+        inf[key] = None
+    if not found:
         if(erropt==1):
-            name = piexif.TAGS['Exif'][tag]["name"]
-            msg = os.path.basename(__file__) + " version=" + __version__ + "\n"
+            msg = os.path.basename(__file__) + " version=" + get_version_info() + "\n"
             msg += f"----detect error. exif not tag.\n"
-            msg += f"    tag={name}"
+            msg += f"    tag={exif_tag_name(tag)}"
             die_print(msg)
-        else:
-            date = None
-            inf["date"] = None
-            inf["time"] = None
-            inf["year"] = None
-            inf["month"] = None
-            inf["day"] = None
-            inf["hour"] = None
-            inf["min"] = None
-            inf["sec"] = None
+        return inf
     if(date == None) or (date == ""):
         if(erropt==1):
-            name = piexif.TAGS['Exif'][tag]["name"]
-            msg = os.path.basename(__file__) + " version=" + __version__ + "\n"
+            msg = os.path.basename(__file__) + " version=" + get_version_info() + "\n"
             msg = msg + "----detect error. exif tag value is none.\n"
-            msg = msg + "    tag=%s\n" % (name)
+            msg = msg + "    tag=%s\n" % (exif_tag_name(tag))
             die_print(msg)
-        else:
-            inf["date"] = None
-            inf["time"] = None
-            inf["year"] = None
-            inf["month"] = None
-            inf["day"] = None
-            inf["hour"] = None
-            inf["min"] = None
-            inf["sec"] = None
-    else:
-        date,time=str(date).split(" ")
-        date = date.replace("b'", '')
-        time = time.replace("'",'')
-        year, month, day = date.split(":")
-        hour, min, sec = time.split(":")
-        inf["date"] = date
-        inf["time"] = time
-        inf["year"] = year
-        inf["month"] = month
-        inf["day"] = day
-        inf["hour"] = hour
-        inf["min"] = min
-        inf["sec"] = sec
+        return inf
+    # "2024:07:01 12:00:00"
+    m = EXIF_DATETIME_PATTERN.match(date)
+    if m is None:
+        if(erropt==1):
+            msg = os.path.basename(__file__) + " version=" + get_version_info() + "\n"
+            msg = msg + "----detect error. exif tag value is invalid.\n"
+            msg = msg + "    tag=%s value=%s\n" % (exif_tag_name(tag), date)
+            die_print(msg)
+        return inf
+    inf["date"] = f"{m.group('year')}:{m.group('month')}:{m.group('day')}"
+    inf["time"] = f"{m.group('hour')}:{m.group('min')}:{m.group('sec')}"
+    inf["year"] = m.group('year')
+    inf["month"] = m.group('month')
+    inf["day"] = m.group('day')
+    inf["hour"] = m.group('hour')
+    inf["min"] = m.group('min')
+    inf["sec"] = m.group('sec')
     return inf
 
-def get_ini_dict_val(section: str) -> ini.IniDict:
+## @fn          read_raw_date_value()
+#  @brief       Reads one EXIF date tag of a RAW file. The TIFF IFDs are parsed with small reads (read_exif_date_tags()), so only a few KB of the file are read.
+#               piexif is used only when the file is not a TIFF structure or the tag is not a date tag.
+#  @param[in]   filename        : input file [type str]
+#  @param[in]   tag             : tag value [type int]
+#  @retval      found           : True if the tag exists [type bool]
+#  @retval      value           : tag value [type Optional[str]]
+def read_raw_date_value(filename: str, tag: int) -> Tuple[bool, Optional[str]]:
+    if tag in EXIF_DATE_TAGS.values():
+        tags = read_exif_date_tags(filename)
+        if tags is not None:
+            return (tag in tags), tags.get(tag)
+    # Fallback: piexif reads the whole file.
+    exif_dict = import_piexif().load(filename)
+    if tag not in exif_dict['Exif']:
+        return False, None
+    value = exif_dict['Exif'][tag]
+    if isinstance(value, bytes):
+        value = decode_exif_ascii(value)
+    return True, value
+
+## @fn          exif_tag_name()
+#  @brief       Gets the name of an EXIF tag for error messages.
+#  @param[in]   tag             : tag value [type int]
+#  @retval      name            : tag name [type str]
+def exif_tag_name(tag: int) -> str:
+    for name, tag_id in EXIF_DATE_TAGS.items():
+        if tag_id == tag:
+            return name
+    try:
+        return import_piexif().TAGS['Exif'][tag]["name"]
+    except KeyError:
+        return hex(tag)
+
+def get_ini_dict_val(section: str) -> "ini.IniDict":
     '''
     Set the information you want to set in section="DEFAULT" of the ini file in dict format.
     '''
@@ -723,12 +3633,30 @@ def get_ini_dict_val(section: str) -> ini.IniDict:
         section: {
             'picture_ext': {'type': List[str], 'inf': ['.jpg', '.jpeg' , '.tif']},
             'movie_ext': {'type': List[str], 'inf': ['.mp4', '.mov', '.cr3']},
-            'raw_ext': {'type': List[str], 'inf': ['.orf', '.nef', '.arw']},
+            'raw_ext': {'type': List[str], 'inf': ['.orf', '.nef', '.arw', '.cr2', '.dng', '.rw2', '.pef']},
             'mtime_ext': {'type': List[str], 'inf': ['.mts']},
             'heic_ext': {'type': List[str], 'inf': ['.heic']},
             'url_ffmpeg': {'type': str, 'inf': "https://www.gyan.dev/ffmpeg/builds/ffmpeg-release-essentials.zip"},
             'date_format': {'type': str, 'inf': "%Y_%m_%d"},
             'tar_folder': {'type': str, 'inf': '.'},
+            'ffprobe_jobs': {'type': int, 'inf': 2},
+            'ffprobe_timeout': {'type': float, 'inf': 30.0},
+            'jobs': {'type': int, 'inf': 1},
+            'executor': {'type': str, 'inf': 'thread'},
+            'concurrency': {'type': int, 'inf': 16},
+            'collision': {'type': str, 'inf': 'skip'},
+            'cache': {'type': str, 'inf': ''},
+            'cache_max_entries': {'type': int, 'inf': 200000},
+            'watch_interval': {'type': float, 'inf': 10.0},
+            'watch_settle': {'type': float, 'inf': 5.0},
+            'copy_jobs': {'type': int, 'inf': 4},
+            'picture_sources': {'type': List[str], 'inf': DEFAULT_DATE_SOURCES['picture_ext']},
+            'raw_sources': {'type': List[str], 'inf': DEFAULT_DATE_SOURCES['raw_ext']},
+            'heic_sources': {'type': List[str], 'inf': DEFAULT_DATE_SOURCES['heic_ext']},
+            'mtime_sources': {'type': List[str], 'inf': DEFAULT_DATE_SOURCES['mtime_ext']},
+            'movie_sources': {'type': List[str], 'inf': DEFAULT_DATE_SOURCES['movie_ext']},
+            'filename_patterns': {'type': List[str], 'inf': DEFAULT_FILENAME_PATTERNS},
+            'filename_sample': {'type': float, 'inf': 0.0},
         }
     }
 
@@ -786,5 +3714,407 @@ def safe_move(
 
     raise PermissionError(f"Retry limit reached: {src}")
 
+# Linux renameat2() flag: fail with EEXIST instead of replacing the destination.
+RENAME_NOREPLACE = 1
+AT_FDCWD = -100
+_RENAMEAT2: Any = None
+_RENAMEAT2_LOADED = False
+_RENAMEAT2_LOCK = threading.Lock()
+
+def _get_renameat2() -> Any:
+    global _RENAMEAT2, _RENAMEAT2_LOADED
+    with _RENAMEAT2_LOCK:
+        if not _RENAMEAT2_LOADED:
+            _RENAMEAT2_LOADED = True
+            if sys.platform.startswith('linux'):
+                try:
+                    import ctypes
+                    import ctypes.util
+                    libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+                    func = libc.renameat2
+                    func.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_int, ctypes.c_char_p, ctypes.c_uint]
+                    func.restype = ctypes.c_int
+                    _RENAMEAT2 = func
+                except (OSError, AttributeError):
+                    # glibc < 2.28 has no renameat2().
+                    _RENAMEAT2 = None
+        return _RENAMEAT2
+
+## @fn          rename_noreplace()
+#  @brief       Renames the file without replacing an existing destination. The check and the rename are one atomic operation.
+#  @param[in]   src             : source path [type str]
+#  @param[in]   dst             : destination path [type str]
+#  @retval      None            : FileExistsError is raised if dst exists. OSError(EXDEV) is raised across file systems.
+def rename_noreplace(src: str, dst: str) -> None:
+    if os.name == 'nt':
+        # os.rename() never replaces an existing file on Windows.
+        os.rename(src, dst)
+        return
+    func = _get_renameat2()
+    if func is not None:
+        import ctypes
+        if func(AT_FDCWD, os.fsencode(src), AT_FDCWD, os.fsencode(dst), RENAME_NOREPLACE) == 0:
+            return
+        err = ctypes.get_errno()
+        if err not in (errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP):
+            raise OSError(err, os.strerror(err), src, None, dst)
+        # The file system does not support RENAME_NOREPLACE.
+    try:
+        # link() fails if dst exists, so link + unlink does not replace the destination either.
+        os.link(src, dst, follow_symlinks=False)
+    except FileExistsError:
+        raise
+    except OSError as e:
+        if e.errno == errno.EXDEV:
+            raise
+        # No hard links (FAT, exFAT, some network shares). The check and the rename are not atomic here.
+        if os.path.lexists(dst):
+            raise FileExistsError(errno.EEXIST, os.strerror(errno.EEXIST), dst)
+        os.rename(src, dst)
+        return
+    os.unlink(src)
+
+## @fn          copy_file_data()
+#  @brief       Copies the contents of the file in the kernel when possible (copy_file_range(), sendfile()), otherwise with a large buffer.
+#  @param[in]   fd_src          : source file descriptor [type int]
+#  @param[in]   fd_dst          : destination file descriptor [type int]
+#  @param[in]   size            : file size [type int]
+#  @param[in]   bufsize         : copy chunk size [type int]
+#  @retval      copied          : number of copied bytes [type int]
+def copy_file_data(fd_src: int, fd_dst: int, size: int, bufsize: int = 8 * 1024 * 1024) -> int:
+    copied = 0
+    if hasattr(os, 'copy_file_range'):
+        try:
+            while True:
+                n = os.copy_file_range(fd_src, fd_dst, max(bufsize, size - copied))  # type: ignore[attr-defined]
+                if n == 0:
+                    return copied
+                copied += n
+        except OSError as e:
+            if copied > 0 or e.errno not in (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.EBADF, errno.EPERM):
+                raise
+    if hasattr(os, 'sendfile') and sys.platform.startswith('linux'):
+        try:
+            while True:
+                n = os.sendfile(fd_dst, fd_src, copied, max(bufsize, size - copied))
+                if n == 0:
+                    return copied
+                copied += n
+        except OSError as e:
+            if copied > 0 or e.errno not in (errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP):
+                raise
+    while True:
+        chunk = os.read(fd_src, bufsize)
+        if not chunk:
+            return copied
+        view = memoryview(chunk)
+        pos = 0
+        while pos < len(chunk):
+            pos += os.write(fd_dst, view[pos:])
+        copied += len(chunk)
+
+class MoveEngine:
+    """
+    Moves files into the date folders without replacing existing files.
+
+    On the same device the file is renamed with renameat2(RENAME_NOREPLACE)
+    (link + unlink where it is not supported). Across devices the file is
+    copied into a temporary file in the date folder by up to `copy_jobs`
+    threads, renamed into place and then removed from the source. The
+    device of each folder is looked up once, and the same-device decision
+    is kept per (source device, destination device).
+    """
+    action = 'moved'
+    keep_source = False
+
+    def __init__(self, copy_jobs: int = 4, max_retry: int = 5, retry_wait: float = 1.0, bufsize: int = 8 * 1024 * 1024):
+        self.copy_jobs = max(1, copy_jobs)
+        self.max_retry = max_retry
+        self.retry_wait = retry_wait
+        self.bufsize = bufsize
+        self._dir_dev: Dict[str, int] = {}
+        self._same_dev: Dict[Tuple[int, int], bool] = {}
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._pending: Deque["Future[None]"] = collections.deque()
+        self._lock = threading.Lock()
+
+    ## @fn          move()
+    #  @brief       Moves the file. A cross-device move runs in the copy threads; call wait() to finish it.
+    #  @param[in]   src             : source file [type str]
+    #  @param[in]   dst             : destination file [type str]
+    #  @param[in]   done            : called with the result of the move ('ok', 'copied_source_kept', or the reason code when a copy thread fails) [type Optional[Callable[[str], None]]]
+    #  @retval      None            : FileExistsError is raised if dst exists.
+    def move(self, src: str, dst: str, done: Optional[Callable[[str], None]] = None) -> None:
+        if self.is_same_device(src, dst):
+            try:
+                SYSCALLS.add('rename', src)
+                self._retry(rename_noreplace, src, dst)
+            except OSError as e:
+                if e.errno != errno.EXDEV:
+                    raise
+                # Same st_dev but different mounts (bind mounts). Copy from now on.
+                self._set_same_device(src, dst, False)
+            else:
+                if done is not None:
+                    done('ok')
+                return
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.copy_jobs, thread_name_prefix="copy")
+            executor = self._executor
+        # Keep a bounded number of copies in flight.
+        while len(self._pending) >= self.copy_jobs * 2:
+            self._pending.popleft().result()
+        self._pending.append(executor.submit(self._copy_move, src, dst, done))
+
+    ## @fn          move_file()
+    #  @brief       Moves the file and returns after the move is finished.
+    #  @param[in]   src             : source file [type str]
+    #  @param[in]   dst             : destination file [type str]
+    #  @retval      result          : 'ok', or 'copied_source_kept' when the copy is complete but the source could not be removed. FileExistsError is raised if dst exists. [type str]
+    def move_file(self, src: str, dst: str) -> str:
+        if self.is_same_device(src, dst):
+            try:
+                SYSCALLS.add('rename', src)
+                self._retry(rename_noreplace, src, dst)
+                return 'ok'
+            except OSError as e:
+                if e.errno != errno.EXDEV:
+                    raise
+                self._set_same_device(src, dst, False)
+        return self._retry(self._copy_file, src, dst)
+
+    def wait(self) -> None:
+        while self._pending:
+            self._pending.popleft().result()
+
+    def shutdown(self) -> None:
+        try:
+            self.wait()
+        finally:
+            with self._lock:
+                if self._executor is not None:
+                    self._executor.shutdown(wait=True)
+                    self._executor = None
+
+    def is_same_device(self, src: str, dst: str) -> bool:
+        key = (self._device_of(os.path.dirname(src)), self._device_of(os.path.dirname(dst)))
+        same = self._same_dev.get(key)
+        if same is None:
+            same = key[0] == key[1]
+            self._same_dev[key] = same
+        return same
+
+    def _set_same_device(self, src: str, dst: str, same: bool) -> None:
+        self._same_dev[(self._device_of(os.path.dirname(src)), self._device_of(os.path.dirname(dst)))] = same
+
+    def _device_of(self, folder: str) -> int:
+        folder = os.path.abspath(folder or '.')
+        dev = self._dir_dev.get(folder)
+        if dev is None:
+            dev = os.stat(folder).st_dev
+            self._dir_dev[folder] = dev
+        return dev
+
+    def _copy_move(self, src: str, dst: str, done: Optional[Callable[[str], None]]) -> None:
+        # The errors are reported for this file here. Raised from the future, they would stop the run at another file.
+        try:
+            result = self._retry(self._copy_file, src, dst)
+        except FileExistsError:
+            result = 'exists'
+        except FileNotFoundError:
+            # The source disappeared before the copy thread opened it.
+            result = 'not_found'
+        except OSError as e:
+            result = self._failure_reason(e)
+            REPORTER.warning(src, 'failed', f"Error. The file could not be copied. {type(e).__name__}: {e}\n    file={src}")
+        if done is not None:
+            done(result)
+        elif result != 'ok':
+            print(f"{src} is not moved to {dst}. ({result})")
+
+    ## @fn          _failure_reason()
+    #  @brief       Gets the reason code of a copy that failed with the error.
+    #  @param[in]   e               : error of the copy [type OSError]
+    #  @retval      reason          : reason code (REASON_CODES) [type str]
+    def _failure_reason(self, e: OSError) -> str:
+        return 'failed'
+
+    def _copy_file(self, src: str, dst: str) -> str:
+        SYSCALLS.add('copy', src)
+        tmp = os.path.join(os.path.dirname(dst), f".{os.path.basename(dst)}.{os.getpid()}.{threading.get_ident()}.part")
+        t0 = time.perf_counter()
+        try:
+            self._write_copy(src, tmp)
+            shutil.copystat(src, tmp)
+            # The complete copy appears in the date folder at once.
+            rename_noreplace(tmp, dst)
+        except BaseException:
+            if os.path.lexists(tmp):
+                os.unlink(tmp)
+            raise
+        STAGE_TIMER.add('copy', time.perf_counter() - t0)
+        if self.keep_source:
+            return 'ok'
+        try:
+            os.unlink(src)
+        except OSError as e:
+            # dst is complete. Raised, the retry would find dst and report 'exists' for a copied file.
+            REPORTER.warning(src, 'copied_source_kept', f"Warning. The file is copied, but the source could not be removed. {type(e).__name__}: {e}\n    file={src}")
+            return 'copied_source_kept'
+        return 'ok'
+
+    def _write_copy(self, src: str, tmp: str) -> None:
+        fd_src = os.open(src, os.O_RDONLY | getattr(os, 'O_BINARY', 0))
+        try:
+            st = os.fstat(fd_src)
+            fd_dst = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, 'O_BINARY', 0), 0o666)
+            try:
+                copy_file_data(fd_src, fd_dst, st.st_size, self.bufsize)
+                os.fsync(fd_dst)
+            finally:
+                os.close(fd_dst)
+        finally:
+            os.close(fd_src)
+
+    def _retry(self, func: Callable[[str, str], Any], src: str, dst: str) -> Any:
+        # The same retry handling as safe_move().
+        for i in range(self.max_retry):
+            try:
+                return func(src, dst)
+            except PermissionError as e:
+                REPORTER.warning(src, 'permission_retry', f"[{i+1}/{self.max_retry}] PermissionError: {e}")
+                time.sleep(self.retry_wait)
+        raise PermissionError(f"Retry limit reached: {src}")
+
+class CopyVerifyError(OSError):
+    """The written copy does not match the checksum of the source."""
+
+class CopyEngine(MoveEngine):
+    """
+    Copies the files into the date folders and keeps the originals (--copy).
+
+    A reader thread fills two buffers in turn while the other one is being
+    written, so reading the card and writing the destination overlap. With
+    verify=True the source is hashed while it is read, and only the written
+    copy is read back. Each source device has its own copy worker: the files
+    on one card are read one after another, and several card readers are
+    read at the same time. copy_jobs does not limit the copies per device;
+    it limits the copies queued over all devices (copy_jobs * 2).
+    """
+    action = 'copied'
+    keep_source = True
+
+    def __init__(self, copy_jobs: int = 4, verify: bool = False, max_retry: int = 5, retry_wait: float = 1.0, bufsize: int = 4 * 1024 * 1024):
+        super().__init__(copy_jobs, max_retry, retry_wait, bufsize)
+        self.verify = verify
+        self.verify_errors = 0
+        # source device -> copy worker
+        self._device_executors: Dict[int, ThreadPoolExecutor] = {}
+
+    def move(self, src: str, dst: str, done: Optional[Callable[[str], None]] = None) -> None:
+        dev = self._device_of(os.path.dirname(src))
+        with self._lock:
+            executor = self._device_executors.get(dev)
+            if executor is None:
+                executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"copy-{dev}")
+                self._device_executors[dev] = executor
+        # Keep a bounded number of copies in flight.
+        while len(self._pending) >= self.copy_jobs * 2:
+            self._pending.popleft().result()
+        self._pending.append(executor.submit(self._copy_move, src, dst, done))
+
+    def move_file(self, src: str, dst: str) -> str:
+        return self._retry(self._copy_file, src, dst)
+
+    def shutdown(self) -> None:
+        try:
+            super().shutdown()
+        finally:
+            with self._lock:
+                for executor in self._device_executors.values():
+                    executor.shutdown(wait=True)
+                self._device_executors.clear()
+
+    def _failure_reason(self, e: OSError) -> str:
+        if not isinstance(e, CopyVerifyError):
+            return 'failed'
+        # The broken copy is removed and the original is kept. The other files are copied.
+        with self._lock:
+            self.verify_errors += 1
+        return 'verify_failed'
+
+    def _write_copy(self, src: str, tmp: str) -> None:
+        digest = hashlib.blake2b() if self.verify else None
+        free: "queue.Queue[bytearray]" = queue.Queue()
+        full: "queue.Queue[Union[Tuple[bytearray, int], BaseException]]" = queue.Queue()
+        for _ in range(2):
+            free.put(bytearray(self.bufsize))
+        stop = threading.Event()
+
+        def reader() -> None:
+            try:
+                with open(src, 'rb', buffering=0) as f:
+                    while not stop.is_set():
+                        buf = free.get()
+                        n = f.readinto(buf) or 0
+                        if digest is not None:
+                            digest.update(memoryview(buf)[:n])
+                        full.put((buf, n))
+                        if n == 0:
+                            return
+            except BaseException as e:
+                full.put(e)
+
+        thread = threading.Thread(target=reader, name="copy-reader", daemon=True)
+        thread.start()
+        try:
+            with open(tmp, 'xb', buffering=0) as f:
+                while True:
+                    item = full.get()
+                    if isinstance(item, BaseException):
+                        raise item
+                    buf, n = item
+                    if n == 0:
+                        break
+                    view = memoryview(buf)
+                    pos = 0
+                    while pos < n:
+                        pos += f.write(view[pos:n]) or 0
+                    free.put(buf)
+                f.flush()
+                os.fsync(f.fileno())
+                if digest is not None and hasattr(os, 'posix_fadvise'):
+                    # Drop the copy from the page cache, so that it is read back from the device.
+                    os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_DONTNEED)
+        finally:
+            stop.set()
+            # Unblock the reader if it is waiting for a buffer.
+            free.put(bytearray(0))
+            thread.join()
+        if digest is not None:
+            copied = hashlib.blake2b()
+            with open(tmp, 'rb', buffering=0) as f:
+                for chunk in iter(functools.partial(f.read, self.bufsize), b''):
+                    copied.update(chunk)
+            if copied.digest() != digest.digest():
+                raise CopyVerifyError(errno.EIO, "The copy does not match the source (checksum).", src)
+
+MOVE_ENGINE = MoveEngine()
+
+## @fn          configure_move_engine()
+#  @brief       Replaces the move engine used by move_to_date_dir().
+#  @param[in]   copy_jobs       : number of parallel cross-device copies. With copy=True, one copy worker per source device, and copy_jobs limits the queued copies. [type int]
+#  @param[in]   copy            : copy the files and keep the originals (--copy) [type bool]
+#  @param[in]   verify          : verify each copy with a checksum (--verify) [type bool]
+#  @retval      None            : 
+def configure_move_engine(copy_jobs: int, copy: bool = False, verify: bool = False) -> None:
+    global MOVE_ENGINE
+    MOVE_ENGINE.shutdown()
+    MOVE_ENGINE = CopyEngine(copy_jobs, verify) if copy else MoveEngine(copy_jobs)
+
 if __name__ == "__main__":
+    import multiprocessing
+    # The worker processes of --executor process start the exe again (PyInstaller). They must not run main().
+    multiprocessing.freeze_support()
     main()
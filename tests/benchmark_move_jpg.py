@@ -0,0 +1,251 @@
+# tests/benchmark_move_jpg.py
+#
+# End-to-end throughput benchmark of move_picture().
+#
+#   python tests/benchmark_move_jpg.py --files 1000 --mix jpeg_exif=50,jpeg_noexif=10,heic=10,raw=10,mp4=10,mts=10 --output result.json
+#
+# A synthetic corpus is generated in a work folder, move_picture() is run
+# against it, and files/sec, bytes/sec and the p50/p99 per-file latency of
+# each extractor are written as JSON, so that releases can be compared.
+import os
+import sys
+import io
+import json
+import time
+import random
+import shutil
+import pathlib
+import argparse
+import platform
+import datetime
+import tempfile
+import threading
+import contextlib
+from typing import Dict, List, Any, Callable, Optional
+
+SCR_PATH = os.path.abspath(__file__)
+SCR_FOLDER = os.path.dirname(SCR_PATH)
+sys.path.insert(0, os.path.dirname(SCR_FOLDER))
+
+import move_jpg  # target script
+from tests import test_utils
+
+# The date string written into every template. Each generated file gets another date of the same length.
+TEMPLATE_DATE = "2024:07:01 12:00:00"
+
+# corpus type -> extension
+CORPUS_TYPES: Dict[str, str] = {
+    'jpeg_exif': '.jpg',
+    'jpeg_noexif': '.jpg',
+    'heic': '.heic',
+    'raw': '.nef',
+    'mp4': '.mp4',
+    'mts': '.mts',
+}
+
+DEFAULT_MIX = "jpeg_exif=50,jpeg_noexif=10,heic=10,raw=10,mp4=10,mts=10"
+
+DICT_TAR_EXT: Dict[str, List[str]] = {
+    'picture_ext': ['.jpg', '.jpeg', '.tif'],
+    'movie_ext': ['.mp4', '.mov', '.cr3'],
+    'raw_ext': ['.orf', '.nef', '.arw'],
+    'mtime_ext': ['.mts'],
+    'heic_ext': ['.heic'],
+}
+
+def parse_mix(text: str) -> Dict[str, float]:
+    mix: Dict[str, float] = {}
+    for item in text.split(','):
+        if not item.strip():
+            continue
+        name, _, weight = item.partition('=')
+        name = name.strip()
+        if name not in CORPUS_TYPES:
+            raise ValueError(f"unknown corpus type: {name} (choices: {', '.join(CORPUS_TYPES)})")
+        mix[name] = float(weight) if weight else 1.0
+    if not mix or sum(mix.values()) <= 0:
+        raise ValueError(f"invalid mix: {text}")
+    return mix
+
+def build_templates(work_dir: pathlib.Path, size) -> Dict[str, bytes]:
+    """
+    Build one file per corpus type. The corpus files are copies of these with another date.
+    """
+    templates: Dict[str, bytes] = {}
+    img = test_utils.build_ammonite_img(bg_color_index=1, size=size)
+    with contextlib.redirect_stdout(io.StringIO()):
+        path = work_dir / "template.jpg"
+        test_utils.save_image_with_exif(img=img, filename=path, date_str=TEMPLATE_DATE, format="JPEG")
+        templates['jpeg_exif'] = path.read_bytes()
+        img.save(path, "JPEG")
+        templates['jpeg_noexif'] = path.read_bytes()
+        try:
+            path = work_dir / "template.heic"
+            test_utils.save_image_heic(img=img, filename=path, date_str=TEMPLATE_DATE)
+            templates['heic'] = path.read_bytes()
+        except ImportError:
+            pass
+        # RAW-like file: a TIFF with the EXIF date, named like a RAW file.
+        path = work_dir / "template.tif"
+        test_utils.save_image_with_exif(img=img, filename=path, date_str=TEMPLATE_DATE, format="TIFF")
+        templates['raw'] = path.read_bytes()
+        path = work_dir / "template.mp4"
+        test_utils.save_movie_header(path, date_str=TEMPLATE_DATE.replace(':', '-', 2).replace(' ', 'T'))
+        templates['mp4'] = path.read_bytes()
+    # MPEG-TS packets. The date comes from the file mtime.
+    templates['mts'] = (b"\x47" + bytes(187)) * 64
+    for path in work_dir.glob("template.*"):
+        path.unlink()
+    return templates
+
+def make_corpus(output_dir: pathlib.Path, files: int, mix: Dict[str, float], seed: int = 0, size=(320, 240)) -> List[str]:
+    """
+    Generate `files` files with the type mix into output_dir. Returns the file names.
+    """
+    output_dir.mkdir(parents=True, exist_ok=True)
+    templates = build_templates(output_dir, size)
+    kinds = [kind for kind in mix if kind in templates]
+    if not kinds:
+        raise ValueError("no corpus type can be generated")
+    weights = [mix[kind] for kind in kinds]
+    rnd = random.Random(seed)
+    start = datetime.datetime(2020, 1, 1, 12, 0, 0)
+    names: List[str] = []
+    for i in range(files):
+        kind = rnd.choices(kinds, weights)[0]
+        dt = start + datetime.timedelta(days=rnd.randrange(365 * 4), seconds=rnd.randrange(86400))
+        data = templates[kind]
+        if kind == 'mp4':
+            # mvhd creation time (seconds since 1904) is patched in place.
+            old = int((datetime.datetime.strptime(TEMPLATE_DATE, "%Y:%m:%d %H:%M:%S") - datetime.datetime(1904, 1, 1)).total_seconds())
+            new = int((dt - datetime.datetime(1904, 1, 1)).total_seconds())
+            data = data.replace(old.to_bytes(4, 'big') * 2, new.to_bytes(4, 'big') * 2)
+        elif kind != 'jpeg_noexif':
+            data = data.replace(TEMPLATE_DATE.encode('ascii'), dt.strftime("%Y:%m:%d %H:%M:%S").encode('ascii'))
+        name = f"{kind}_{i:06d}{CORPUS_TYPES[kind]}"
+        path = output_dir / name
+        path.write_bytes(data)
+        ts = dt.timestamp()
+        os.utime(path, (ts, ts))
+        names.append(name)
+    return names
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    k = (len(values) - 1) * pct / 100.0
+    lo = int(k)
+    hi = min(lo + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (k - lo)
+
+def run_benchmark(corpus_dir: pathlib.Path, files: List[str], jobs: int = 1, collision: str = 'skip') -> Dict[str, Any]:
+    """
+    Run move_picture() against the corpus and measure the per-file latency (extraction + move) of each extractor.
+    """
+    sizes = {name: os.path.getsize(corpus_dir / name) for name in files}
+    latency: Dict[str, float] = {}
+    extractor_of: Dict[str, str] = {}
+    lock = threading.Lock()
+    org_extract_date: Callable = move_jpg.extract_date
+    org_commit_move: Callable = move_jpg.commit_move
+
+    def timed_extract_date(file, dict_tar_ext, url_ffmpeg):
+        t0 = time.perf_counter()
+        res = org_extract_date(file, dict_tar_ext, url_ffmpeg)
+        with lock:
+            latency[file] = latency.get(file, 0.0) + time.perf_counter() - t0
+            extractor_of[file] = res['extractor']
+        return res
+
+    def timed_commit_move(res, *args, **kwargs):
+        t0 = time.perf_counter()
+        org_commit_move(res, *args, **kwargs)
+        with lock:
+            latency[res['file']] = latency.get(res['file'], 0.0) + time.perf_counter() - t0
+
+    move_jpg.init_paths()
+    current_path = os.getcwd()
+    move_jpg.extract_date = timed_extract_date
+    move_jpg.commit_move = timed_commit_move
+    try:
+        os.chdir(corpus_dir)
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            t0 = time.perf_counter()
+            move_jpg.move_picture(files, DICT_TAR_EXT, "", "%Y_%m_%d", jobs, 'thread', collision)
+            elapsed = time.perf_counter() - t0
+    finally:
+        move_jpg.extract_date = org_extract_date
+        move_jpg.commit_move = org_commit_move
+        os.chdir(current_path)
+
+    per_extractor: Dict[str, Dict[str, Any]] = {}
+    for file, value in latency.items():
+        kind = extractor_of.get(file) or 'unknown'
+        item = per_extractor.setdefault(kind, {'files': 0, 'bytes': 0, 'latency': []})
+        item['files'] += 1
+        item['bytes'] += sizes.get(file, 0)
+        item['latency'].append(value)
+    for item in per_extractor.values():
+        values = item.pop('latency')
+        item['mean_ms'] = round(sum(values) / len(values) * 1000.0, 4)
+        item['p50_ms'] = round(percentile(values, 50) * 1000.0, 4)
+        item['p99_ms'] = round(percentile(values, 99) * 1000.0, 4)
+
+    total_bytes = sum(sizes.values())
+    return {
+        'files': len(files),
+        # files left in place (no date information or collision)
+        'not_moved': sum(1 for name in files if os.path.exists(corpus_dir / name)),
+        'bytes': total_bytes,
+        'elapsed_sec': round(elapsed, 6),
+        'files_per_sec': round(len(files) / elapsed, 3) if elapsed > 0 else None,
+        'bytes_per_sec': round(total_bytes / elapsed, 3) if elapsed > 0 else None,
+        'extractors': per_extractor,
+    }
+
+def main(argv: Optional[List[str]] = None) -> Dict[str, Any]:
+    parser = argparse.ArgumentParser(description="End-to-end throughput benchmark of move_picture()")
+    parser.add_argument('--files', type=int, default=500, help="number of generated files")
+    parser.add_argument('--mix', type=str, default=DEFAULT_MIX, help=f"type mix (types: {', '.join(CORPUS_TYPES)})")
+    parser.add_argument('--seed', type=int, default=0, help="random seed of the corpus")
+    parser.add_argument('-j', '--jobs', type=int, default=1, help="number of date extraction workers")
+    parser.add_argument('--work_dir', type=str, default=None, help="folder of the corpus (default: a temporary folder)")
+    parser.add_argument('--keep', action='store_true', help="keep the corpus after the run")
+    parser.add_argument('-o', '--output', type=str, default=None, help="JSON output file (default: stdout)")
+    args = parser.parse_args(argv)
+
+    mix = parse_mix(args.mix)
+    work_dir = pathlib.Path(args.work_dir) if args.work_dir else pathlib.Path(tempfile.mkdtemp(prefix="move_jpg_bench_"))
+    corpus_dir = work_dir / "corpus"
+    try:
+        files = make_corpus(corpus_dir, args.files, mix, args.seed)
+        result = run_benchmark(corpus_dir, files, args.jobs)
+    finally:
+        if not args.keep:
+            shutil.rmtree(corpus_dir, ignore_errors=True)
+            if not args.work_dir:
+                shutil.rmtree(work_dir, ignore_errors=True)
+
+    result = {
+        'benchmark': 'move_picture',
+        'version': move_jpg.__version_short__,
+        'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': f"{platform.system()}-{platform.machine()}",
+        'jobs': args.jobs,
+        'seed': args.seed,
+        'mix': mix,
+        **result,
+    }
+    text = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + "\n")
+        print(f"result: {args.output}")
+    else:
+        print(text)
+    return result
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+# tests/microbench_move_jpg.py
+#
+# Micro-benchmarks of the date extractors with stored baselines.
+#
+#   python tests/microbench_move_jpg.py --update       # measure and store the baseline of this machine
+#   python tests/microbench_move_jpg.py                # compare with tests/microbench_baseline.json
+#
+# Each extractor is timed on a fixed fixture. The best per-call time of
+# several repeats is compared with the baseline, and the exit code is 1 when
+# an extractor is slower than baseline * (1 + threshold).
+# The timings are absolute, so the baseline is valid only on the machine that
+# measured it. It is not part of the repository (.gitignore); run --update on
+# each machine before the first comparison and after a change to an extractor.
+import os
+import sys
+import io
+import json
+import time
+import shutil
+import pathlib
+import argparse
+import platform
+import tempfile
+import contextlib
+from typing import Dict, List, Any, Callable, Optional, Tuple
+
+SCR_PATH = os.path.abspath(__file__)
+SCR_FOLDER = os.path.dirname(SCR_PATH)
+sys.path.insert(0, os.path.dirname(SCR_FOLDER))
+
+import move_jpg  # target script
+from tests import test_utils
+
+BASELINE_FILE = os.path.join(SCR_FOLDER, "microbench_baseline.json")
+# A run fails when an extractor is slower than baseline * (1 + DEFAULT_THRESHOLD).
+DEFAULT_THRESHOLD = 0.5
+FIXTURE_DATE = "2024:07:01 12:00:00"
+TAG_DATETIME_ORIGINAL = 0x9003
+
+def make_fixtures(fixture_dir: pathlib.Path) -> Dict[str, str]:
+    """
+    Write the fixed fixtures. Returns fixture name -> path.
+    """
+    fixture_dir.mkdir(parents=True, exist_ok=True)
+    img = test_utils.build_ammonite_img(bg_color_index=1, size=(320, 240))
+    paths = {
+        'jpeg': str(fixture_dir / "fixture.jpg"),
+        'heic': str(fixture_dir / "fixture.heic"),
+        'raw': str(fixture_dir / "fixture.nef"),
+        'mp4': str(fixture_dir / "fixture.mp4"),
+        'mts': str(fixture_dir / "fixture.mts"),
+    }
+    with contextlib.redirect_stdout(io.StringIO()):
+        test_utils.save_image_with_exif(img=img, filename=paths['jpeg'], date_str=FIXTURE_DATE, format="JPEG")
+        test_utils.save_image_heic(img=img, filename=paths['heic'], date_str=FIXTURE_DATE)
+        # RAW-like file: a TIFF with the EXIF date, named like a RAW file.
+        test_utils.save_image_with_exif(img=img, filename=paths['raw'], date_str=FIXTURE_DATE, format="TIFF")
+        test_utils.save_movie_header(paths['mp4'], date_str="2024-07-01T12:00:00")
+    with open(paths['mts'], 'wb') as f:
+        f.write((b"\x47" + bytes(187)) * 64)
+    return paths
+
+def build_cases(paths: Dict[str, str]) -> Dict[str, Callable[[], Any]]:
+    return {
+        'get_exif': lambda: move_jpg.get_exif(paths['jpeg'], 'DateTimeOriginal'),
+        'file_get_heic': lambda: move_jpg.file_get_heic(paths['heic']),
+        'get_date_info_fm_raw': lambda: move_jpg.get_date_info_fm_raw(paths['raw'], TAG_DATETIME_ORIGINAL),
+        'movie_get_date': lambda: move_jpg.movie_get_date(paths['mp4'], ""),
+        'file_get_mtime': lambda: move_jpg.file_get_mtime(paths['mts']),
+        'get_dateinf': lambda: move_jpg.get_dateinf(FIXTURE_DATE),
+    }
+
+def time_case(func: Callable[[], Any], number: int, repeat: int) -> float:
+    """
+    Returns the best time of one call (seconds) over `repeat` runs of `number` calls.
+    """
+    func()  # warm up (imports, caches)
+    best = float('inf')
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for _ in range(number):
+            func()
+        best = min(best, (time.perf_counter() - t0) / number)
+    return best
+
+def run_microbench(number: int = 200, repeat: int = 5, names: Optional[List[str]] = None) -> Dict[str, float]:
+    """
+    Time the extractors. Returns extractor name -> microseconds per call.
+    """
+    move_jpg.init_paths()
+    fixture_dir = pathlib.Path(tempfile.mkdtemp(prefix="move_jpg_microbench_"))
+    try:
+        cases = build_cases(make_fixtures(fixture_dir))
+        results: Dict[str, float] = {}
+        for name, func in cases.items():
+            if names and name not in names:
+                continue
+            results[name] = round(time_case(func, number, repeat) * 1e6, 3)
+        return results
+    finally:
+        shutil.rmtree(fixture_dir, ignore_errors=True)
+
+def compare_baseline(results: Dict[str, float], baseline: Dict[str, float], threshold: float) -> List[Tuple[str, Optional[float], float, Optional[float], bool]]:
+    """
+    Returns (name, baseline us, current us, ratio, regressed) per extractor.
+    """
+    rows = []
+    for name, current in results.items():
+        base = baseline.get(name)
+        if base is None or base <= 0:
+            rows.append((name, base, current, None, False))
+            continue
+        ratio = current / base
+        rows.append((name, base, current, round(ratio, 3), ratio > 1.0 + threshold))
+    return rows
+
+def load_baseline(path: str) -> Dict[str, Any]:
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def machine_info() -> Dict[str, str]:
+    """
+    The machine and interpreter a baseline is valid for.
+    """
+    return {
+        'host': platform.node(),
+        'python': platform.python_version(),
+        'platform': f"{platform.system()}-{platform.machine()}",
+    }
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Micro-benchmarks of the move_jpg date extractors")
+    parser.add_argument('--baseline', type=str, default=BASELINE_FILE, help="baseline JSON file")
+    parser.add_argument('--update', action='store_true', help="store the results as the new baseline")
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD, help="allowed slowdown (0.5: 50%%)")
+    parser.add_argument('--number', type=int, default=200, help="calls per repeat")
+    parser.add_argument('--repeat', type=int, default=5, help="number of repeats (the best one is used)")
+    parser.add_argument('--only', nargs='+', default=None, help="extractors to time")
+    parser.add_argument('-o', '--output', type=str, default=None, help="JSON output file of this run")
+    args = parser.parse_args(argv)
+
+    results = run_microbench(args.number, args.repeat, args.only)
+    record: Dict[str, Any] = {'version': move_jpg.__version_short__}
+    record.update(machine_info())
+    record.update({'unit': 'us_per_call', 'results': results})
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(json.dumps(record, indent=2) + "\n")
+    if args.update:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            f.write(json.dumps(record, indent=2) + "\n")
+        for name, value in results.items():
+            print(f"{name:<24} {value:>12.3f} us")
+        print(f"baseline updated. {args.baseline}")
+        return 0
+
+    if not os.path.isfile(args.baseline):
+        print(f"baseline not found. Run with --update first. {args.baseline}")
+        return 1
+    baseline = load_baseline(args.baseline)
+    machine = machine_info()
+    other = {key: baseline.get(key) for key in machine if baseline.get(key) != machine[key]}
+    if other:
+        print(f"baseline was measured on another machine ({other}). Run with --update on this machine first. {args.baseline}")
+        return 1
+    rows = compare_baseline(results, baseline.get('results', {}), args.threshold)
+    print(f"{'extractor':<24} {'baseline us':>12} {'current us':>12} {'ratio':>7}")
+    regressed = []
+    for name, base, current, ratio, bad in rows:
+        base_str = f"{base:.3f}" if base is not None else "-"
+        ratio_str = f"{ratio:.3f}" if ratio is not None else "-"
+        print(f"{name:<24} {base_str:>12} {current:>12.3f} {ratio_str:>7}{'  REGRESSED' if bad else ''}")
+        if bad:
+            regressed.append(name)
+    if regressed:
+        print(f"regression detected (threshold={args.threshold:.0%}): {', '.join(regressed)}")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
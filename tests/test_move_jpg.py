@@ -6,6 +6,7 @@ import shutil
 from pathlib import Path
 import urllib.request
 import zipfile
+import asyncio
 import configparser
 from tests import test_utils
 import move_jpg  # target script
@@ -421,3 +422,896 @@ def test_move_files_by_date_fmt_yyyymmdd(setup_test_files):
         if test_dir.exists():
             shutil.rmtree(test_dir)
 
+
+def test_get_exif_native(tmp_path):
+    """
+    Test that the native JPEG/TIFF header reader returns the EXIF date tags
+    """
+    img = test_utils.build_ammonite_img(bg_color_index=1, size=(60, 60))
+    jpg_file = tmp_path / "native_001.jpg"
+    tif_file = tmp_path / "native_002.tif"
+    plain_file = tmp_path / "native_003.jpg"
+    test_utils.save_image_with_exif(img=img, filename=jpg_file, date_str="2024:07:01 12:00:00", format="JPEG")
+    test_utils.save_image_with_exif(img=img, filename=tif_file, date_str="2024:06:02 12:00:00", format="TIFF")
+    img.save(plain_file, "JPEG")
+
+    assert move_jpg.get_exif(str(jpg_file), "DateTimeOriginal") == [("DateTimeOriginal", "2024:07:01 12:00:00")]
+    assert move_jpg.get_exif(str(jpg_file), "DateTime") == [("DateTime", "2024:07:01 12:00:00")]
+    assert move_jpg.get_exif_date(str(tif_file)) == "2024:06:02 12:00:00"
+    # JPEG without an EXIF segment
+    assert move_jpg.get_exif_date(str(plain_file)) is None
+    # a broken IFD entry that claims a 4 GiB date value is skipped
+    import io
+    import struct
+    broken = b"II*\x00" + struct.pack("<I", 8) + struct.pack("<H", 1) + struct.pack("<HHII", 0x0132, 2, 0xFFFFFFF0, 26) + struct.pack("<I", 0)
+    assert move_jpg.read_tiff_date_tags(io.BytesIO(broken + b"2024:07:01 12:00:00\x00")) == {}
+
+def test_file_get_heic_native(tmp_path):
+    """
+    Test that the date of a HEIC file is read from the Exif item without decoding the image
+    """
+    heic_file = tmp_path / "native_001.heic"
+    test_utils.save_image_heic(img=test_utils.build_ammonite_img(bg_color_index=1, size=(64, 64)), filename=heic_file, date_str="2024:07:09 08:30:00")
+
+    assert move_jpg.read_heic_exif_tags(str(heic_file)) is not None
+    inf = move_jpg.file_get_heic(str(heic_file))
+    assert (inf['year'], inf['month'], inf['day']) == (2024, 7, 9)
+    assert (inf['hour'], inf['min'], inf['sec']) == (8, 30, 0)
+
+def test_movie_get_date_native(tmp_path):
+    """
+    Test that the creation time of a MP4 file is read from moov/mvhd without ffprobe
+    """
+    mp4_file = tmp_path / "native_001.mp4"
+    test_utils.save_movie_header(mp4_file, date_str="2024-07-08T23:59:30")
+
+    with mock.patch.object(move_jpg, 'is_ffprobe', return_value=False):
+        inf = move_jpg.movie_get_date(str(mp4_file), url="")
+    assert (inf['year'], inf['month'], inf['day']) == ("2024", "07", "08")
+    assert (inf['hour'], inf['min'], inf['sec']) == ("23", "59", "30")
+
+def test_ffprobe_pool():
+    """
+    Test that the ffprobe pool requests only creation_time and gives up on a hung probe
+    """
+    pool = move_jpg.FfprobePool(max_workers=2, timeout=0.5)
+    completed = move_jpg.subprocess.CompletedProcess(args=[], returncode=0, stdout=b"2024-07-08T12:00:00.000000Z\n", stderr=b"")
+    with mock.patch.object(move_jpg, 'get_ffprobe_path', return_value="ffprobe"):
+        with mock.patch.object(move_jpg.subprocess, 'run', return_value=completed) as run:
+            assert pool.probe_creation_time("a.mp4") == "2024-07-08T12:00:00.000000Z"
+            cmd = run.call_args[0][0]
+            assert "format_tags=creation_time" in cmd
+            assert run.call_args[1]['timeout'] == 0.5
+        with mock.patch.object(move_jpg.subprocess, 'run', side_effect=move_jpg.subprocess.TimeoutExpired("ffprobe", 0.5)):
+            assert pool.probe_creation_time("b.mp4") is None
+    pool.shutdown()
+
+def test_ffprobe_probes_overlap(tmp_path, monkeypatch):
+    """
+    Test that the movies probed by ffprobe overlap without -j, and the results keep the order of the files
+    """
+    import subprocess
+    import threading
+    img = test_utils.build_ammonite_img(bg_color_index=1, size=(60, 60))
+    (tmp_path / "clip_001.mp4").write_bytes(b"\x00" * 64)
+    test_utils.save_image_with_exif(img=img, filename=tmp_path / "photo.jpg", date_str="2024:07:01 12:00:00", format="JPEG")
+    (tmp_path / "clip_002.mp4").write_bytes(b"\x00" * 64)
+    monkeypatch.chdir(tmp_path)
+    dict_tar_ext = {'picture_ext': ['.jpg'], 'raw_ext': [], 'heic_ext': [], 'mtime_ext': [], 'movie_ext': ['.mp4']}
+    monkeypatch.setattr(move_jpg, "REPORTER", move_jpg.Reporter(quiet=True))
+    monkeypatch.setattr(move_jpg, "FFPROBE_POOL", move_jpg.FfprobePool(max_workers=2, timeout=5.0))
+    monkeypatch.setattr(move_jpg, "get_ffprobe_path", lambda refresh=False: "ffprobe")
+    # Each probe waits for the other one. Sequential probes would break the barrier.
+    barrier = threading.Barrier(2, timeout=5.0)
+    def run(cmd, *args, **kwargs):
+        barrier.wait()
+        return subprocess.CompletedProcess(cmd, 0, stdout=b"2024-07-08T12:00:00.000000Z\n", stderr=b"")
+    monkeypatch.setattr(move_jpg.subprocess, "run", run)
+
+    results = list(move_jpg.iter_file_dates(["clip_001.mp4", "photo.jpg", "clip_002.mp4"], dict_tar_ext, ""))
+    move_jpg.FFPROBE_POOL.shutdown()
+    assert [(res['file'], res['day']) for res in results] == [("clip_001.mp4", "8"), ("photo.jpg", "1"), ("clip_002.mp4", "8")]
+
+@pytest.mark.parametrize("executor", ["thread", "process"])
+def test_move_picture_parallel(tmp_path, monkeypatch, executor):
+    """
+    Test the parallel date extraction stage of move_picture()
+    """
+    img = test_utils.build_ammonite_img(bg_color_index=1, size=(60, 60))
+    files = []
+    for i in range(1, 9):
+        name = f"parallel_{i:03}.jpg"
+        test_utils.save_image_with_exif(img=img, filename=tmp_path / name, date_str=f"2024:07:{i:02} 12:00:00", format="JPEG")
+        files.append(name)
+    img.save(tmp_path / "parallel_009.jpg", "JPEG")
+    files.append("parallel_009.jpg")
+
+    move_jpg.init_paths()
+    monkeypatch.chdir(tmp_path)
+    dict_tar_ext = {'picture_ext': ['.jpg'], 'raw_ext': [], 'heic_ext': [], 'mtime_ext': [], 'movie_ext': []}
+    move_jpg.move_picture(files, dict_tar_ext, "", "%Y_%m_%d", jobs=3, executor=executor)
+
+    for i in range(1, 9):
+        assert (tmp_path / f"2024_07_{i:02}" / f"parallel_{i:03}.jpg").exists()
+    assert (tmp_path / "parallel_009.jpg").exists()
+
+def test_init_worker(monkeypatch):
+    """
+    Test that a worker process of the process backend applies the ffprobe settings of the parent and does not ask for the ffprobe setup
+    """
+    move_jpg.init_paths()
+    monkeypatch.setattr(move_jpg, "REPORTER", move_jpg.Reporter(quiet=True))
+    monkeypatch.setattr(move_jpg, "FFPROBE_POOL", move_jpg.FfprobePool())
+    monkeypatch.setattr(move_jpg, "_FFPROBE_SETUP_FAILED", False)
+    move_jpg.init_worker(move_jpg.SCR_PATH, 3, 7.5)
+    assert (move_jpg.FFPROBE_POOL.max_workers, move_jpg.FFPROBE_POOL.timeout) == (3, 7.5)
+    assert move_jpg._FFPROBE_SETUP_FAILED
+
+    dict_tar_ext = {'picture_ext': ['.jpg'], 'raw_ext': [], 'heic_ext': [], 'mtime_ext': [], 'movie_ext': []}
+    assert not move_jpg.uses_ffprobe(dict_tar_ext)
+    assert move_jpg.uses_ffprobe(dict(dict_tar_ext, movie_ext=['.mp4']))
+    assert not move_jpg.uses_ffprobe(dict(dict_tar_ext, movie_ext=['.mp4'], date_sources={'movie_ext': ['isobmff']}))
+
+def test_async_move_picture(tmp_path, monkeypatch):
+    """
+    Test the asyncio pipeline
+    """
+    img = test_utils.build_ammonite_img(bg_color_index=1, size=(60, 60))
+    files = []
+    for i in range(1, 7):
+        name = f"async_{i:03}.jpg"
+        test_utils.save_image_with_exif(img=img, filename=tmp_path / name, date_str=f"2024:07:{(i % 2) + 1:02} 12:00:00", format="JPEG")
+        files.append(name)
+
+    move_jpg.init_paths()
+    monkeypatch.chdir(tmp_path)
+    dict_tar_ext = {'picture_ext': ['.jpg'], 'raw_ext': [], 'heic_ext': [], 'mtime_ext': [], 'movie_ext': []}
+    asyncio.run(move_jpg.async_move_picture(files, dict_tar_ext, "", "%Y_%m_%d", concurrency=4))
+
+    for i in range(1, 7):
+        assert (tmp_path / f"2024_07_{(i % 2) + 1:02}" / f"async_{i:03}.jpg").exists()
+
+    # --dest and --collision rename, and a failing file does not stop the others.
+    import json
+    src = tmp_path / "src"
+    dest = tmp_path / "dest"
+    src.mkdir()
+    for name in ("dup.jpg", "broken.jpg", "other.jpg"):
+        test_utils.save_image_with_exif(img=img, filename=src / name, date_str="2024:07:01 12:00:00", format="JPEG")
+    (dest / "2024_07_01").mkdir(parents=True)
+    (dest / "2024_07_01" / "dup.jpg").write_bytes(b"old")
+    org_extract_date = move_jpg.extract_date
+    def extract_date(file, *args):
+        if file.endswith("broken.jpg"):
+            raise ValueError("broken file")
+        return org_extract_date(file, *args)
+    log_file = tmp_path / "events.jsonl"
+    monkeypatch.setattr(move_jpg, "REPORTER", move_jpg.Reporter(quiet=True, log_file=str(log_file)))
+    monkeypatch.setattr(move_jpg, "extract_date", extract_date)
+    files = [str(src / name) for name in ("dup.jpg", "broken.jpg", "other.jpg")]
+    asyncio.run(move_jpg.async_move_picture(files, dict_tar_ext, "", "%Y_%m_%d", concurrency=2, collision='rename', dest=str(dest)))
+    move_jpg.REPORTER.close()
+    assert sorted(os.listdir(dest / "2024_07_01")) == ["dup.jpg", "dup_1.jpg", "other.jpg"]
+    assert os.listdir(src) == ["broken.jpg"]
+    events = {pathlib.Path(e['file']).name: e for e in map(json.loads, log_file.read_text(encoding="utf-8").splitlines()) if e['action'] != 'warning'}
+    assert (events["dup.jpg"]['action'], events["dup.jpg"]['reason']) == ("moved", "renamed")
+    assert (events["broken.jpg"]['action'], events["broken.jpg"]['reason']) == ("error", "failed")
+
+    # main() parses the arguments once and dispatches on --async (also abbreviated)
+    move_jpg_path = os.path.abspath(os.path.join(os.path.dirname(move_jpg.__file__), 'move_jpg.py'))
+    with mock.patch.object(move_jpg, 'main_async', side_effect=SystemExit(0)) as main_async:
+        with mock.patch.object(sys, 'argv', [move_jpg_path, "-t", str(src), "--asy", "--concurrency", "2"]):
+            with pytest.raises(SystemExit):
+                move_jpg.main()
+    assert main_async.call_args[0][0].concurrency == 2
+    with mock.patch.object(sys, 'argv', [move_jpg_path, "-t", str(src), "--concurrency", "2"]):
+        with pytest.raises(SystemExit) as exc_info:
+            move_jpg.main()
+    assert exc_info.value.code == 2
+
+def test_plan_and_execute(tmp_path):
+    """
+    Test that --plan_out does not move any file and --plan_in executes the plan
+    """
+    tar_dir = tmp_path / "tar"
+    tar_dir.mkdir()
+    img = test_utils.build_ammonite_img(bg_color_index=1, size=(60, 60))
+    for i in range(1, 4):
+        test_utils.save_image_with_exif(img=img, filename=tar_dir / f"plan_{i:03}.jpg", date_str=f"2024:07:{i:02} 12:00:00", format="JPEG")
+    plan_file = tmp_path / "plan.jsonl"
+
+    move_jpg_path = os.path.abspath('move_jpg.py')
+    with mock.patch.object(sys, 'argv', [move_jpg_path, "-t", str(tar_dir), "--plan_out", str(plan_file)]):
+        with pytest.raises(SystemExit) as exc_info:
+            move_jpg.main()
+        assert exc_info.value.code == 0
+    assert plan_file.exists()
+    for i in range(1, 4):
+        assert (tar_dir / f"plan_{i:03}.jpg").exists(), "--plan_out must not move files"
+
+    with mock.patch.object(sys, 'argv', [move_jpg_path, "-t", str(tar_dir), "--plan_in", str(plan_file)]):
+        with mock.patch.object(move_jpg, 'extract_date') as extract_date:
+            with pytest.raises(SystemExit) as exc_info:
+                move_jpg.main()
+            assert exc_info.value.code == 0
+            extract_date.assert_not_called()
+    for i in range(1, 4):
+        assert (tar_dir / f"2024_07_{i:02}" / f"plan_{i:03}.jpg").exists()
+
+@pytest.mark.parametrize("collision", ["skip", "rename", "compare"])
+def test_collision_policy(tmp_path, monkeypatch, collision):
+    """
+    Test the collision policies of the destination index
+    """
+    img = test_utils.build_ammonite_img(bg_color_index=1, size=(60, 60))
+    date_dir = tmp_path / "2024_07_01"
+    date_dir.mkdir()
+    # a different file with the same name, and an identical copy
+    test_utils.save_image_with_exif(img=img, filename=date_dir / "col_001.jpg", date_str="2024:07:01 08:00:00", format="JPEG")
+    test_utils.save_image_with_exif(img=img, filename=tmp_path / "col_001.jpg", date_str="2024:07:01 12:00:00", format="JPEG")
+    test_utils.save_image_with_exif(img=img, filename=tmp_path / "col_002.jpg", date_str="2024:07:01 12:00:00", format="JPEG")
+    shutil.copy(tmp_path / "col_002.jpg", date_dir / "col_002.jpg")
+
+    move_jpg.init_paths()
+    monkeypatch.chdir(tmp_path)
+    dict_tar_ext = {'picture_ext': ['.jpg'], 'raw_ext': [], 'heic_ext': [], 'mtime_ext': [], 'movie_ext': []}
+    move_jpg.move_picture(["col_001.jpg", "col_002.jpg"], dict_tar_ext, "", "%Y_%m_%d", collision=collision)
+
+    if collision == "skip":
+        assert (tmp_path / "col_001.jpg").exists()
+        assert (tmp_path / "col_002.jpg").exists()
+    elif collision == "rename":
+        assert (date_dir / "col_001_1.jpg").exists()
+        assert (date_dir / "col_002_1.jpg").exists()
+    else:
+        assert (date_dir / "col_001_1.jpg").exists()
+        assert (tmp_path / "col_002.jpg").exists(), "identical file must not be moved"
+        assert not (date_dir / "col_002_1.jpg").exists()
+
+def test_scan_files(tmp_path):
+    """
+    Test the streaming scanner (recursive, include/exclude globs, max depth, date folders are skipped)
+    """
+    for rel in ["a.jpg", "b.png", "sub/c.jpg", "sub/deep/d.jpg", "skip/e.jpg", "2024_07_01/f.jpg"]:
+        path = tmp_path / rel
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(b"")
+
+    def scan(**kwargs):
+        return sorted(p.replace(os.sep, "/") for p in move_jpg.scan_files(str(tmp_path), [".jpg"], date_format="%Y_%m_%d", **kwargs))
+
+    assert scan() == ["a.jpg"]
+    assert scan(recursive=True) == ["a.jpg", "skip/e.jpg", "sub/c.jpg", "sub/deep/d.jpg"]
+    assert scan(recursive=True, max_depth=1) == ["a.jpg", "skip/e.jpg", "sub/c.jpg"]
+    assert scan(recursive=True, exclude=["skip"]) == ["a.jpg", "sub/c.jpg", "sub/deep/d.jpg"]
+    assert scan(recursive=True, include=["sub/*"]) == ["sub/c.jpg", "sub/deep/d.jpg"]
+
+def test_meta_cache(tmp_path, monkeypatch):
+    """
+    Test that an unchanged file is not opened again when the metadata cache has its date
+    """
+    img = test_utils.build_ammonite_img(bg_color_index=1, size=(60, 60))
+    test_utils.save_image_with_exif(img=img, filename=tmp_path / "cache_001.jpg", date_str="2024:07:01 12:00:00", format="JPEG")
+    img.save(tmp_path / "cache_002.jpg", "JPEG")
+    monkeypatch.chdir(tmp_path)
+    dict_tar_ext = {'picture_ext': ['.jpg'], 'raw_ext': [], 'heic_ext': [], 'mtime_ext': [], 'movie_ext': []}
+    files = ["cache_001.jpg", "cache_002.jpg"]
+
+    cache = move_jpg.MetaCache(str(tmp_path / "cache.sqlite"), max_entries=10)
+    first = list(move_jpg.iter_file_dates(files, dict_tar_ext, "", cache=cache))
+    cache.close()
+
+    cache = move_jpg.MetaCache(str(tmp_path / "cache.sqlite"), max_entries=10)
+    with mock.patch.object(move_jpg, 'extract_date', side_effect=AssertionError("file must not be parsed")):
+        second = list(move_jpg.iter_file_dates(files, dict_tar_ext, "", cache=cache))
+    assert second == first
+    assert (second[0]['year'], second[1]['year']) == ("2024", None)
+    assert cache.hits == 2
+
+    # a cached "no date" is not used after the date sources were changed (--filename_date)
+    img.save(tmp_path / "IMG_20240707_120000.jpg", "JPEG")
+    assert list(move_jpg.iter_file_dates(["IMG_20240707_120000.jpg"], dict_tar_ext, "", cache=cache))[0]['year'] is None
+    with_filename = dict(dict_tar_ext, date_sources={'picture_ext': ['filename', 'exif', 'pillow']})
+    res = list(move_jpg.iter_file_dates(["IMG_20240707_120000.jpg"], with_filename, "", cache=cache))[0]
+    assert (res['year'], res['month'], res['day'], res['extractor']) == ("2024", "7", "7", "picture_ext")
+    assert cache.hits == 2
+
+    # eviction keeps the number of entries bounded
+    cache.max_entries = 1
+    assert cache.evict() == 2
+    cache.close()
+
+def test_meta_cache_transient_failure(tmp_path, monkeypatch):
+    """
+    Test that a movie whose ffprobe timed out is not cached and is probed again, and a clean "no creation time" is cached
+    """
+    import subprocess
+    (tmp_path / "clip.mp4").write_bytes(b"\x00" * 64)
+    monkeypatch.chdir(tmp_path)
+    dict_tar_ext = {'picture_ext': [], 'raw_ext': [], 'heic_ext': [], 'mtime_ext': [], 'movie_ext': ['.mp4']}
+    monkeypatch.setattr(move_jpg, "REPORTER", move_jpg.Reporter(quiet=True))
+    monkeypatch.setattr(move_jpg, "get_ffprobe_path", lambda refresh=False: "ffprobe")
+    probes = []
+    def run(cmd, *args, **kwargs):
+        probes.append(cmd)
+        if len(probes) == 1:
+            raise subprocess.TimeoutExpired(cmd, kwargs.get('timeout'))
+        return subprocess.CompletedProcess(cmd, 0, stdout=b"\n", stderr=b"")
+    monkeypatch.setattr(move_jpg.subprocess, "run", run)
+
+    cache = move_jpg.MetaCache(str(tmp_path / "cache.sqlite"))
+    for _ in range(3):
+        assert list(move_jpg.iter_file_dates(["clip.mp4"], dict_tar_ext, "", cache=cache))[0]['year'] is None
+    cache.close()
+    # timed out -> probed again -> no creation time (cached)
+    assert len(probes) == 2
+    assert (cache.hits, cache.misses) == (1, 2)
+
+@pytest.mark.parametrize("use_inotify", [False, True])
+def test_watch_folder(tmp_path, monkeypatch, use_inotify):
+    """
+    Test that the watch mode moves the files once they are stable, and the files written later in the next cycle
+    """
+    img = test_utils.build_ammonite_img(bg_color_index=1, size=(60, 60))
+    test_utils.save_image_with_exif(img=img, filename=tmp_path / "watch_001.jpg", date_str="2024:07:01 12:00:00", format="JPEG")
+    monkeypatch.chdir(tmp_path)
+    dict_tar_ext = {'picture_ext': ['.jpg'], 'raw_ext': [], 'heic_ext': [], 'mtime_ext': [], 'movie_ext': []}
+
+    # a file still being written is not reported until it has been stable for the settle time
+    busy = move_jpg.FolderWatcher(str(tmp_path), [".jpg"], settle=3600.0, use_inotify=False)
+    os.utime(tmp_path / "watch_001.jpg", (0, 0))
+    (tmp_path / "busy.jpg").write_bytes(b"")
+    assert busy.poll(0.0) == ["watch_001.jpg"]
+    assert busy.poll(0.0) == []
+    busy.close()
+    (tmp_path / "busy.jpg").unlink()
+
+    watcher = move_jpg.FolderWatcher(str(tmp_path), [".jpg"], settle=0.0, date_format="%Y_%m_%d", use_inotify=use_inotify)
+    move_jpg.watch_folder(watcher, dict_tar_ext, "", "%Y_%m_%d", interval=0.0, max_cycles=1)
+    assert (tmp_path / "2024_07_01" / "watch_001.jpg").exists()
+
+    watcher = move_jpg.FolderWatcher(str(tmp_path), [".jpg"], settle=0.0, date_format="%Y_%m_%d", use_inotify=use_inotify)
+    assert watcher.poll(0.0) == []
+    test_utils.save_image_with_exif(img=img, filename=tmp_path / "watch_002.jpg", date_str="2024:07:02 12:00:00", format="JPEG")
+    assert watcher.poll(1.0) == ["watch_002.jpg"]
+    watcher.close()
+
+def test_move_engine(tmp_path, monkeypatch):
+    """
+    Test that the move engine never replaces an existing file, on the rename path and on the cross-device copy path
+    """
+    src_dir = tmp_path / "src"
+    dst_dir = tmp_path / "dst"
+    src_dir.mkdir()
+    dst_dir.mkdir()
+    (dst_dir / "a.jpg").write_bytes(b"old")
+    (src_dir / "a.jpg").write_bytes(b"new")
+    with pytest.raises(FileExistsError):
+        move_jpg.rename_noreplace(str(src_dir / "a.jpg"), str(dst_dir / "a.jpg"))
+    assert (dst_dir / "a.jpg").read_bytes() == b"old"
+
+    engine = move_jpg.MoveEngine(copy_jobs=2)
+    engine.move_file(str(src_dir / "a.jpg"), str(dst_dir / "b.jpg"))
+    assert (dst_dir / "b.jpg").read_bytes() == b"new"
+    assert not (src_dir / "a.jpg").exists()
+
+    # cross-device moves: copied into a temporary file in parallel, then renamed into place
+    monkeypatch.setattr(engine, "is_same_device", lambda src, dst: False)
+    data = bytes(range(256)) * 4096
+    done = []
+    for i in range(5):
+        (src_dir / f"c{i}.jpg").write_bytes(data)
+        os.utime(src_dir / f"c{i}.jpg", (1000000000, 1000000000))
+        engine.move(str(src_dir / f"c{i}.jpg"), str(dst_dir / f"c{i}.jpg"), lambda result, i=i: done.append((i, result)))
+    (src_dir / "a.jpg").write_bytes(b"new")
+    engine.move(str(src_dir / "a.jpg"), str(dst_dir / "a.jpg"))
+    engine.shutdown()
+    assert sorted(done) == [(i, 'ok') for i in range(5)]
+    for i in range(5):
+        assert (dst_dir / f"c{i}.jpg").read_bytes() == data
+        assert os.stat(dst_dir / f"c{i}.jpg").st_mtime == 1000000000
+    assert (dst_dir / "a.jpg").read_bytes() == b"old"
+    assert (src_dir / "a.jpg").exists()
+    assert sorted(os.listdir(src_dir)) == ["a.jpg"]
+    assert not [name for name in os.listdir(dst_dir) if name.endswith(".part")]
+
+def test_move_not_found(tmp_path, monkeypatch):
+    """
+    Test that a file removed between the scan and the move is reported as skipped/not_found and the other files are moved
+    """
+    import json
+    tar_dir = tmp_path / "tar"
+    tar_dir.mkdir()
+    img = test_utils.build_ammonite_img(bg_color_index=1, size=(60, 60))
+    for name in ("gone.jpg", "kept.jpg"):
+        test_utils.save_image_with_exif(img=img, filename=tar_dir / name, date_str="2024:07:01 12:00:00", format="JPEG")
+    dict_tar_ext = {'picture_ext': ['.jpg'], 'raw_ext': [], 'heic_ext': [], 'mtime_ext': [], 'movie_ext': []}
+    org_extract_date = move_jpg.extract_date
+    def extract_date(file, *args):
+        res = org_extract_date(file, *args)
+        if file.endswith("gone.jpg"):
+            os.unlink(file)
+        return res
+    log_file = tmp_path / "events.jsonl"
+    monkeypatch.setattr(move_jpg, "REPORTER", move_jpg.Reporter(quiet=True, log_file=str(log_file)))
+    monkeypatch.setattr(move_jpg, "extract_date", extract_date)
+    move_jpg.init_paths()
+    move_jpg.move_picture([str(tar_dir / "gone.jpg"), str(tar_dir / "kept.jpg")], dict_tar_ext, "", "%Y_%m_%d")
+    move_jpg.REPORTER.close()
+    assert os.listdir(tar_dir / "2024_07_01") == ["kept.jpg"]
+    events = [json.loads(line) for line in log_file.read_text(encoding="utf-8").splitlines()]
+    assert [(e['action'], e['reason']) for e in events] == [("skipped", "not_found"), ("moved", "ok")]
+
+def test_move_engine_copy_errors(tmp_path, monkeypatch):
+    """
+    Test that a failed cross-device copy and a source that cannot be removed are reported for their own files
+    """
+    import errno
+    import json
+    tar_dir = tmp_path / "tar"
+    tar_dir.mkdir()
+    img = test_utils.build_ammonite_img(bg_color_index=1, size=(60, 60))
+    names = ["full.jpg", "locked.jpg", "fine.jpg"]
+    for name in names:
+        test_utils.save_image_with_exif(img=img, filename=tar_dir / name, date_str="2024:07:01 12:00:00", format="JPEG")
+    dict_tar_ext = {'picture_ext': ['.jpg'], 'raw_ext': [], 'heic_ext': [], 'mtime_ext': [], 'movie_ext': []}
+
+    class CrossDeviceEngine(move_jpg.MoveEngine):
+        def is_same_device(self, src, dst):
+            return False
+        def _write_copy(self, src, tmp):
+            if src.endswith("full.jpg"):
+                raise OSError(errno.ENOSPC, "No space left on device", tmp)
+            super()._write_copy(src, tmp)
+
+    org_unlink = os.unlink
+    def unlink(path, *args, **kwargs):
+        if str(path).endswith("locked.jpg"):
+            raise PermissionError(errno.EACCES, "Permission denied", str(path))
+        org_unlink(path, *args, **kwargs)
+
+    log_file = tmp_path / "events.jsonl"
+    monkeypatch.setattr(move_jpg, "REPORTER", move_jpg.Reporter(quiet=True, log_file=str(log_file)))
+    monkeypatch.setattr(move_jpg, "MOVE_ENGINE", CrossDeviceEngine(copy_jobs=1))
+    monkeypatch.setattr(move_jpg.os, "unlink", unlink)
+    move_jpg.init_paths()
+    move_jpg.move_picture([str(tar_dir / name) for name in names], dict_tar_ext, "", "%Y_%m_%d")
+    move_jpg.MOVE_ENGINE.shutdown()
+    move_jpg.REPORTER.close()
+    assert sorted(os.listdir(tar_dir / "2024_07_01")) == ["fine.jpg", "locked.jpg"]
+    assert (tar_dir / "full.jpg").exists() and (tar_dir / "locked.jpg").exists()
+    events = [json.loads(line) for line in log_file.read_text(encoding="utf-8").splitlines()]
+    results = {os.path.basename(e['file']): (e['action'], e['reason']) for e in events if e['action'] != 'warning'}
+    assert results == {"full.jpg": ("error", "failed"), "locked.jpg": ("copied", "copied_source_kept"), "fine.jpg": ("moved", "ok")}
+    assert sorted(e['reason'] for e in events if e['action'] == 'warning') == ["copied_source_kept", "failed"]
+
+    # The name of the failed copy is released in the index.
+    index = move_jpg.DestIndex()
+    monkeypatch.setattr(move_jpg, "REPORTER", move_jpg.Reporter(quiet=True))
+    move_jpg.move_to_date_dir(str(tar_dir / "full.jpg"), str(tar_dir / "2024_07_01"), index)
+    move_jpg.MOVE_ENGINE.shutdown()
+    assert not index.exists(str(tar_dir / "2024_07_01"), "full.jpg")
+
+def test_copy_mode(tmp_path, monkeypatch):
+    """
+    Test that --copy keeps the originals, copies into the date folders of the destination and verifies the copies
+    """
+    card = tmp_path / "card"
+    dest = tmp_path / "dest"
+    card.mkdir()
+    img = test_utils.build_ammonite_img(bg_color_index=1, size=(60, 60))
+    test_utils.save_image_with_exif(img=img, filename=card / "copy_001.jpg", date_str="2024:07:01 12:00:00", format="JPEG")
+    test_utils.save_image_with_exif(img=img, filename=card / "copy_002.jpg", date_str="2024:07:02 12:00:00", format="JPEG")
+    monkeypatch.chdir(card)
+    dict_tar_ext = {'picture_ext': ['.jpg'], 'raw_ext': [], 'heic_ext': [], 'mtime_ext': [], 'movie_ext': []}
+    files = ["copy_001.jpg", "copy_002.jpg"]
+
+    monkeypatch.setattr(move_jpg, "MOVE_ENGINE", move_jpg.CopyEngine(copy_jobs=2, verify=True, bufsize=1024))
+    move_jpg.move_picture(files, dict_tar_ext, "", "%Y_%m_%d", dest=str(dest))
+    for name, day in zip(files, ["2024_07_01", "2024_07_02"]):
+        assert (card / name).exists()
+        assert (dest / day / name).read_bytes() == (card / name).read_bytes()
+
+    # a copy that does not match the checksum of the source is removed
+    (dest / "2024_07_01" / "copy_001.jpg").unlink()
+    real_fsync = os.fsync
+    def corrupt_fsync(fd):
+        os.pwrite(fd, b"\xff\xff", 100)
+        real_fsync(fd)
+    monkeypatch.setattr(move_jpg.os, "fsync", corrupt_fsync)
+    move_jpg.move_picture(files[:1], dict_tar_ext, "", "%Y_%m_%d", dest=str(dest))
+    move_jpg.MOVE_ENGINE.shutdown()
+    assert move_jpg.MOVE_ENGINE.verify_errors == 1
+    assert os.listdir(dest / "2024_07_01") == []
+    assert (card / "copy_001.jpg").exists()
+
+    # --copy without --dest would write the copies next to the originals on the card
+    with mock.patch.object(sys, 'argv', [os.path.abspath('move_jpg.py'), "-t", str(card), "--copy"]):
+        with pytest.raises(SystemExit) as exc_info:
+            move_jpg.main()
+    assert exc_info.value.code == 2
+
+def test_benchmark_corpus(tmp_path):
+    """
+    Test the corpus generator and the throughput benchmark (tests/benchmark_move_jpg.py) on a small corpus
+    """
+    from tests import benchmark_move_jpg
+    mix = benchmark_move_jpg.parse_mix("jpeg_exif=1,jpeg_noexif=1,heic=1,raw=1,mp4=1,mts=1")
+    files = benchmark_move_jpg.make_corpus(tmp_path / "corpus", 24, mix, seed=1, size=(60, 60))
+    assert len(files) == 24
+    result = benchmark_move_jpg.run_benchmark(tmp_path / "corpus", files)
+    assert result['files'] == 24
+    assert result['not_moved'] == sum(1 for name in files if name.startswith("jpeg_noexif"))
+    assert set(result['extractors']) <= {'picture_ext', 'heic_ext', 'raw_ext', 'movie_ext', 'mtime_ext'}
+    for item in result['extractors'].values():
+        assert item['p50_ms'] <= item['p99_ms']
+
+def test_microbench_baseline(tmp_path):
+    """
+    Test the extractor micro-benchmarks (tests/microbench_move_jpg.py): a baseline is compared only on the machine that measured it and a slowdown past the threshold is reported
+    """
+    import json
+    from tests import microbench_move_jpg
+    baseline_file = tmp_path / "baseline.json"
+    options = ["--baseline", str(baseline_file), "--number", "1", "--repeat", "1"]
+    assert microbench_move_jpg.main(options) == 1
+    assert microbench_move_jpg.main(options + ["--update"]) == 0
+    baseline = microbench_move_jpg.load_baseline(str(baseline_file))
+    assert set(baseline['results']) == {'get_exif', 'file_get_heic', 'get_date_info_fm_raw', 'movie_get_date', 'file_get_mtime', 'get_dateinf'}
+    assert microbench_move_jpg.main(options + ["--threshold", "1000"]) == 0
+    baseline_file.write_text(json.dumps(dict(baseline, host="other-host")), encoding="utf-8")
+    assert microbench_move_jpg.main(options + ["--threshold", "1000"]) == 1
+
+    rows = microbench_move_jpg.compare_baseline({'fast': 10.0, 'slow': 16.0, 'new': 1.0}, {'fast': 10.0, 'slow': 10.0}, threshold=0.5)
+    assert [(name, bad) for name, _, _, _, bad in rows] == [('fast', False), ('slow', True), ('new', False)]
+
+def test_profile_and_stage_timing(tmp_path, capsys):
+    """
+    Test that --profile writes a pstats file and the per-stage timing summary is displayed
+    """
+    import pstats
+    tar_dir = tmp_path / "tar"
+    tar_dir.mkdir()
+    img = test_utils.build_ammonite_img(bg_color_index=1, size=(60, 60))
+    test_utils.save_image_with_exif(img=img, filename=tar_dir / "profile_001.jpg", date_str="2024:07:01 12:00:00", format="JPEG")
+    profile_file = tmp_path / "run.prof"
+    test_args = [os.path.abspath('move_jpg.py'), "-t", str(tar_dir), "--profile", str(profile_file)]
+    with mock.patch.object(sys, 'argv', test_args):
+        with pytest.raises(SystemExit) as exc_info:
+            move_jpg.main()
+    assert exc_info.value.code == 0
+    assert (tar_dir / "2024_07_01" / "profile_001.jpg").exists()
+    assert pstats.Stats(str(profile_file)).total_calls > 0
+
+    out = capsys.readouterr().out
+    assert "<<  stage timing  >>" in out
+    stats = move_jpg.STAGE_TIMER.stats()
+    for stage in ("scan", "extract:picture_ext", "mkdir", "collision", "move"):
+        assert stage in out
+        assert stats[stage][0] == 1
+
+def test_quiet_jsonl_log(tmp_path, capsys):
+    """
+    Test that --quiet suppresses the per-file output and --log_format jsonl writes one event with a reason code per file
+    """
+    import json
+    tar_dir = tmp_path / "tar"
+    tar_dir.mkdir()
+    img = test_utils.build_ammonite_img(bg_color_index=1, size=(60, 60))
+    test_utils.save_image_with_exif(img=img, filename=tar_dir / "log_001.jpg", date_str="2024:07:01 12:00:00", format="JPEG")
+    img.save(tar_dir / "log_002.jpg", "JPEG")
+    (tar_dir / "2024_07_01").mkdir()
+    test_utils.save_image_with_exif(img=img, filename=tar_dir / "log_003.jpg", date_str="2024:07:01 12:00:00", format="JPEG")
+    shutil.copy(tar_dir / "log_003.jpg", tar_dir / "2024_07_01" / "log_003.jpg")
+    capsys.readouterr()
+
+    log_file = tmp_path / "events.jsonl"
+    test_args = [os.path.abspath('move_jpg.py'), "-t", str(tar_dir), "-q", "--log_format", "jsonl", "--log_file", str(log_file)]
+    with mock.patch.object(sys, 'argv', test_args):
+        with pytest.raises(SystemExit) as exc_info:
+            move_jpg.main()
+    assert exc_info.value.code == 0
+    out = capsys.readouterr().out
+    assert "file=" not in out
+    assert "<<  result  >> 3 files" in out
+
+    events = {pathlib.Path(e['file']).name: e for e in map(json.loads, log_file.read_text(encoding="utf-8").splitlines())}
+    assert (events["log_001.jpg"]['action'], events["log_001.jpg"]['reason'], events["log_001.jpg"]['date']) == ("moved", "ok", "2024-07-01")
+    assert (events["log_002.jpg"]['action'], events["log_002.jpg"]['reason']) == ("no_date", "no_exif")
+    assert (events["log_003.jpg"]['action'], events["log_003.jpg"]['reason']) == ("skipped", "exists")
+    assert all(e['extractor'] == "picture_ext" and e['duration_ms'] >= 0 for e in events.values())
+
+def test_lazy_imports():
+    """
+    Test that importing move_jpg does not import the third-party modules, and that the version information is still available
+    """
+    import subprocess
+    code = (
+        "import sys, move_jpg\n"
+        "print(','.join(m for m in ('PIL', 'piexif', 'pillow_heif', 'numpy', 'ffmpeg', 'ini_cfg_parser') if m in sys.modules))\n"
+        "print(move_jpg.__version__.splitlines()[0])\n"
+    )
+    res = subprocess.run([sys.executable, "-c", code], cwd=os.path.dirname(os.path.abspath(move_jpg.__file__)), capture_output=True, text=True)
+    assert res.returncode == 0, res.stderr
+    loaded, version_line = res.stdout.splitlines()[:2]
+    assert loaded == ""
+    assert version_line == move_jpg.__version_short__
+
+@pytest.mark.parametrize("ext, magic", [(".nef", 42), (".orf", 0x4F52), (".orf", 0x5352), (".rw2", 0x55)])
+def test_get_date_info_fm_raw_native(tmp_path, ext, magic):
+    """
+    Test that the RAW date is read from the TIFF IFDs natively (without piexif), including the ORF/RW2 header magics
+    """
+    import struct
+    img = test_utils.build_ammonite_img(bg_color_index=1, size=(60, 60))
+    tif = tmp_path / "raw.tif"
+    test_utils.save_image_with_exif(img=img, filename=tif, date_str="2023:11:05 08:09:10", format="TIFF")
+    data = bytearray(tif.read_bytes())
+    endian = '<' if data[:2] == b'II' else '>'
+    data[2:4] = struct.pack(endian + 'H', magic)
+    raw = tmp_path / f"raw{ext}"
+    raw.write_bytes(bytes(data))
+
+    with mock.patch.object(move_jpg, 'import_piexif', side_effect=AssertionError("piexif must not be used")):
+        inf = move_jpg.get_date_info_fm_raw(str(raw), move_jpg.EXIF_TAG_DATETIME_ORIGINAL)
+        assert (inf['date'], inf['time']) == ("2023:11:05", "08:09:10")
+        assert (inf['year'], inf['month'], inf['day']) == ("2023", "11", "05")
+        # A broken date string is no date (erropt=0)
+        raw.write_bytes(bytes(data).replace(b"2023:11:05 08:09:10", b"2023:11:05 --:--:--"))
+        inf = move_jpg.get_date_info_fm_raw(str(raw), move_jpg.EXIF_TAG_DATETIME_ORIGINAL)
+        assert inf['year'] is None and inf['date'] is None
+
+def test_extractor_registry(tmp_path):
+    """
+    Test the extension dispatch of the extractor registry, the uniform DateInfo result and the extractor plugins (entry points)
+    """
+    class FakeEntryPoint:
+        def __init__(self, name, obj):
+            self.name = name
+            self.obj = obj
+        def load(self):
+            return self.obj
+
+    class NameDateExtractor(move_jpg.DateExtractor):
+        name = 'name_date'
+        extensions = ['.AVIF', '.jpeg']
+        def extract(self, file, url_ffmpeg=""):
+            y, m, d = pathlib.Path(file).stem.split('-')
+            return move_jpg.to_date_info({'year': y, 'month': m, 'day': d})
+
+    dict_tar_ext = {'picture_ext': ['.jpg', '.jpeg'], 'raw_ext': ['.nef'], 'heic_ext': ['.heic'], 'mtime_ext': ['.mts', '.jpg'], 'movie_ext': ['.mp4']}
+    entry_points = [FakeEntryPoint('name_date', NameDateExtractor), FakeEntryPoint('broken', None)]
+    with mock.patch.object(move_jpg, 'iter_extractor_entry_points', return_value=entry_points):
+        registry = move_jpg.ExtractorRegistry(dict_tar_ext)
+    assert registry.lookup("a/b.JPG").name == 'picture_ext'   # the first kind wins
+    assert registry.lookup("b.mts").name == 'mtime_ext'
+    assert registry.lookup("b.avif").name == 'name_date'      # plugin extension
+    assert registry.lookup("b.jpeg").name == 'name_date'      # plugin takes precedence
+    assert registry.lookup("b.png") is None
+    assert set(registry.extensions()) == {'.jpg', '.jpeg', '.nef', '.heic', '.mts', '.mp4', '.avif'}
+
+    img = test_utils.build_ammonite_img(bg_color_index=1, size=(60, 60))
+    test_utils.save_image_with_exif(img=img, filename=tmp_path / "exif.jpg", date_str="2024:07:01 12:00:00", format="JPEG")
+    assert registry.lookup("exif.jpg").extract(str(tmp_path / "exif.jpg")) == {'year': 2024, 'month': 7, 'day': 1, 'hour': None, 'min': None, 'sec': None}
+    assert registry.lookup("x.avif").extract("2023-02-03.avif")['month'] == 2
+    assert move_jpg.to_date_info({'year': '2024', 'month': None, 'day': '1', 'hour': '1'})['hour'] is None
+    assert move_jpg.to_date_info({'year': '2024', 'month': '2', 'day': '30', 'hour': '1'}) == {key: None for key in move_jpg.DATE_INFO_KEYS}
+    # A date that only looks valid is "no date", not an error of the move.
+    test_utils.save_image_with_exif(img=img, filename=tmp_path / "feb30.jpg", date_str="2024:02:30 12:00:00", format="JPEG")
+    res = move_jpg.extract_date(str(tmp_path / "feb30.jpg"), dict_tar_ext, "")
+    assert (res['year'], res['extractor']) == (None, "picture_ext")
+    assert move_jpg.get_date_dir({'file': "a.jpg", 'year': "2024", 'month': "2", 'day': "30", 'extractor': "picture_ext"}, "%Y_%m_%d") is None
+
+    # extract_date() returns the extractor name, and no date for a file that is not a target.
+    res = move_jpg.extract_date(str(tmp_path / "exif.jpg"), dict_tar_ext, "")
+    assert (res['year'], res['month'], res['day'], res['extractor']) == ("2024", "7", "1", "picture_ext")
+    assert move_jpg.extract_date("other.png", dict_tar_ext, "")['extractor'] == ''
+
+def test_date_source_chain(tmp_path):
+    """
+    Test that the date sources are tried in the order of their cost, and that the Pillow fallback runs only when the native parser cannot read the file
+    """
+    img = test_utils.build_ammonite_img(bg_color_index=1, size=(60, 60))
+    noexif = tmp_path / "noexif.jpg"
+    img.save(noexif, "JPEG")
+    (tmp_path / "noexif.xmp").write_text(
+        '<x:xmpmeta xmlns:x="adobe:ns:meta/"><rdf:RDF><rdf:Description xmp:CreateDate="2021-05-06T07:08:09"'
+        ' exif:DateTimeOriginal="2020-01-02T03:04:05+09:00"/></rdf:RDF></x:xmpmeta>', encoding="utf-8")
+    broken = tmp_path / "broken.jpg"
+    broken.write_bytes(b"not a jpeg")
+
+    # mtime is listed first, but the cheaper xmp source is tried first. DateTimeOriginal is preferred to CreateDate.
+    chain = move_jpg.SourceChainExtractor('picture_ext', ['.jpg'], ['mtime', 'xmp'])
+    assert [source.name for source in chain.sources] == ['xmp', 'mtime']
+    assert chain.extract(str(noexif)) == {'year': 2020, 'month': 1, 'day': 2, 'hour': 3, 'min': 4, 'sec': 5}
+
+    chain = move_jpg.SourceChainExtractor('picture_ext', ['.jpg'], ['pillow', 'exif'])
+    assert [source.name for source in chain.sources] == ['exif', 'pillow']
+    pillow_date = move_jpg.to_date_info({'year': 2019, 'month': 9, 'day': 9})
+    with mock.patch.object(move_jpg.PillowSource, 'read', return_value=pillow_date) as pillow_read:
+        # The EXIF of the JPEG is read natively (no date), so Pillow is not used.
+        assert chain.extract(str(noexif))['year'] is None
+        assert pillow_read.call_count == 0
+        # The native parser cannot read the file, so Pillow is used.
+        assert chain.extract(str(broken))['year'] == 2019
+        assert pillow_read.call_count == 1
+
+    # extract_date() uses the date sources of the extension information.
+    dict_tar_ext = {'picture_ext': ['.jpg'], 'raw_ext': [], 'heic_ext': [], 'mtime_ext': [], 'movie_ext': [], 'date_sources': {'picture_ext': ['exif', 'xmp']}}
+    res = move_jpg.extract_date(str(noexif), dict_tar_ext, "")
+    assert (res['year'], res['month'], res['day'], res['extractor']) == ("2020", "1", "2", "picture_ext")
+
+def test_filename_date(tmp_path, capsys, monkeypatch):
+    """
+    Test the 'filename' date source (--filename_date) and the sampled verification with the metadata
+    """
+    import json
+    img = test_utils.build_ammonite_img(bg_color_index=1, size=(60, 60))
+    tar_dir = tmp_path / "tar"
+    tar_dir.mkdir()
+    img.save(tar_dir / "IMG_20240707_120000.jpg", "JPEG")        # no EXIF: dated by the file name
+    img.save(tar_dir / "IMG_20241399_120000.jpg", "JPEG")        # not a valid date
+    test_utils.save_image_with_exif(img=img, filename=tar_dir / "PXL_20230101_000000.jpg", date_str="2022:12:31 23:59:59", format="JPEG")
+
+    chain = move_jpg.SourceChainExtractor('picture_ext', ['.jpg'], ['exif', 'filename'])
+    assert chain.sources[0].name == 'filename'
+    with mock.patch.object(move_jpg.ExifSource, 'read', side_effect=AssertionError("the file must not be opened")):
+        assert chain.extract(str(tar_dir / "IMG_20240707_120000.jpg"))['day'] == 7
+    assert chain.extract(str(tar_dir / "IMG_20241399_120000.jpg"))['year'] is None
+    # Verified with the metadata: the EXIF date is used when the dates differ.
+    assert chain.extract(str(tar_dir / "PXL_20230101_000000.jpg"))['year'] == 2023
+    chain = move_jpg.SourceChainExtractor('picture_ext', ['.jpg'], ['exif', 'filename'], filename_sample=1.0)
+    log_file = tmp_path / "events.jsonl"
+    monkeypatch.setattr(move_jpg, "REPORTER", move_jpg.Reporter(log_file=str(log_file)))
+    capsys.readouterr()
+    assert chain.extract(str(tar_dir / "PXL_20230101_000000.jpg"))['year'] == 2022
+    assert chain.extract(str(tar_dir / "IMG_20240707_120000.jpg"))['day'] == 7
+    assert "differs from the metadata" in capsys.readouterr().out
+    move_jpg.REPORTER.close()
+    event = json.loads(log_file.read_text(encoding="utf-8"))
+    assert (event['file'], event['action'], event['reason']) == (str(tar_dir / "PXL_20230101_000000.jpg"), "warning", "filename_mismatch")
+    # --quiet: the warning is only in the log.
+    monkeypatch.setattr(move_jpg, "REPORTER", move_jpg.Reporter(quiet=True))
+    assert chain.extract(str(tar_dir / "PXL_20230101_000000.jpg"))['year'] == 2022
+    assert capsys.readouterr().out == ""
+    assert move_jpg.REPORTER.warnings == 1
+
+    pattern = move_jpg.compile_filename_pattern("*%Y-%m-%d %H.%M.%S")
+    assert pattern.match("Photo 2021-02-03 04.05.06.jpg").group('month') == "02"
+
+    test_args = [os.path.abspath('move_jpg.py'), "-t", str(tar_dir), "--filename_date", "-q"]
+    with mock.patch.object(sys, 'argv', test_args):
+        with pytest.raises(SystemExit) as exc_info:
+            move_jpg.main()
+    assert exc_info.value.code == 0
+    assert (tar_dir / "2024_07_07" / "IMG_20240707_120000.jpg").exists()
+    assert (tar_dir / "2023_01_01" / "PXL_20230101_000000.jpg").exists()
+    assert (tar_dir / "IMG_20241399_120000.jpg").exists()
+
+def test_journal_resume_undo(tmp_path):
+    """
+    Test that --resume finishes the planned moves of the journal without extracting the recorded files again, and that --undo moves the files back
+    """
+    import json
+    img = test_utils.build_ammonite_img(bg_color_index=1, size=(60, 60))
+    tar_dir = tmp_path / "tar"
+    tar_dir.mkdir()
+    for name in ("planned.jpg", "done.jpg", "new.jpg"):
+        test_utils.save_image_with_exif(img=img, filename=tar_dir / name, date_str="2024:07:01 12:00:00", format="JPEG")
+    img.save(tar_dir / "nodate.jpg", "JPEG")
+    date_dir = tar_dir / "2024_07_01"
+    # The killed run: done.jpg was moved, planned.jpg was planned, and nodate.jpg had no date.
+    date_dir.mkdir()
+    os.rename(tar_dir / "done.jpg", date_dir / "done.jpg")
+    journal = tmp_path / "journal.jsonl"
+    records = [
+        {'op': 'plan', 'src': str(tar_dir / "done.jpg"), 'dest_dir': str(date_dir), 'extractor': 'picture_ext'},
+        {'op': 'done', 'src': str(tar_dir / "done.jpg"), 'dst': str(date_dir / "done.jpg"), 'action': 'moved', 'reason': 'ok'},
+        {'op': 'nodate', 'src': str(tar_dir / "nodate.jpg"), 'extractor': 'picture_ext'},
+        {'op': 'plan', 'src': str(tar_dir / "planned.jpg"), 'dest_dir': str(date_dir), 'extractor': 'picture_ext'},
+    ]
+    journal.write_text("".join(json.dumps(r) + "\n" for r in records) + '{"op": "pl', encoding="utf-8")
+
+    extracted = []
+    org_extract_date = move_jpg.extract_date
+    def extract_date(file, *args):
+        extracted.append(os.path.basename(file))
+        return org_extract_date(file, *args)
+
+    test_args = [os.path.abspath('move_jpg.py'), "-t", str(tar_dir), "-q", "--journal", str(journal), "--resume"]
+    with mock.patch.object(sys, 'argv', test_args), mock.patch.object(move_jpg, 'extract_date', side_effect=extract_date):
+        with pytest.raises(SystemExit) as exc_info:
+            move_jpg.main()
+    assert exc_info.value.code == 0
+    assert extracted == ["new.jpg"]
+    assert sorted(p.name for p in date_dir.iterdir()) == ["done.jpg", "new.jpg", "planned.jpg"]
+    assert (tar_dir / "nodate.jpg").exists()
+
+    test_args = [os.path.abspath('move_jpg.py'), "-t", str(tar_dir), "-q", "--journal", str(journal), "--undo"]
+    with mock.patch.object(sys, 'argv', test_args):
+        with pytest.raises(SystemExit) as exc_info:
+            move_jpg.main()
+    assert exc_info.value.code == 0
+    assert sorted(p.name for p in tar_dir.iterdir()) == ["done.jpg", "new.jpg", "nodate.jpg", "planned.jpg"]
+    last = move_jpg.Journal.last_records(move_jpg.Journal.read(str(journal)))
+    assert last[str(tar_dir / "new.jpg")]['op'] == 'undone'
+
+def test_multi_folder(tmp_path, capsys):
+    """
+    Test that several target folders (-t and --tar_list) are processed in one run with absolute paths, and that the result is displayed per folder
+    """
+    img = test_utils.build_ammonite_img(bg_color_index=1, size=(60, 60))
+    folders = {"a": "2024:07:01 12:00:00", "b": "2024:08:02 12:00:00", "c": "2024:09:03 12:00:00"}
+    for name, date_str in folders.items():
+        (tmp_path / name).mkdir()
+        test_utils.save_image_with_exif(img=img, filename=tmp_path / name / "test.jpg", date_str=date_str, format="JPEG")
+    img.save(tmp_path / "b" / "nodate.jpg", "JPEG")
+    tar_list = tmp_path / "folders.txt"
+    tar_list.write_text("# target folders\n\nc\n", encoding="utf-8")
+
+    current_path = os.getcwd()
+    test_args = [os.path.abspath('move_jpg.py'), "-t", str(tmp_path / "a"), str(tmp_path / "b"), str(tmp_path / "a"), "--tar_list", str(tar_list)]
+    with mock.patch.object(sys, 'argv', test_args):
+        with pytest.raises(SystemExit) as exc_info:
+            move_jpg.main()
+    assert exc_info.value.code == 0
+    assert os.getcwd() == current_path
+    assert (tmp_path / "a" / "2024_07_01" / "test.jpg").exists()
+    assert (tmp_path / "b" / "2024_08_02" / "test.jpg").exists()
+    assert (tmp_path / "c" / "2024_09_03" / "test.jpg").exists()
+    assert (tmp_path / "b" / "nodate.jpg").exists()
+    out = capsys.readouterr().out
+    assert f"{tmp_path / 'a'}: 1 files. moved=1" in out
+    assert f"{tmp_path / 'b'}: 2 files. moved=1, no_date=1" in out
+    assert f"{tmp_path / 'c'}: 1 files. moved=1" in out
+
+    # --watch accepts only one target folder.
+    test_args = [os.path.abspath('move_jpg.py'), "-t", str(tmp_path / "a"), str(tmp_path / "b"), "--watch"]
+    with mock.patch.object(sys, 'argv', test_args):
+        with pytest.raises(SystemExit) as exc_info:
+            move_jpg.main()
+    assert exc_info.value.code == 2
+
+def test_file_record_syscalls(tmp_path, capsys):
+    """
+    Test that the stat result of the scan is reused by the cache lookup and the mtime source, and that the file system calls are counted per file
+    """
+    import json
+    import pickle
+    import datetime
+    tar_dir = tmp_path / "tar"
+    tar_dir.mkdir()
+    clip = tar_dir / "clip.mts"
+    clip.write_bytes((b"\x47" + bytes(187)) * 4)
+    ts = datetime.datetime(2024, 7, 1, 12, 0, 0).timestamp()
+    os.utime(clip, (ts, ts))
+
+    records = list(move_jpg.scan_files(str(tar_dir), [".mts"]))
+    assert records == ["clip.mts"]
+    assert isinstance(records[0], move_jpg.FileRecord) and records[0].entry is not None
+    # The process backend gets the stat result without the DirEntry.
+    record = move_jpg.FileRecord(str(clip), records[0].entry)
+    copied = pickle.loads(pickle.dumps(record))
+    assert isinstance(copied, move_jpg.FileRecord) and copied.entry is None
+    assert copied.stat().st_mtime_ns == record.stat().st_mtime_ns
+
+    stat_files = []
+    org_stat = os.stat
+    def stat(path, *args, **kwargs):
+        stat_files.append(os.fspath(path))
+        return org_stat(path, *args, **kwargs)
+
+    log_file = tmp_path / "events.jsonl"
+    test_args = [os.path.abspath('move_jpg.py'), "-t", str(tar_dir), "-q", "--cache", str(tmp_path / "cache.sqlite3"),
+                 "--log_format", "jsonl", "--log_file", str(log_file)]
+    with mock.patch.object(sys, 'argv', test_args), mock.patch.object(move_jpg.os, 'stat', side_effect=stat):
+        with pytest.raises(SystemExit) as exc_info:
+            move_jpg.main()
+    assert exc_info.value.code == 0
+    assert (tar_dir / "2024_07_01" / "clip.mts").exists()
+    assert str(clip) not in stat_files
+    event = json.loads(log_file.read_text(encoding="utf-8").splitlines()[0])
+    assert event['syscalls'] == ({'rename': 1} if os.name == 'nt' else {'stat': 1, 'rename': 1})
+    out = capsys.readouterr().out
+    assert "<<  file system calls  >>" in out
+    assert "rename                           1       1.00" in out
@@ -4,6 +4,8 @@ import sys
 import shutil
 import random
 import math
+import struct
+import datetime
 import pathlib
 import urllib.request
 from typing import Tuple, List
@@ -122,6 +124,19 @@ def save_image_with_exif(img: Image.Image, filename: pathlib.Path, date_str="202
     print(f"{format} file created: {filename}")
 
 
+def save_image_heic(img: Image.Image, filename: pathlib.Path, date_str="2024:07:07 12:00:00"):
+    from pillow_heif import register_heif_opener  # type: ignore
+    register_heif_opener()
+    exif_dict = {"0th": {}, "Exif": {}}
+    encoded = date_str.encode('ascii')
+    exif_dict["0th"][piexif.ImageIFD.DateTime] = encoded
+    exif_dict["Exif"][piexif.ExifIFD.DateTimeOriginal] = encoded
+    exif_bytes = piexif.dump(exif_dict)
+
+    img.save(filename, format="HEIF", exif=exif_bytes)
+    print(f"HEIC file created: {filename}")
+
+
 def save_image_png(img: Image.Image, filename: pathlib.Path):
     img.save(filename, "PNG")
     print(f"PNG file created: {filename}")
@@ -147,6 +162,25 @@ def save_movie(frames: List[Image.Image], filename: pathlib.Path, date_str="2024
     print(f"Video file created: {filename}")
 
 
+def build_isobmff_box(box_type: bytes, payload: bytes) -> bytes:
+    return struct.pack(">I", 8 + len(payload)) + box_type + payload
+
+
+def save_movie_header(filename: pathlib.Path, date_str="2024-07-08T12:00:00"):
+    """
+    Write a minimal MP4 (ftyp + moov/mvhd) without ffmpeg. Only the container header is valid.
+    """
+    dt = datetime.datetime.strptime(date_str, "%Y-%m-%dT%H:%M:%S")
+    seconds = int((dt - datetime.datetime(1904, 1, 1)).total_seconds())
+    ftyp = build_isobmff_box(b"ftyp", b"isom" + struct.pack(">I", 512) + b"isomiso2mp41")
+    # mvhd version 0: creation_time, modification_time, timescale, duration + fixed fields
+    mvhd = build_isobmff_box(b"mvhd", struct.pack(">B3xIIII", 0, seconds, seconds, 1000, 0) + bytes(80))
+    moov = build_isobmff_box(b"moov", mvhd)
+    with open(filename, "wb") as f:
+        f.write(ftyp + build_isobmff_box(b"mdat", bytes(64)) + moov)
+    print(f"Video header file created: {filename}")
+
+
 # --------------------------
 # Batch creation of test files
 # --------------------------